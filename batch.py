@@ -0,0 +1,115 @@
+import argparse
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from cache import DEFAULT_MAX_BYTES, open_cache
+from compact import attach_trie, share_current_trie
+from serialize import analyze
+
+
+DEFAULT_TOP = 5
+DEFAULT_CHUNK = 16
+
+
+def analyze_lines(lines: list[str], top: int) -> list[str]:
+    """Analyze a chunk of JSONL positions, one output line per input line"""
+    out = []
+    for line in lines:
+        # a line that parses keeps its id, errors included
+        position = {}
+        try:
+            position = json.loads(line)
+            moves = analyze(position["board"], position["rack"].upper(), top)
+            record = {"moves": moves}
+
+        except (KeyError, ValueError, TypeError, AttributeError) as e:
+            record = {"error": str(e)}
+
+        if isinstance(position, dict) and "id" in position:
+            record = {"id": position["id"], **record}
+
+        out.append(json.dumps(record, ensure_ascii=False))
+
+    return out
+
+
+def _init_worker(lexicon_path: str, cache_path: str|None, cache_bytes: int):
+    attach_trie(lexicon_path)
+    open_cache(cache_path, max_bytes=cache_bytes)
+
+
+def read_chunks(stream, chunk_size: int):
+    lines = (line for line in stream if line.strip())
+    while True:
+        chunk = list(islice(lines, chunk_size))
+        if len(chunk) == 0:
+            return
+
+        yield chunk
+
+
+def run_batch(in_stream, out_stream, workers: int, top: int, chunk_size: int, lexicon_path: str|None = None,
+              cache_path: str|None = None, cache_bytes: int = DEFAULT_MAX_BYTES) -> int:
+    # at most `window` chunks are read ahead of the writer, which
+    # keeps memory bounded and the output in input order
+    window = workers * 2
+    pending = deque()
+    n_positions = 0
+
+    def flush_one():
+        nonlocal n_positions
+        for line in pending.popleft().result():
+            out_stream.write(line + "\n")
+            n_positions += 1
+
+    # build the lexicon once and let every worker map the same pages
+    owns_lexicon = lexicon_path is None
+    if owns_lexicon:
+        lexicon_path = share_current_trie()
+
+    try:
+        initargs = (lexicon_path, cache_path, cache_bytes)
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=initargs) as pool:
+            for chunk in read_chunks(in_stream, chunk_size):
+                if len(pending) >= window:
+                    flush_one()
+
+                pending.append(pool.submit(analyze_lines, chunk, top))
+
+            while len(pending) > 0:
+                flush_one()
+
+    finally:
+        if owns_lexicon:
+            os.unlink(lexicon_path)
+
+    out_stream.flush()
+    return n_positions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Analyze JSONL positions ({\"board\": [...], \"rack\": \"...\"} per line)")
+    parser.add_argument("input", nargs="?", default="-", help="input JSONL file, - for stdin")
+    parser.add_argument("-o", "--output", default="-", help="output JSONL file, - for stdout")
+    parser.add_argument("-k", "--top", type=int, default=DEFAULT_TOP, help="moves to keep per position")
+    parser.add_argument("-j", "--workers", type=int, default=4)
+    parser.add_argument("--chunk", type=int, default=DEFAULT_CHUNK, help="positions sent to a worker at once")
+    parser.add_argument("--lexicon", default=None, help="compiled lexicon to map (see compact.py), built from wordlist.txt if missing")
+    parser.add_argument("--cache", default=None, help="SQLite file keeping analyses across runs (see cache.py)")
+    parser.add_argument("--cache-max-mb", type=int, default=DEFAULT_MAX_BYTES // (1024 * 1024))
+    args = parser.parse_args()
+
+    in_stream = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8")
+    out_stream = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+
+    t0 = time.time()
+    n_positions = run_batch(in_stream, out_stream, args.workers, args.top, args.chunk, args.lexicon,
+                            args.cache, args.cache_max_mb * 1024 * 1024)
+    diff = time.time() - t0
+
+    print(f"Analyzed {n_positions} positions in {diff:.2f} seconds ({n_positions / max(diff, 1e-9):.1f} positions/s).", file=sys.stderr)
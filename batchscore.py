@@ -0,0 +1,107 @@
+import numpy as np
+
+from main import (
+    BOARD_SIZE, BONUS_POINTS, BONUS_TILES, LETTER_IDS, LETTER_MULT, WORD_MULT,
+    Board, Orientation, PositionedWord, ScoringEngine,
+)
+
+# Scores whole lists of generated moves with array operations. Moves are
+# flattened into one row per letter; per-move sums and products are then
+# segment reductions over those rows.
+
+LETTER_MULT_ARRAY = np.array(LETTER_MULT, dtype=np.int64)
+WORD_MULT_ARRAY = np.array(WORD_MULT, dtype=np.int64)
+
+ORIENTATIONS = (Orientation.HORIZONTAL, Orientation.VERTICAL)
+
+
+class BoardArrays:
+    """Per-square board state as arrays, indexed [orientation][y, x] where needed"""
+
+    def __init__(self, game_board: Board, engine: ScoringEngine):
+        self.occupied = np.zeros((BOARD_SIZE, BOARD_SIZE), dtype=bool)
+        self.values = np.zeros((BOARD_SIZE, BOARD_SIZE), dtype=np.int64)
+
+        # cross-word points, whether there is a cross word and the
+        # letters it allows, for orientation 0 (horizontal) and 1
+        self.cross_points = np.zeros((2, BOARD_SIZE, BOARD_SIZE), dtype=np.int64)
+        self.has_cross = np.zeros((2, BOARD_SIZE, BOARD_SIZE), dtype=bool)
+        self.cross_checks = np.zeros((2, BOARD_SIZE, BOARD_SIZE), dtype=np.int64)
+
+        for y, row in enumerate(game_board):
+            for x, pl in enumerate(row):
+                if pl.letter != " ":
+                    self.occupied[y, x] = True
+                    self.values[y, x] = engine.values[pl.letter]
+                    continue
+
+                for o, orient in enumerate(ORIENTATIONS):
+                    cw = engine.cross_word((x, y), orient)
+                    if cw is None:
+                        continue
+
+                    self.has_cross[o, y, x] = True
+                    self.cross_points[o, y, x] = cw.points
+                    self.cross_checks[o, y, x] = engine.cross_check((x, y), orient)
+
+
+def score_moves(game_board: Board, moves: list[PositionedWord], engine: ScoringEngine|None = None) -> tuple[np.ndarray, np.ndarray]:
+    """Scores of generated moves and whether their cross words are valid
+
+    The main word of every move is taken to be a lexicon word, which
+    holds for everything the generators return.
+    """
+    n_moves = len(moves)
+    if n_moves == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=bool)
+
+    if engine is None:
+        engine = ScoringEngine(game_board)
+
+    arrays = BoardArrays(game_board, engine)
+
+    lengths = np.fromiter((len(pw.word) for pw in moves), dtype=np.int64, count=n_moves)
+    start_x = np.fromiter((pw.start_pos[0] for pw in moves), dtype=np.int64, count=n_moves)
+    start_y = np.fromiter((pw.start_pos[1] for pw in moves), dtype=np.int64, count=n_moves)
+    vertical = np.fromiter((pw.orientation == Orientation.VERTICAL for pw in moves), dtype=bool, count=n_moves)
+
+    n_letters = int(lengths.sum())
+    letter_points = engine.values
+    values = np.fromiter((letter_points[pl.letter] for pw in moves for pl in pw.word), dtype=np.int64, count=n_letters)
+    ids = np.fromiter((LETTER_IDS[pl.real_letter] for pw in moves for pl in pw.word), dtype=np.int64, count=n_letters)
+
+    # one row per letter: which move it belongs to and where it lands
+    offsets = np.zeros(n_moves, dtype=np.int64)
+    np.cumsum(lengths[:-1], out=offsets[1:])
+
+    move = np.repeat(np.arange(n_moves), lengths)
+    step = np.arange(n_letters) - offsets[move]
+    letter_vertical = vertical[move]
+
+    xs = start_x[move] + np.where(letter_vertical, 0, step)
+    ys = start_y[move] + np.where(letter_vertical, step, 0)
+
+    placed = ~arrays.occupied[ys, xs]
+    letter_mult = np.where(placed, LETTER_MULT_ARRAY[ys, xs], 1)
+    word_mult = np.where(placed, WORD_MULT_ARRAY[ys, xs], 1)
+
+    # tiles on the board score their own value, a wildcard there stays 0
+    points = np.where(placed, values * letter_mult, arrays.values[ys, xs])
+
+    main_points = np.add.reduceat(points, offsets) * np.multiply.reduceat(word_mult, offsets)
+
+    n_placed = np.bincount(move, weights=placed, minlength=n_moves).astype(np.int64)
+    bonus = np.where(n_placed >= BONUS_TILES, BONUS_POINTS, 0)
+
+    # cross words run the other way to the move
+    cross = np.where(letter_vertical, 0, 1)
+    has_cross = placed & arrays.has_cross[cross, ys, xs]
+
+    cross_points = np.where(has_cross, (arrays.cross_points[cross, ys, xs] + values * letter_mult) * word_mult, 0)
+    cross_total = np.bincount(move, weights=cross_points, minlength=n_moves).astype(np.int64)
+
+    allowed = (arrays.cross_checks[cross, ys, xs] >> ids) & 1
+    bad = has_cross & (allowed == 0)
+    valid = np.bincount(move, weights=bad, minlength=n_moves) == 0
+
+    return main_points + cross_total + bonus, valid
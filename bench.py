@@ -0,0 +1,298 @@
+import argparse
+import json
+import resource
+import sys
+import time
+import tracemalloc
+from array import array
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+
+from compact import CompactTrie, load_compact
+from hooks import get_hook_table
+from main import (
+    BOARD_SIZE, Board, BoardView, Orientation, PositionedWord, ScoringEngine, find_words, parallel_moves,
+    playword_from_str, score_found,
+)
+from patterns import trie_cost
+from searcher import WORDLIST_PATH, Trie, create_greek_trie, set_trie
+from serialize import board_from_rows
+
+# Times the stages of an analysis: building the lexicon and its hook
+# table, generating candidates and scoring them. With --memory every
+# stage also reports traced peak and retained memory and the files that
+# allocated most, and the main structures are sized object by object.
+# Tracing slows Python down several times, so compare timings of
+# --memory runs only with each other. With --anchor-sweep the anchor
+# index is rebuilt at several budgets and the candidate nodes the lines
+# of the positions start from are counted, how ANCHOR_BUDGET_FACTOR was
+# picked: unlike the timings, the counts do not vary from run to run.
+
+DEFAULT_TURNS = 8
+TOP_SITES = 5
+
+# anchor index budgets tried, in multiples of the single letter index
+ANCHOR_SWEEP = (1, 1.5, 2, 3, 4, 6, 8, 100)
+
+
+@dataclass
+class Phase:
+    name: str
+    seconds: float = 0.0
+    peak_bytes: int|None = None
+    retained_bytes: int|None = None
+    max_rss_kb: int = 0
+    top_sites: list[dict] = field(default_factory=list)
+
+    def to_dict(self) -> dict:
+        return {key: value for key, value in self.__dict__.items() if value is not None}
+
+
+def deep_sizeof(obj, seen: set[int]|None = None) -> int:
+    """Bytes of an object and everything it refers to, counting each object once
+
+    Objects already in `seen` count zero, so structures measured with
+    one shared set are not charged for each other's objects.
+    """
+    if seen is None:
+        seen = set()
+
+    total = 0
+    stack = [obj]
+    while stack:
+        cur = stack.pop()
+        if id(cur) in seen or isinstance(cur, type):
+            continue
+
+        seen.add(id(cur))
+        total += sys.getsizeof(cur)
+
+        if isinstance(cur, dict):
+            stack.extend(cur.keys())
+            stack.extend(cur.values())
+        elif isinstance(cur, (list, tuple, set, frozenset)):
+            stack.extend(cur)
+        elif isinstance(cur, (str, bytes, bytearray, array, int, float, memoryview)):
+            pass
+        elif hasattr(cur, "__dict__"):
+            stack.append(cur.__dict__)
+
+    return total
+
+
+def structure_sizes(t: Trie, table, candidates: list, scored: list) -> dict[str, int]:
+    """Bytes held by the lexicon, its hook table and the generator's lists"""
+    sizes = dict()
+
+    if isinstance(t, CompactTrie):
+        # everything lives in the mapped file
+        sizes["trie.buffer"] = len(t.buffer)
+    else:
+        seen = set()
+        sizes["trie.nodes"] = deep_sizeof(t.nodes, seen)
+        sizes["trie.node_tracker"] = deep_sizeof(t.node_tracker, seen)
+        sizes["trie.anchors"] = deep_sizeof(t.anchors, seen)
+        sizes["trie.bloom"] = 0 if t.bloom is None else len(t.bloom.bits)
+
+    sizes["hook_table"] = table.front.itemsize * (len(table.front) + len(table.back))
+    # the scored lists hold the candidates' moves, count them once
+    seen = set()
+    sizes["candidates"] = deep_sizeof(candidates, seen)
+    sizes["scored"] = deep_sizeof(scored, seen)
+
+    return sizes
+
+
+class Bench:
+    def __init__(self, memory: bool):
+        self.memory = memory
+        self.phases: list[Phase] = []
+
+
+    @contextmanager
+    def phase(self, name: str):
+        phase = Phase(name)
+
+        if self.memory:
+            tracemalloc.reset_peak()
+            before = tracemalloc.take_snapshot()
+            current_before, _ = tracemalloc.get_traced_memory()
+
+        t0 = time.perf_counter()
+        yield phase
+        phase.seconds = time.perf_counter() - t0
+
+        if self.memory:
+            current, peak = tracemalloc.get_traced_memory()
+            phase.peak_bytes = peak - current_before
+            phase.retained_bytes = current - current_before
+
+            after = tracemalloc.take_snapshot()
+            for stat in after.compare_to(before, "filename")[:TOP_SITES]:
+                phase.top_sites.append({"file": stat.traceback[0].filename, "size_diff": stat.size_diff})
+
+        phase.max_rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        self.phases.append(phase)
+
+
+
+def self_play_positions(turns: int, seed: int) -> list[tuple[Board, str]]:
+    """(board, rack) of every turn of a short seeded game"""
+    from records import NO_PLAYER
+    from session import GameSession
+
+    session = GameSession(seed=seed)
+
+    # an opening word from the bag across the centre, as in demo()
+    words = [word for word in session.trie.words() if 2 <= len(word) <= 7]
+    while True:
+        word = session.tiles.rng.choice(words)
+        opening = PositionedWord(playword_from_str(word), (BOARD_SIZE // 2 - len(word) // 2, BOARD_SIZE // 2), Orientation.HORIZONTAL)
+        try:
+            session.apply_move(opening, NO_PLAYER)
+            break
+        except ValueError:
+            # more of a letter than the bag holds
+            continue
+
+    positions = []
+    for _ in range(turns):
+        player = session.player
+        session.tiles.refill(player)
+        rack = session.rack(player)
+
+        positions.append(([row[:] for row in session.board], rack))
+
+        moves = session.best_moves(rack, top=1)
+        if len(moves) == 0:
+            break
+
+        session.apply_move(moves[0][0], player)
+
+    return positions
+
+
+def read_positions(path: str) -> list[tuple[Board, str]]:
+    # the input format of batch.py
+    positions = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                position = json.loads(line)
+                positions.append((board_from_rows(position["board"]), position["rack"].upper()))
+
+    return positions
+
+
+def anchor_sweep(t: Trie, positions: list[tuple[Board, str]]) -> list[dict]:
+    """Candidate nodes of every line of the positions, per anchor index budget"""
+    queries = set()
+    for game_board, _ in positions:
+        view = BoardView(game_board)
+        for orient in (Orientation.HORIZONTAL, Orientation.VERTICAL):
+            for i in range(BOARD_SIZE):
+                queries.add(view.query(orient, i))
+
+    # with no room to spare the index is the single letters
+    base = t.build_anchor_index(0)
+
+    rows = []
+    for factor in ANCHOR_SWEEP:
+        used = t.build_anchor_index(int(factor * base))
+        candidates = sum(trie_cost(t, qu) for qu in queries)
+        rows.append({"factor": factor, "bytes": used, "keys": len(t.anchors), "candidates": int(candidates)})
+
+    t.build_anchor_index()
+    return rows
+
+
+def run(args) -> dict:
+    bench = Bench(args.memory)
+    if args.memory:
+        tracemalloc.start()
+
+    with bench.phase("build_lexicon"):
+        t = load_compact(args.lexicon) if args.lexicon is not None else create_greek_trie(args.wordlist)
+        set_trie(t)
+
+    with bench.phase("build_hook_table"):
+        table = get_hook_table(t)
+
+    # the positions are set up outside the measured phases
+    if args.memory:
+        tracemalloc.stop()
+
+    positions = read_positions(args.positions) if args.positions is not None else self_play_positions(args.turns, args.seed)
+
+    if args.memory:
+        tracemalloc.start()
+
+    candidates = []
+    with bench.phase("find_words"):
+        for game_board, rack in positions:
+            engine = ScoringEngine(game_board, t)
+            found = find_words(game_board, rack, trie=t)
+            found.extend(parallel_moves(game_board, rack, engine))
+            candidates.append((game_board, engine, found))
+
+    scored = []
+    with bench.phase("score"):
+        for game_board, engine, found in candidates:
+            found_scores = score_found(game_board, found, engine)
+            found_scores.sort(key=lambda x: x[1], reverse=True)
+            scored.append(found_scores)
+
+    report = {
+        "positions": len(positions),
+        "candidates": sum(len(found) for _, _, found in candidates),
+        "phases": [phase.to_dict() for phase in bench.phases],
+    }
+
+    if args.memory:
+        tracemalloc.stop()
+        report["structures"] = structure_sizes(t, table, [found for _, _, found in candidates], scored)
+
+    if args.anchor_sweep:
+        report["anchor_sweep"] = anchor_sweep(t, positions)
+
+    return report
+
+
+def print_report(report: dict):
+    print(f"{report['positions']} positions, {report['candidates']} candidates", file=sys.stderr)
+    for phase in report["phases"]:
+        line = f"{phase['name']:18s} {phase['seconds']:8.2f}s"
+        if "peak_bytes" in phase:
+            line += f"  peak {phase['peak_bytes'] / 2**20:8.1f} MiB  retained {phase['retained_bytes'] / 2**20:8.1f} MiB"
+
+        print(line + f"  rss {phase['max_rss_kb'] / 1024:8.1f} MiB", file=sys.stderr)
+
+    for name, size in report.get("structures", {}).items():
+        print(f"{name:18s} {size / 2**20:8.1f} MiB", file=sys.stderr)
+
+    for row in report.get("anchor_sweep", []):
+        print(f"anchors x{row['factor']:<5} {row['bytes'] / 2**20:8.1f} MiB  {row['keys']:8d} keys  {row['candidates']:10d} candidates", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time (and with --memory, profile the memory of) lexicon build and search")
+    parser.add_argument("--wordlist", default=WORDLIST_PATH)
+    parser.add_argument("--lexicon", default=None, help="compiled lexicon to map instead of building one (see compact.py)")
+    parser.add_argument("--positions", default=None, help="JSONL positions as for batch.py, a seeded self-play game if missing")
+    parser.add_argument("--turns", type=int, default=DEFAULT_TURNS, help="turns of the self-play game")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--memory", action="store_true", help="trace allocations per phase and size the main structures")
+    parser.add_argument("--anchor-sweep", action="store_true", help="count the anchor candidates of the positions at several index budgets")
+    parser.add_argument("--json", default=None, help="write the report to this file, - for stdout")
+    args = parser.parse_args()
+
+    if args.anchor_sweep and args.lexicon is not None:
+        parser.error("--anchor-sweep rebuilds the anchor index, give a --wordlist")
+
+    report = run(args)
+    print_report(report)
+
+    if args.json is not None:
+        out = sys.stdout if args.json == "-" else open(args.json, "w", encoding="utf-8")
+        json.dump(report, out, indent=2)
+        out.write("\n")
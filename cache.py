@@ -0,0 +1,200 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import weakref
+
+from main import Orientation, PositionedWord, letter_values, transpose
+from searcher import Trie
+from serialize import move_from_dict, move_to_dict
+
+# Analyses kept on disk across runs, in SQLite. An entry maps a position
+# (board rows and sorted rack) and the lexicon it was analyzed with to
+# its best moves, best first. The board is symmetric about its main
+# diagonal, so a position and its transpose share one entry, stored
+# under whichever of the two sorts first. Moves of equal score may come
+# back in a different order than a fresh analysis gives them.
+
+DEFAULT_MAX_ENTRIES = 1_000_000
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024
+
+# the totals are checked against the limits every this many stores
+EVICT_EVERY = 64
+
+# share of the entries dropped at once when over a limit
+EVICT_FRACTION = 0.1
+
+ALL_MOVES = -1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS analyses (
+    key TEXT PRIMARY KEY,
+    top INTEGER NOT NULL,
+    moves TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS analyses_last_used ON analyses (last_used);
+"""
+
+
+_fingerprints: "weakref.WeakKeyDictionary[Trie, str]" = weakref.WeakKeyDictionary()
+
+
+def lexicon_fingerprint(t: Trie) -> str:
+    """A hash of the words of a lexicon, the same for the same words in any process"""
+    fingerprint = _fingerprints.get(t)
+    if fingerprint is None:
+        h = hashlib.sha256()
+        for word in sorted(t.words()):
+            h.update(word.encode("utf-8"))
+            h.update(b"\n")
+
+        fingerprint = _fingerprints[t] = h.hexdigest()
+
+    return fingerprint
+
+
+def canonical_rows(rows: list[str]) -> tuple[list[str], bool]:
+    """The rows of a board or of its transpose, and whether it was transposed"""
+    flipped = ["".join(col) for col in transpose(rows)]
+    if flipped < rows:
+        return flipped, True
+
+    return rows, False
+
+
+def _transpose_move(pw: PositionedWord) -> PositionedWord:
+    x, y = pw.start_pos
+    orientation = Orientation.VERTICAL if pw.orientation == Orientation.HORIZONTAL else Orientation.HORIZONTAL
+    return PositionedWord(pw.word, (y, x), orientation)
+
+
+class AnalysisCache:
+    """Best moves of positions, persisted in a SQLite file
+
+    Entries are dropped least recently used first once there are more
+    than max_entries of them or they take more than max_bytes. Several
+    processes can share one file; each opens its own connection.
+    """
+
+    def __init__(self, path: str, max_entries: int = DEFAULT_MAX_ENTRIES, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+        self.lock = threading.Lock()
+        self.n_stored = 0
+        self.hits = 0
+        self.misses = 0
+
+        self.evict()
+
+
+    def key(self, rows: list[str], rack: str, t: Trie, values: dict[str, int]|None = None) -> tuple[str, bool]:
+        rows, flipped = canonical_rows(rows)
+        values = letter_values if values is None else values
+
+        h = hashlib.sha256()
+        h.update(lexicon_fingerprint(t).encode("ascii"))
+        h.update(json.dumps(sorted(values.items()), ensure_ascii=False).encode("utf-8"))
+        h.update("\n".join(rows).encode("utf-8"))
+        h.update(b"\n")
+        h.update("".join(sorted(rack)).encode("utf-8"))
+
+        return h.hexdigest(), flipped
+
+
+    def get(self, rows: list[str], rack: str, top: int|None, t: Trie, values: dict[str, int]|None = None) -> list[tuple[PositionedWord, int]]|None:
+        """The best `top` moves (all for None) if an entry holds at least as many"""
+        key, flipped = self.key(rows, rack, t, values)
+
+        with self.lock:
+            row = self.conn.execute("SELECT top, moves FROM analyses WHERE key = ?", (key,)).fetchone()
+            if row is None or (row[0] != ALL_MOVES and (top is None or row[0] < top)):
+                self.misses += 1
+                return None
+
+            self.conn.execute("UPDATE analyses SET last_used = ? WHERE key = ?", (time.time(), key))
+            self.conn.commit()
+            self.hits += 1
+
+        moves = [(move_from_dict(d), d["score"]) for d in json.loads(row[1])]
+        if flipped:
+            moves = [(_transpose_move(pw), score) for pw, score in moves]
+
+        return moves if top is None else moves[:top]
+
+
+    def put(self, rows: list[str], rack: str, top: int|None, t: Trie, moves: list[tuple[PositionedWord, int]], values: dict[str, int]|None = None):
+        """Store the best moves of a position, `top` of them or all of them for None"""
+        key, flipped = self.key(rows, rack, t, values)
+        if flipped:
+            moves = [(_transpose_move(pw), score) for pw, score in moves]
+
+        data = json.dumps([move_to_dict(pw, score) for pw, score in moves], ensure_ascii=False)
+        stored_top = ALL_MOVES if top is None else top
+
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO analyses (key, top, moves, size, last_used) VALUES (?, ?, ?, ?, ?)",
+                (key, stored_top, data, len(data), time.time()),
+            )
+            self.conn.commit()
+            self.n_stored += 1
+
+        if self.n_stored % EVICT_EVERY == 0:
+            self.evict()
+
+
+    def evict(self):
+        """Drop the least recently used entries while over a limit"""
+        with self.lock:
+            while True:
+                n_entries, n_bytes = self.conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM analyses").fetchone()
+                if n_entries <= self.max_entries and n_bytes <= self.max_bytes:
+                    break
+
+                n_drop = max(1, int(n_entries * EVICT_FRACTION), n_entries - self.max_entries)
+                self.conn.execute(
+                    "DELETE FROM analyses WHERE key IN (SELECT key FROM analyses ORDER BY last_used LIMIT ?)",
+                    (n_drop,),
+                )
+                self.conn.commit()
+
+
+    def stats(self) -> dict:
+        with self.lock:
+            n_entries, n_bytes = self.conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM analyses").fetchone()
+
+        return {"entries": n_entries, "bytes": n_bytes, "hits": self.hits, "misses": self.misses}
+
+
+    def close(self):
+        self.conn.close()
+
+
+
+_cache: AnalysisCache|None = None
+
+
+def open_cache(path: str|None, max_entries: int = DEFAULT_MAX_ENTRIES, max_bytes: int = DEFAULT_MAX_BYTES) -> AnalysisCache|None:
+    """Make a cache file the cache of this process (None turns it off)"""
+    global _cache
+
+    if _cache is not None:
+        _cache.close()
+
+    _cache = None if path is None else AnalysisCache(path, max_entries, max_bytes)
+    return _cache
+
+
+def get_cache() -> AnalysisCache|None:
+    """The cache of this process, None unless open_cache was called"""
+    return _cache
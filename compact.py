@@ -0,0 +1,622 @@
+import json
+import mmap
+import os
+import tempfile
+from array import array
+from bisect import bisect_left
+
+from searcher import (
+    WORDLIST_PATH, BloomFilter, LinePlan, PlayLetter, PlayWord, QueryResult, QueryUpResult, Trie, TrieNode, UpPath,
+    create_greek_trie, fulfills_query, get_jump_letter, get_trie, set_trie,
+)
+
+# A compiled lexicon is one flat buffer:
+#
+#   b"LEX1" | uint32 header length | JSON header | padding | arrays
+#
+# The header holds the alphabet, the anchor index keys and where each
+# array lives in the buffer. Nothing in it is a python object, so any
+# number of processes can mmap the same file read-only and share its
+# pages without reference counting un-sharing them.
+
+MAGIC = b"LEX1"
+NO_LETTER = 255
+ALIGN = 8
+
+
+def _align(n: int) -> int:
+    return (n + ALIGN - 1) // ALIGN * ALIGN
+
+
+def compile_trie(t: Trie) -> bytes:
+    """Serialize a built trie to the compact lexicon format"""
+    alphabet = sorted({node.letter for node in t.nodes[1:]})
+    letter_ids = {letter: i for i, letter in enumerate(alphabet)}
+
+    node_letter = array("B")
+    node_depth = array("B")
+    node_terminal = array("B")
+    node_parent = array("i")
+    node_min = array("B")
+    node_max = array("B")
+    node_need = array("I")
+    edge_start = array("i")
+    edge_letter = array("B")
+    edge_target = array("i")
+
+    for node in t.nodes:
+        node_letter.append(letter_ids.get(node.letter, NO_LETTER))
+        node_depth.append(node.depth)
+        node_terminal.append(node.terminal)
+        node_parent.append(node.parent)
+        node_min.append(node.min_remaining)
+        node_max.append(node.max_remaining)
+        node_need.append(node.need_mask)
+
+        # edges sorted by letter id so lookups can bisect
+        edge_start.append(len(edge_target))
+        for letter, target in sorted(node.edges.items(), key=lambda e: letter_ids[e[0]]):
+            edge_letter.append(letter_ids[letter])
+            edge_target.append(target)
+
+    edge_start.append(len(edge_target))
+
+    # the anchor index already holds the node_tracker lists
+    anchors = t.anchors if len(t.anchors) > 0 else t.node_tracker
+    keys = sorted(anchors.keys())
+    anchor_start = array("i")
+    anchor_nodes = array("i")
+    for key in keys:
+        anchor_start.append(len(anchor_nodes))
+        anchor_nodes.extend(anchors[key])
+
+    anchor_start.append(len(anchor_nodes))
+
+    bloom = array("B", t.bloom.bits if t.bloom is not None else b"")
+
+    arrays = {
+        "node_letter": node_letter,
+        "node_depth": node_depth,
+        "node_terminal": node_terminal,
+        "node_parent": node_parent,
+        "node_min": node_min,
+        "node_max": node_max,
+        "node_need": node_need,
+        "edge_start": edge_start,
+        "edge_letter": edge_letter,
+        "edge_target": edge_target,
+        "anchor_start": anchor_start,
+        "anchor_nodes": anchor_nodes,
+        "bloom_bits": bloom,
+    }
+
+    layout = {}
+    offset = 0
+    for name, arr in arrays.items():
+        layout[name] = [offset, arr.typecode, len(arr)]
+        offset = _align(offset + len(arr) * arr.itemsize)
+
+    header = json.dumps({
+        "alphabet": alphabet,
+        "keys": keys,
+        "letter_bits": t.letter_bits,
+        "n_nodes": len(t.nodes),
+        "n_words": len(t),
+        "version": t.version,
+        "bloom": None if t.bloom is None else [t.bloom.n_bits, t.bloom.n_hashes],
+        "arrays": layout,
+    }, ensure_ascii=False).encode("utf-8")
+
+    data_start = _align(8 + len(header))
+    out = bytearray(data_start + offset)
+    out[:4] = MAGIC
+    out[4:8] = len(header).to_bytes(4, "little")
+    out[8:8+len(header)] = header
+
+    for name, arr in arrays.items():
+        start = data_start + layout[name][0]
+        out[start:start + len(arr) * arr.itemsize] = arr.tobytes()
+
+    return bytes(out)
+
+
+class CompactNode:
+    """TrieNode look-alike reading its fields from the compact arrays"""
+
+    __slots__ = ("ct", "index")
+
+    def __init__(self, ct: "CompactTrie", index: int):
+        self.ct = ct
+        self.index = index
+
+    @property
+    def letter(self) -> str:
+        letter_id = self.ct.node_letter[self.index]
+        return "" if letter_id == NO_LETTER else self.ct.alphabet[letter_id]
+
+    @property
+    def depth(self) -> int:
+        return self.ct.node_depth[self.index]
+
+    @property
+    def terminal(self) -> bool:
+        return bool(self.ct.node_terminal[self.index])
+
+    @property
+    def parent(self) -> int:
+        return self.ct.node_parent[self.index]
+
+    @property
+    def min_remaining(self) -> int:
+        return self.ct.node_min[self.index]
+
+    @property
+    def max_remaining(self) -> int:
+        return self.ct.node_max[self.index]
+
+    @property
+    def need_mask(self) -> int:
+        return self.ct.node_need[self.index]
+
+    @property
+    def edges(self) -> dict[str, int]:
+        ct = self.ct
+        alphabet, edge_letter, edge_target = ct.alphabet, ct.edge_letter, ct.edge_target
+        return {
+            alphabet[edge_letter[k]]: edge_target[k]
+            for k in range(ct.edge_start[self.index], ct.edge_start[self.index+1])
+        }
+
+    def to_node(self) -> TrieNode:
+        return TrieNode(
+            self.letter, self.index, self.depth, self.terminal, self.parent, self.edges,
+            self.min_remaining, self.max_remaining, self.need_mask,
+        )
+
+
+class _NodeView:
+    """Sequence of nodes built on demand from the compact arrays"""
+
+    def __init__(self, ct: "CompactTrie"):
+        self.ct = ct
+
+    def __len__(self):
+        return self.ct.n_nodes
+
+    def __getitem__(self, idx: int) -> CompactNode:
+        return CompactNode(self.ct, idx)
+
+
+class _AnchorView:
+    """Read-only anchor index mapping over the compact arrays"""
+
+    def __init__(self, ct: "CompactTrie", keys: list[str]):
+        self.ct = ct
+        self.key_index = {key: i for i, key in enumerate(keys)}
+
+    def __len__(self):
+        return len(self.key_index)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.key_index
+
+    def __getitem__(self, key: str):
+        i = self.key_index[key]
+        return self.ct.anchor_nodes[self.ct.anchor_start[i]:self.ct.anchor_start[i+1]]
+
+    def keys(self):
+        return self.key_index.keys()
+
+    def items(self):
+        return ((key, self[key]) for key in self.key_index)
+
+
+class CompactTrie(Trie):
+    """Read-only Trie over a compiled lexicon buffer"""
+
+    def __init__(self, buffer):
+        mv = memoryview(buffer)
+        if bytes(mv[:4]) != MAGIC:
+            raise ValueError("Not a compiled lexicon")
+
+        header_len = int.from_bytes(mv[4:8], "little")
+        header = json.loads(bytes(mv[8:8+header_len]).decode("utf-8"))
+        data_start = _align(8 + header_len)
+
+        self.buffer = buffer
+        self.alphabet: list[str] = header["alphabet"]
+        self.letter_ids = {letter: i for i, letter in enumerate(self.alphabet)}
+        self.n_nodes: int = header["n_nodes"]
+        self.n_words: int = header["n_words"]
+        self.letter_bits: dict[str, int] = header["letter_bits"]
+
+        for name, (offset, typecode, length) in header["arrays"].items():
+            itemsize = array(typecode).itemsize
+            start = data_start + offset
+            setattr(self, name, mv[start:start + length * itemsize].cast(typecode))
+
+        self.nodes = _NodeView(self)
+        self.anchors = _AnchorView(self, header["keys"])
+
+        self.bloom = None
+        if header.get("bloom") is not None:
+            n_bits, n_hashes = header["bloom"]
+            self.bloom = BloomFilter(n_bits, n_hashes, self.bloom_bits)
+
+        # single letter keys of the anchor index are the node_tracker
+        self.node_tracker = self.anchors
+        self.version: int = header.get("version", 0)
+
+
+    def child(self, idx: int, letter: str) -> int:
+        """Index of the child of node `idx` through `letter`, else -1"""
+        letter_id = self.letter_ids.get(letter)
+        if letter_id is None:
+            return -1
+
+        hi = self.edge_start[idx+1]
+        k = bisect_left(self.edge_letter, letter_id, self.edge_start[idx], hi)
+        if k < hi and self.edge_letter[k] == letter_id:
+            return self.edge_target[k]
+
+        return -1
+
+
+    def is_terminal(self, idx: int) -> bool:
+        return bool(self.node_terminal[idx])
+
+
+    def children(self, idx: int):
+        alphabet, edge_letter, edge_target = self.alphabet, self.edge_letter, self.edge_target
+        return [(alphabet[edge_letter[k]], edge_target[k]) for k in range(self.edge_start[idx], self.edge_start[idx+1])]
+
+
+    def walk(self, letters, idx: int = 0) -> int:
+        for letter in letters:
+            idx = self.child(idx, letter)
+            if idx < 0:
+                return -1
+
+        return idx
+
+
+    # the query walks of Trie over the arrays, with node indices in
+    # place of TrieNode objects
+
+    def _up_letters(self, idx: int, query: str, query_start: int) -> list[str]|None:
+        # letters above node `idx`, nearest first, when they match the
+        # query going left from query_start, else None
+        node_parent, node_letter, alphabet = self.node_parent, self.node_letter, self.alphabet
+        letters = []
+        query_index = query_start
+        idx = node_parent[idx]
+        while idx != 0:
+            query_index -= 1
+            if query_index < 0:
+                return None
+
+            letter = alphabet[node_letter[idx]]
+            if not fulfills_query(letter, query[query_index]):
+                return None
+
+            letters.append(letter)
+            idx = node_parent[idx]
+
+        return letters
+
+
+    def _query_up(self, idx: int, query: str, query_start: int, jumps: list[str]) -> QueryUpResult|None:
+        if self.node_depth[idx] > query_start + 1:
+            return None
+
+        letters = self._up_letters(idx, query, query_start)
+        if letters is None:
+            return None
+
+        left_nei_pos = query_start - len(letters) - 1
+        if left_nei_pos >= 0 and not query[left_nei_pos].isspace():
+            return None
+
+        our_jumps = jumps.copy()
+        prefix = []
+        for i, letter in enumerate(letters, 1):
+            jmp = letter
+            if query[query_start-i].isspace():
+                jmp = get_jump_letter(letter, our_jumps)
+                if jmp is None:
+                    return None
+
+                our_jumps.remove(jmp)
+
+            prefix.append(PlayLetter(letter=jmp, wildcard_letter=letter))
+
+        prefix.reverse()
+        return QueryUpResult(prefix=prefix, jumps=our_jumps)
+
+
+    def _query_down(self, idx: int, query: str, query_start: int, jumps: list[str], initial_jumps: list[str], line_info=None) -> list[PlayWord]:
+        if line_info is None:
+            line_info = self._line_info(query)
+
+        empties, board_masks = line_info
+        node_terminal, node_min, node_max, node_need = self.node_terminal, self.node_min, self.node_max, self.node_need
+        edge_start, edge_letter, edge_target, alphabet = self.edge_start, self.edge_letter, self.edge_target, self.alphabet
+        letter_bits = self.letter_bits
+        n = len(query)
+        results = []
+
+        if query_start + node_min[idx] >= n:
+            return results
+
+        def dfs_down(idx: int, jumps: list[str], prefix: PlayWord, query_index: int):
+            if node_terminal[idx] and jumps != initial_jumps:
+                results.append(prefix)
+
+            query_index += 1
+            if query_index >= n or node_max[idx] == 0:
+                return
+
+            query_letter = query[query_index]
+            free = query_letter.isspace()
+            jumps_mask = self.letters_mask(jumps)
+
+            for k in range(edge_start[idx], edge_start[idx+1]):
+                letter = alphabet[edge_letter[k]]
+                if not free and letter != query_letter:
+                    continue
+
+                new_jumps = jumps
+                jmp_letter = letter
+                new_mask = jumps_mask
+                if free:
+                    jmp_letter = get_jump_letter(letter, jumps)
+                    if jmp_letter is None:
+                        continue
+
+                    new_jumps = jumps.copy()
+                    new_jumps.remove(jmp_letter)
+                    if jmp_letter not in new_jumps:
+                        new_mask &= ~letter_bits.get(jmp_letter, 0)
+
+                child = edge_target[k]
+                last_index = query_index + node_min[child]
+                if last_index >= n or empties[last_index+1] - empties[query_index+1] > len(new_jumps):
+                    continue
+
+                missing = node_need[child] & ~(new_mask | board_masks[query_index+1])
+                if missing != 0 and missing.bit_count() > new_jumps.count("*"):
+                    continue
+
+                dfs_down(child, new_jumps, prefix + [PlayLetter(letter=jmp_letter, wildcard_letter=letter)], query_index)
+
+        dfs_down(idx, jumps, [], query_start)
+
+        return [suffix for suffix in results if query_start + len(suffix) + 1 >= n or query[query_start+len(suffix)+1].isspace()]
+
+
+    def plan_line(self, qu: str) -> LinePlan:
+        qu = qu.replace(".", " ")
+        index = self.anchors
+
+        ups = dict()
+        for start in self._find_starts(qu):
+            if qu[start] not in index:
+                continue
+
+            i = start
+            while i >= 0 and qu[i:start+1] in index:
+                i -= 1
+
+            for start_node in index[qu[i+1:start+1]]:
+                if self.node_depth[start_node] > start + 1:
+                    continue
+
+                letters = self._up_letters(start_node, qu, start)
+                if letters is None:
+                    continue
+
+                left_nei_pos = start - len(letters) - 1
+                if left_nei_pos < 0 or qu[left_nei_pos].isspace():
+                    path = [(letter, qu[start-i].isspace()) for i, letter in enumerate(letters, 1)]
+                    free = [letter for letter, is_free in path if is_free]
+                    key = (len(free), self.letters_mask(free))
+                    ups.setdefault(key, []).append(UpPath(start_node, start, path))
+
+        return LinePlan(qu, self._line_info(qu), ups)
+
+
+    def _query_ups(self, group: list[UpPath], qu: str, jumps: list[str], line_info, memo: dict) -> list[QueryResult]:
+        results = []
+        for up in group:
+            if up.start + self.node_min[up.node] >= len(qu):
+                continue
+
+            our_jumps = jumps.copy()
+            prefix = []
+            for letter, free in up.path:
+                jmp = letter
+                if free:
+                    jmp = get_jump_letter(letter, our_jumps)
+                    if jmp is None:
+                        break
+
+                    our_jumps.remove(jmp)
+
+                prefix.append(PlayLetter(letter=jmp, wildcard_letter=letter))
+
+            else:
+                prefix.reverse()
+                used_up = len(jumps) - len(our_jumps)
+
+                for suffix, used in self._suffixes(up.node, qu, up.start, our_jumps, line_info, memo):
+                    if used_up + used == 0:
+                        continue
+
+                    right_nei_idx = up.start + len(suffix) + 1
+                    if right_nei_idx < len(qu) and not qu[right_nei_idx].isspace():
+                        continue
+
+                    word = prefix + [PlayLetter(letter=qu[up.start])] + list(suffix)
+                    results.append(QueryResult(up.start-len(prefix), word))
+
+        return results
+
+
+    def _suffixes(self, idx: int, query: str, query_index: int, jumps: list[str], line_info, memo: dict) -> list[tuple[tuple[PlayLetter, ...], int]]:
+        key = (idx, query_index, tuple(sorted(jumps)))
+        if key in memo:
+            return memo[key]
+
+        empties, board_masks = line_info
+        results = []
+
+        if self.node_terminal[idx]:
+            results.append(((), 0))
+
+        next_index = query_index + 1
+        if next_index < len(query) and self.node_max[idx] > 0:
+            query_letter = query[next_index]
+            free = query_letter.isspace()
+            jumps_mask = self.letters_mask(jumps)
+
+            for letter, child in self.children(idx):
+                if not free and letter != query_letter:
+                    continue
+
+                new_jumps = jumps
+                jmp_letter = letter
+                new_mask = jumps_mask
+                if free:
+                    jmp_letter = get_jump_letter(letter, jumps)
+                    if jmp_letter is None:
+                        continue
+
+                    new_jumps = jumps.copy()
+                    new_jumps.remove(jmp_letter)
+                    if jmp_letter not in new_jumps:
+                        new_mask &= ~self.letter_bits.get(jmp_letter, 0)
+
+                last_index = next_index + self.node_min[child]
+                if last_index >= len(query) or empties[last_index+1] - empties[next_index+1] > len(new_jumps):
+                    continue
+
+                missing = self.node_need[child] & ~(new_mask | board_masks[next_index+1])
+                if missing != 0 and missing.bit_count() > new_jumps.count("*"):
+                    continue
+
+                play_letter = PlayLetter(letter=jmp_letter, wildcard_letter=letter)
+                for suffix, used in self._suffixes(child, query, next_index, new_jumps, line_info, memo):
+                    results.append(((play_letter,) + suffix, used + free))
+
+        memo[key] = results
+        return results
+
+
+    def words(self):
+        stack = [(0, "")]
+        while stack:
+            idx, prefix = stack.pop()
+            if self.node_terminal[idx]:
+                yield prefix
+
+            for k in range(self.edge_start[idx], self.edge_start[idx+1]):
+                stack.append((self.edge_target[k], prefix + self.alphabet[self.edge_letter[k]]))
+
+
+    def create_node(self, letter, parent_idx):
+        raise TypeError("CompactTrie is read-only")
+
+
+    def add(self, word):
+        raise TypeError("CompactTrie is read-only")
+
+
+    def add_words(self, words):
+        raise TypeError("CompactTrie is read-only, update a snapshot() of it")
+
+
+    def remove_words(self, words):
+        raise TypeError("CompactTrie is read-only, update a snapshot() of it")
+
+
+    def annotate(self):
+        raise TypeError("CompactTrie is read-only")
+
+
+    def build_anchor_index(self, budget=None):
+        raise TypeError("CompactTrie is read-only")
+
+
+    def build_bloom(self, bits_per_word=None):
+        raise TypeError("CompactTrie is read-only")
+
+
+    def snapshot(self) -> Trie:
+        """A mutable Trie with the same nodes, anchors and Bloom filter"""
+        t = Trie()
+        t.nodes = [self.nodes[idx].to_node() for idx in range(self.n_nodes)]
+        t.n_words = self.n_words
+        t.letter_bits = dict(self.letter_bits)
+
+        t.anchors = {key: list(nodes) for key, nodes in self.anchors.items()}
+        t.node_tracker = {key: nodes for key, nodes in t.anchors.items() if len(key) == 1}
+
+        if self.bloom is not None:
+            t.bloom = BloomFilter(self.bloom.n_bits, self.bloom.n_hashes, bytearray(self.bloom.bits))
+
+        t.version = self.version + 1
+        return t
+
+
+
+def save_compact(t: Trie, path: str):
+    with open(path, "wb") as f:
+        f.write(compile_trie(t))
+
+
+def load_compact(path: str) -> CompactTrie:
+    """Map a compiled lexicon file, sharing its pages with other readers"""
+    with open(path, "rb") as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    return CompactTrie(mapped)
+
+
+def share_trie(t: Trie) -> str:
+    """Write a compiled lexicon to shared memory, returning its path"""
+    shm_dir = "/dev/shm" if os.path.isdir("/dev/shm") else None
+
+    fd, path = tempfile.mkstemp(prefix="lexicon-", suffix=".bin", dir=shm_dir)
+    with os.fdopen(fd, "wb") as f:
+        f.write(compile_trie(t))
+
+    return path
+
+
+def attach_trie(path: str) -> CompactTrie:
+    """Map a shared lexicon and make it the lexicon of this process"""
+    ct = load_compact(path)
+    set_trie(ct)
+
+    return ct
+
+
+def share_current_trie() -> str:
+    """Move this process' lexicon to shared memory before forking workers"""
+    path = share_trie(get_trie())
+
+    # drop the private copy, from here on we read the shared pages too
+    attach_trie(path)
+
+    return path
+
+
+
+if __name__ == "__main__":
+    import sys
+
+    out_path = sys.argv[1] if len(sys.argv) > 1 else "lexicon.bin"
+    wordlist_path = sys.argv[2] if len(sys.argv) > 2 else WORDLIST_PATH
+    save_compact(create_greek_trie(wordlist_path), out_path)
+
+    print(f"Wrote {out_path} ({os.path.getsize(out_path)} bytes)")
@@ -0,0 +1,298 @@
+import itertools
+import json
+from dataclasses import dataclass
+from math import comb
+
+from main import BONUS_POINTS, LETTER_DATA, LETTER_IDS, LetterData, PositionedWord, ScoringEngine
+from tiles import RACK_SIZE, TILE_IDS, TILE_LETTERS
+
+# Whether to play, exchange or pass. A turn is worth its score plus what
+# the rack is expected to be worth after drawing: the leave (the tiles
+# kept) and the tiles drawn from the unseen pool to refill it. A rack is
+# valued letter by letter plus a penalty for too many vowels or too many
+# consonants, so the expectation over every possible draw splits into a
+# hypergeometric distribution per letter and one over the vowel and
+# blank counts, computed once per draw size for all the leaves of a rack.
+# Given the rack-fit matrix of the lexicon (rackfit.py), a leave is also
+# worth the words of a whole rack its refill can form.
+
+VOWELS = frozenset("ΑΕΗΙΟΥΩ")
+
+# value of keeping one copy of a letter: 1 for a letter worth 1 point,
+# falling with the points of the letter, which are hard to play
+LEAVE_BASE = 1.0
+LEAVE_PER_POINT = 0.6
+BLANK_LEAVE = 15.0
+
+# each pair of copies of the same letter costs this much
+DUPLICATE_PENALTY = 2.0
+
+# times the squared distance from an even vowel/consonant split
+BALANCE_WEIGHT = 1.5
+
+# times the expected number of words of a whole rack the refill forms,
+# capped at one: half the bonus, a bingo still needs a place to go
+BINGO_WEIGHT = BONUS_POINTS / 2
+
+# tiles the bag must hold for an exchange
+EXCHANGE_MIN_BAG = RACK_SIZE
+
+# the game ends after this many turns in a row without a score
+MAX_SCORELESS_TURNS = 6
+
+
+@dataclass
+class LeaveTable:
+    """Value of holding 0..RACK_SIZE copies of each tile, in TILE_IDS order"""
+    values: list[list[float]]
+    balance_weight: float = BALANCE_WEIGHT
+    bingo_weight: float = BINGO_WEIGHT
+
+    def balance(self, n_vowels: int, n_letters: int) -> float:
+        """Penalty of a rack with n_vowels vowels among n_letters real letters"""
+        off = max(0, abs(2 * n_vowels - n_letters) - 1)
+        return -self.balance_weight * off * off / 4
+
+
+
+def default_leave_table(letter_data: list[LetterData] = LETTER_DATA) -> LeaveTable:
+    values = []
+    for ld in letter_data:
+        if ld.letter == "*":
+            single, duplicate = BLANK_LEAVE, 0.0
+        else:
+            single, duplicate = LEAVE_BASE - LEAVE_PER_POINT * (ld.value - 1), DUPLICATE_PENALTY
+
+        values.append([n * single - duplicate * n * (n - 1) / 2 for n in range(RACK_SIZE + 1)])
+
+    return LeaveTable(values)
+
+
+def load_leave_table(path: str, letter_data: list[LetterData] = LETTER_DATA) -> LeaveTable:
+    """The default table with the rows of a JSON file, {letter: [value of 0, 1, ... copies]}"""
+    with open(path, encoding="utf-8") as f:
+        overrides = json.load(f)
+
+    table = default_leave_table(letter_data)
+    for letter, row in overrides.items():
+        if letter not in TILE_IDS:
+            raise ValueError(f"{path}: not a tile: {letter!r}")
+
+        if len(row) != RACK_SIZE + 1:
+            raise ValueError(f"{path}: {letter!r} needs {RACK_SIZE + 1} values")
+
+        table.values[TILE_IDS[letter]] = [float(v) for v in row]
+
+    return table
+
+
+def counts_of(letters: str) -> list[int]:
+    counts = [0] * len(TILE_LETTERS)
+    for letter in letters:
+        counts[TILE_IDS[letter]] += 1
+
+    return counts
+
+
+def letters_of(counts: list[int]) -> str:
+    return "".join(letter * n for letter, n in zip(TILE_LETTERS, counts))
+
+
+def hypergeometric(n_good: int, n_total: int, n_draw: int) -> list[float]:
+    """P(k of the n_good tiles among n_draw drawn from n_total), k = 0..n_draw"""
+    total = comb(n_total, n_draw)
+    return [comb(n_good, k) * comb(n_total - n_good, n_draw - k) / total for k in range(n_draw + 1)]
+
+
+@dataclass
+class Decision:
+    kind: str                       # "M", "X" or "P", as in records.py
+    equity: float
+    move: PositionedWord|None = None
+    score: int = 0
+    leave: str = ""                 # the tiles kept
+    returned: str = ""              # the tiles put back, for an exchange
+
+
+class LeaveEvaluator:
+    """Expected rack values of the leaves of racks, for one unseen pool
+
+    `unseen` are the tile counts the player cannot see (TILE_IDS order),
+    which the draws are taken to come from uniformly, and `bag_size` the
+    tiles left to draw. With a rackfit.RackFit of the lexicon, leaves
+    also get the bingo term of the table.
+    """
+
+    def __init__(self, unseen: list[int], bag_size: int, table: LeaveTable|None = None, rack_size: int = RACK_SIZE, rack_fit=None):
+        self.unseen = list(unseen)
+        self.n_unseen = sum(self.unseen)
+        self.bag_size = bag_size
+        self.table = default_leave_table() if table is None else table
+        self.rack_size = rack_size
+        self.rack_fit = rack_fit
+
+        if rack_fit is not None:
+            import numpy as np
+
+            # C(unseen copies, k) for the letters of the matrix columns
+            letters = sorted(LETTER_IDS, key=LETTER_IDS.get)
+            self.combs = np.array([[comb(self.unseen[TILE_IDS[letter]], k) for k in range(rack_size + 1)] for letter in letters], dtype=np.float64)
+
+        self.draws: dict[int, tuple] = dict()
+        self.values: dict[str, float] = dict()
+
+
+    def _draw(self, n: int) -> tuple:
+        """Distributions of a draw of n tiles: per letter, and of its (vowels, blanks)"""
+        draw = self.draws.get(n)
+        if draw is None:
+            per_letter = [hypergeometric(k, self.n_unseen, n) if k > 0 else [1.0] for k in self.unseen]
+
+            n_vowels = sum(self.unseen[TILE_IDS[letter]] for letter in VOWELS)
+            n_blanks = self.unseen[TILE_IDS["*"]]
+            n_others = self.n_unseen - n_vowels - n_blanks
+            total = comb(self.n_unseen, n)
+
+            classes = []
+            for v in range(min(n, n_vowels) + 1):
+                for b in range(min(n - v, n_blanks) + 1):
+                    p = comb(n_vowels, v) * comb(n_blanks, b) * comb(n_others, n - v - b) / total
+                    if p > 0:
+                        classes.append((v, b, p))
+
+            draw = self.draws[n] = (per_letter, classes)
+
+        return draw
+
+
+    def leave_value(self, leave: str) -> float:
+        """Expected value of the rack a leave is refilled to"""
+        key = "".join(sorted(leave))
+        value = self.values.get(key)
+        if value is None:
+            counts = counts_of(key)
+            value = self._expected(counts)
+            if self.rack_fit is not None:
+                value += self.table.bingo_weight * min(1.0, self._bingos(counts))
+
+            self.values[key] = value
+
+        return value
+
+
+    def _expected(self, counts: list[int]) -> float:
+        n_kept = sum(counts)
+        n = min(self.rack_size - n_kept, self.bag_size, self.n_unseen)
+        per_letter, classes = self._draw(n)
+
+        values = self.table.values
+        expected = 0.0
+        for i, pmf in enumerate(per_letter):
+            row = values[i]
+            kept = counts[i]
+            expected += sum(p * row[kept + k] for k, p in enumerate(pmf))
+
+        kept_vowels = sum(counts[TILE_IDS[letter]] for letter in VOWELS)
+        kept_letters = n_kept - counts[TILE_IDS["*"]]
+        for v, b, p in classes:
+            expected += p * self.table.balance(kept_vowels + v, kept_letters + n - b)
+
+        return expected
+
+
+    def _bingos(self, counts: list[int]) -> float:
+        """Expected number of words of rack_size letters the refilled rack can form
+
+        A word takes the real tiles kept and a draw of its other letters,
+        less as many of them as there are blanks kept. Drawn blanks are
+        not counted, so this is a lower bound.
+        """
+        import numpy as np
+
+        n = self.rack_size - sum(counts)
+        if n > min(self.bag_size, self.n_unseen):
+            return 0.0
+
+        fit = self.rack_fit
+        leave = letters_of(counts)
+        rows = fit.formable(leave, blanks=n, min_len=self.rack_size, max_len=self.rack_size)
+        if len(rows) == 0:
+            return 0.0
+
+        # every kept tile is in each of these words
+        kept, n_blanks = fit.rack_counts(leave)
+        missing = fit.counts[rows].astype(np.int64) - kept
+        columns = np.arange(missing.shape[1])
+
+        total = 0.0
+        for covered in itertools.combinations_with_replacement(np.flatnonzero(missing.any(axis=0)).tolist(), n_blanks):
+            need = missing.copy()
+            for letter_id in covered:
+                need[:, letter_id] -= 1
+
+            need = need[(need >= 0).all(axis=1)]
+            total += float(np.prod(self.combs[columns, need], axis=1).sum())
+
+        return total / comb(self.n_unseen, n)
+
+
+    def leaves(self, rack: str) -> dict[str, float]:
+        """Every distinct leave of a rack (sorted tiles) and its value"""
+        counts = counts_of(rack)
+        present = [i for i, n in enumerate(counts) if n > 0]
+
+        out = dict()
+        for kept in itertools.product(*(range(counts[i] + 1) for i in present)):
+            leave = "".join(TILE_LETTERS[i] * n for i, n in zip(present, kept))
+            out[leave] = self.leave_value(leave)
+
+        return out
+
+
+    def best_exchange(self, rack: str) -> Decision:
+        """The best exchange of a rack, or passing if no exchange is allowed"""
+        rack = "".join(sorted(rack))
+        best = Decision("P", self.leave_value(rack), leave=rack)
+
+        if self.bag_size < EXCHANGE_MIN_BAG:
+            return best
+
+        rack_counts = counts_of(rack)
+        for leave, value in self.leaves(rack).items():
+            if len(leave) < len(rack) and value > best.equity:
+                returned = [n - k for n, k in zip(rack_counts, counts_of(leave))]
+                best = Decision("X", value, leave=leave, returned=letters_of(returned))
+
+        return best
+
+
+    def choose(self, rack: str, plays: list[tuple[PositionedWord, int]], engine: ScoringEngine) -> Decision:
+        """Play, exchange or pass, whichever is worth most
+
+        `plays` are (move, score), best score first, as best_moves and
+        get_words_sorted give them. Only plays whose score leaves them
+        a chance at the best equity get their leave valued.
+        """
+        best = self.best_exchange(rack)
+        if len(plays) == 0:
+            return best
+
+        leave_values = self.leaves(rack).values()
+        spread = max(leave_values) - min(leave_values)
+        min_score = plays[0][1] - spread
+
+        rack_counts = counts_of(rack)
+        best_play = None
+        for pw, score in plays:
+            if score < min_score:
+                break
+
+            played = counts_of("".join(pl.play_letter.letter for pl in engine.move_letters(pw)))
+            leave = letters_of([n - k for n, k in zip(rack_counts, played)])
+
+            equity = score + self.leave_value(leave)
+            if best_play is None or equity > best_play.equity:
+                best_play = Decision("M", equity, pw, score, leave)
+
+        # a play wins ties with an exchange or a pass
+        return best_play if best_play.equity >= best.equity else best
@@ -0,0 +1,252 @@
+import weakref
+from dataclasses import dataclass
+
+from main import (
+    BOARD, BOARD_SIZE, BONUS_POINTS, BONUS_TILES, LETTER_IDS, LETTER_MULT_LINES, WORD_MULT_LINES, Cell, Orientation,
+    PositionedWord, ScoringEngine, line_pos, other_orientation,
+)
+from searcher import NO_WORD, Trie
+from tiles import RACK_SIZE
+
+# Where the board is open, for any rack. One pass over every line looks
+# at each stretch of squares a move could cover: the free squares need a
+# letter their cross word allows, the stretch has to touch the board and
+# take at most a rackful of tiles, and the runs of board letters in it
+# have to leave room before and after them for a word of the lexicon,
+# read off the nodes of the anchor index. Every square then gets the
+# figures of the best stretch covering it. They are upper bounds: tile
+# counts and which words actually fit are not checked.
+
+
+@dataclass
+class SquareHeat:
+    allowed: int = 0        # LETTER_IDS bitmask of the letters a move can put here
+    max_len: int = 0        # longest word a move covering the square can form
+    bingo: bool = False     # whether a move using BONUS_TILES tiles can cover it
+    hooks: int = 0          # directions in which a tile here forms a cross word
+    bound: int = 0          # most a move covering the square can score
+
+    @property
+    def n_letters(self) -> int:
+        return self.allowed.bit_count()
+
+    @property
+    def reachable(self) -> bool:
+        return self.max_len > 0
+
+
+@dataclass
+class Heatmap:
+    squares: list[list[SquareHeat|None]]    # [y][x], None on a tile
+
+    def get(self, pos: tuple[int, int]) -> SquareHeat|None:
+        x, y = pos
+        return self.squares[y][x]
+
+    @property
+    def max_bound(self) -> int:
+        return max((sq.bound for row in self.squares for sq in row if sq is not None), default=0)
+
+
+    def hottest(self, n: int = 10) -> list[tuple[tuple[int, int], SquareHeat]]:
+        """The n squares with the highest bounds"""
+        found = [((x, y), sq) for y, row in enumerate(self.squares) for x, sq in enumerate(row) if sq is not None and sq.reachable]
+        found.sort(key=lambda item: item[1].bound, reverse=True)
+        return found[:n]
+
+
+    def reachable(self, cell: Cell) -> list[tuple[int, int]]:
+        """The squares of a premium a move can cover"""
+        return [(x, y) for y, row in enumerate(self.squares) for x, sq in enumerate(row)
+                if sq is not None and sq.reachable and BOARD[y][x] == cell]
+
+
+
+# run -> run_extent per lexicon, dropped when the lexicon is updated
+_extents: "weakref.WeakKeyDictionary[Trie, tuple[int, dict]]" = weakref.WeakKeyDictionary()
+
+
+def _extent_cache(t: Trie) -> dict[str, tuple[int, int]|None]:
+    entry = _extents.get(t)
+    if entry is None or entry[0] != t.version:
+        entry = _extents[t] = (t.version, dict())
+
+    return entry[1]
+
+
+def run_extent(t: Trie, run: str) -> tuple[int, int]|None:
+    """Most letters a word can have before and after a run of letters, None if none has the run
+
+    Found from the nodes the anchor index lists for the longest indexed
+    end of the run, walking up from each to check the whole run.
+    """
+    index = t.anchors if len(t.anchors) > 0 else t.node_tracker
+
+    i = len(run) - 1
+    while i > 0 and run[i-1:] in index:
+        i -= 1
+
+    if run[i:] not in index:
+        return None
+
+    before = after = -1
+    for idx in index[run[i:]]:
+        node = t.nodes[idx]
+        if node.min_remaining == NO_WORD or node.depth < len(run):
+            continue
+
+        up = node
+        for letter in reversed(run[:-1]):
+            up = t.nodes[up.parent]
+            if up.letter != letter:
+                break
+        else:
+            before = max(before, node.depth - len(run))
+            after = max(after, node.max_remaining)
+
+    return None if before < 0 else (before, after)
+
+
+def _line_heat(engine: ScoringEngine, orientation: Orientation, i: int, squares: list[list[SquareHeat|None]],
+               extents: dict[str, tuple[int, int]|None], best_values: dict[int, int], max_word: int, empty_board: bool):
+    cross_orientation = other_orientation(orientation)
+    line = engine.view.lines[orientation][i]
+    letter_mult = LETTER_MULT_LINES[orientation][i]
+    word_mult = WORD_MULT_LINES[orientation][i]
+    values = engine.values
+
+    # per square: tile or not, allowed letters, whether a tile there
+    # touches the board, and the most its letter and cross word give
+    taken = [pl.letter != " " for pl in line]
+    masks = [0] * BOARD_SIZE
+    anchor = [False] * BOARD_SIZE
+    main_points = [0] * BOARD_SIZE
+    cross_points = [0] * BOARD_SIZE
+
+    for j, pl in enumerate(line):
+        if taken[j]:
+            main_points[j] = values[pl.letter]
+            continue
+
+        pos = line_pos(orientation, i, j)
+        masks[j] = engine.cross_check(pos, cross_orientation)
+        cw = engine.cross_word(pos, cross_orientation)
+
+        best = best_values.get(masks[j])
+        if best is None:
+            best = best_values[masks[j]] = max((values[letter] for letter, letter_id in LETTER_IDS.items() if masks[j] >> letter_id & 1), default=0)
+
+        main_points[j] = best * letter_mult[j]
+        if cw is not None:
+            anchor[j] = True
+            cross_points[j] = (cw.points + best * letter_mult[j]) * word_mult[j]
+
+            x, y = pos
+            if masks[j] != 0:
+                squares[y][x].hooks += 1
+
+        elif empty_board and pos == (BOARD_SIZE // 2, BOARD_SIZE // 2):
+            anchor[j] = True
+
+    # runs of tiles as (start, end, letters)
+    runs = []
+    j = 0
+    while j < BOARD_SIZE:
+        if taken[j]:
+            start = j
+            while j < BOARD_SIZE and taken[j]:
+                j += 1
+
+            runs.append((start, j - 1, "".join(pl.real_letter for pl in line[start:j])))
+        else:
+            j += 1
+
+    for run in runs:
+        if run[2] not in extents:
+            extents[run[2]] = run_extent(engine.trie, run[2])
+
+    for a in range(BOARD_SIZE):
+        if a > 0 and taken[a-1]:
+            continue
+
+        letters_sum = 0
+        mult = 1
+        cross_sum = 0
+        n_free = 0
+        touches = False
+
+        for b in range(a, BOARD_SIZE):
+            if not taken[b] and masks[b] == 0:
+                break
+
+            if not taken[b]:
+                n_free += 1
+                mult *= word_mult[b]
+                cross_sum += cross_points[b]
+
+            if n_free > RACK_SIZE or b - a + 1 > max_word:
+                break
+
+            letters_sum += main_points[b]
+            touches = touches or taken[b] or anchor[b]
+
+            if b + 1 < BOARD_SIZE and taken[b+1]:
+                continue
+
+            if not touches or n_free == 0 or b == a:
+                continue
+
+            # every run inside needs room for the letters around it
+            fits = True
+            for start, end, letters in runs:
+                if a <= start and end <= b:
+                    extent = extents[letters]
+                    if extent is None or start - a > extent[0] or b - end > extent[1]:
+                        fits = False
+                        break
+
+            if not fits:
+                continue
+
+            length = b - a + 1
+            bound = letters_sum * mult + cross_sum + (BONUS_POINTS if n_free == BONUS_TILES else 0)
+
+            for k in range(a, b + 1):
+                if taken[k]:
+                    continue
+
+                x, y = line_pos(orientation, i, k)
+                sq = squares[y][x]
+                sq.allowed |= masks[k]
+                sq.max_len = max(sq.max_len, length)
+                sq.bound = max(sq.bound, bound)
+                sq.bingo = sq.bingo or n_free == BONUS_TILES
+
+
+def compute_heatmap(engine: ScoringEngine) -> Heatmap:
+    """Per square statistics of the board of an engine, for any rack"""
+    game_board = engine.game_board
+    squares = [[SquareHeat() if pl.letter == " " else None for pl in row] for row in game_board]
+    empty_board = all(pl.letter == " " for row in game_board for pl in row)
+
+    # the longest word of the lexicon
+    max_word = engine.trie.nodes[0].max_remaining
+
+    extents = _extent_cache(engine.trie)
+
+    # most valuable letter of each cross-check mask
+    best_values = dict()
+
+    for orientation in (Orientation.HORIZONTAL, Orientation.VERTICAL):
+        for i in range(BOARD_SIZE):
+            _line_heat(engine, orientation, i, squares, extents, best_values, max_word, empty_board)
+
+    return Heatmap(squares)
+
+
+def exposure(engine: ScoringEngine, pw: PositionedWord) -> int:
+    """The highest bound on the board once a move is played, what it opens up for the reply"""
+    after = engine.copy([row[:] for row in engine.game_board])
+    after.place(engine.move_letters(pw))
+
+    return compute_heatmap(after).max_bound
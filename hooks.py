@@ -0,0 +1,194 @@
+import sys
+import threading
+import time
+import weakref
+from array import array
+
+from letters import LETTER_IDS
+from searcher import Trie, add_update_listener, get_trie
+
+ALL_LETTERS = (1 << len(LETTER_IDS)) - 1
+
+LETTER_BITS = {letter: 1 << letter_id for letter, letter_id in LETTER_IDS.items()}
+
+
+def _bit(letter: str) -> int:
+    return LETTER_BITS.get(letter, 0)
+
+
+class HookTable:
+    """Letters that can go in front of or after a run of letters
+
+    Indexed by trie node: front[i] is the bitmask (over LETTER_IDS) of
+    the letters L for which L + s is a word, s being the letters on the
+    path to node i, and back[i] of those for which s + L is one. Runs are
+    looked up by walking the trie, so nothing here holds a string.
+    """
+
+    def __init__(self, t: Trie):
+        self.t = t
+
+        n_nodes = len(t.nodes)
+        self.front = array("I", bytes(4 * n_nodes))
+        self.back = array("I", bytes(4 * n_nodes))
+
+        # walk every word keeping the bit of its first letter and the
+        # node of the rest of it, -1 once the rest is not a trie path
+        stack = []
+        for letter, idx in t.children(0):
+            stack.append((idx, _bit(letter), 0))
+
+        while stack:
+            idx, first_bit, rest = stack.pop()
+
+            if t.is_terminal(idx) and rest > 0:
+                self.front[rest] |= first_bit
+
+            for letter, child_idx in t.children(idx):
+                if t.is_terminal(child_idx):
+                    self.back[idx] |= _bit(letter)
+
+                child_rest = t.child(rest, letter) if rest >= 0 else -1
+                stack.append((child_idx, first_bit, child_rest))
+
+        for letter, idx in t.children(0):
+            if t.is_terminal(idx):
+                self.back[0] |= _bit(letter)
+
+
+    def _front_of(self, idx: int) -> int:
+        letters = self.t._path_letters(idx)
+        mask = 0
+        for letter, letter_id in LETTER_IDS.items():
+            start = self.t.child(0, letter)
+            if start < 0:
+                continue
+
+            end = self.t.walk(letters, start)
+            if end >= 0 and self.t.is_terminal(end):
+                mask |= 1 << letter_id
+
+        return mask
+
+
+    def _back_of(self, idx: int) -> int:
+        mask = 0
+        for letter, child_idx in self.t.children(idx):
+            if self.t.is_terminal(child_idx):
+                mask |= _bit(letter)
+
+        return mask
+
+
+    def derive(self, t: Trie, changed: set[int]) -> "HookTable":
+        """The table of an updated trie, redoing only the nodes the update touched"""
+        table = HookTable.__new__(HookTable)
+        table.t = t
+        table.front = array("I", self.front)
+        table.back = array("I", self.back)
+
+        n_new = len(t.nodes) - len(table.front)
+        table.front.extend(array("I", [0]) * n_new)
+        table.back.extend(array("I", [0]) * n_new)
+
+        fronts = set()
+        backs = set()
+        for idx in changed:
+            node = t.nodes[idx]
+            backs.add(idx)
+            backs.add(node.parent)
+            fronts.add(idx)
+
+            # the word ending here lost or gained its front hook
+            rest = t.walk(t._path_letters(idx)[1:])
+            if rest > 0:
+                fronts.add(rest)
+
+        for idx in fronts:
+            table.front[idx] = table._front_of(idx)
+
+        for idx in backs:
+            table.back[idx] = table._back_of(idx)
+
+        return table
+
+
+    def front_hooks(self, letters) -> int:
+        idx = self.t.walk(letters)
+        if idx > 0:
+            return self.front[idx]
+
+        # not the start of any word, but L + letters still might be one
+        mask = 0
+        for letter, letter_id in LETTER_IDS.items():
+            start = self.t.child(0, letter)
+            if start < 0:
+                continue
+
+            end = self.t.walk(letters, start)
+            if end >= 0 and self.t.is_terminal(end):
+                mask |= 1 << letter_id
+
+        return mask
+
+
+    def back_hooks(self, letters) -> int:
+        idx = self.t.walk(letters)
+        return 0 if idx < 0 else self.back[idx]
+
+
+    def cross_mask(self, before, after) -> int:
+        """Letters L for which before + L + after is a word"""
+        if len(before) == 0:
+            return self.front_hooks(after)
+
+        if len(after) == 0:
+            return self.back_hooks(before)
+
+        # a gap between two runs: walk the first run once, then the
+        # second one from every child of where it ends
+        idx = self.t.walk(before)
+        if idx < 0:
+            return 0
+
+        mask = 0
+        for letter, child_idx in self.t.children(idx):
+            end = self.t.walk(after, child_idx)
+            if end >= 0 and self.t.is_terminal(end):
+                mask |= _bit(letter)
+
+        return mask
+
+
+
+# one table per lexicon, an updated lexicon derives its own from the last
+_hook_tables: "weakref.WeakKeyDictionary[Trie, HookTable]" = weakref.WeakKeyDictionary()
+_hook_table_lock = threading.Lock()
+
+
+def get_hook_table(t: Trie|None = None) -> HookTable:
+    """Return the hook table of a lexicon (the shared one by default), building it on first use"""
+    if t is None:
+        t = get_trie()
+
+    table = _hook_tables.get(t)
+    if table is None:
+        with _hook_table_lock:
+            table = _hook_tables.get(t)
+            if table is None:
+                t0 = time.time()
+                table = _hook_tables[t] = HookTable(t)
+
+                diff = time.time() - t0
+                print(f"Building hook table took {diff:.2f}s", file=sys.stderr)
+
+    return table
+
+
+def _on_update(old: Trie, new: Trie, changed: set[int]):
+    table = _hook_tables.get(old)
+    if table is not None:
+        _hook_tables[new] = table.derive(new, changed)
+
+
+add_update_listener(_on_update)
@@ -0,0 +1,46 @@
+from typing import NamedTuple
+
+# The tiles: letters, how many of each and their points. Kept apart from
+# main.py so the lexicon-side modules can use them without the board.
+
+class LetterData(NamedTuple):
+    letter: str
+    n_count: int
+    value: int
+
+
+# http://greekscrabble.gr/wp-content/uploads/2021/02/ta-mystika-tou-scrabble.pdf
+
+LETTER_DATA = [
+    LetterData('Α', n_count=12, value= 1),
+    LetterData('Β', n_count= 1, value= 8),
+    LetterData('Γ', n_count= 2, value= 4),
+    LetterData('Δ', n_count= 2, value= 4),
+    LetterData('Ε', n_count= 8, value= 1),
+    LetterData('Ζ', n_count= 1, value=10),
+    LetterData('Η', n_count= 7, value= 1),
+    LetterData('Θ', n_count= 1, value=10),
+    LetterData('Ι', n_count= 8, value= 1),
+    LetterData('Κ', n_count= 4, value= 2),
+    LetterData('Λ', n_count= 3, value= 3),
+    LetterData('Μ', n_count= 3, value= 3),
+    LetterData('Ν', n_count= 6, value= 1),
+    LetterData('Ξ', n_count= 1, value=10),
+    LetterData('Ο', n_count= 9, value= 1),
+    LetterData('Π', n_count= 4, value= 2),
+    LetterData('Ρ', n_count= 5, value= 2),
+    LetterData('Σ', n_count= 7, value= 1),
+    LetterData('Τ', n_count= 8, value= 1),
+    LetterData('Υ', n_count= 4, value= 2),
+    LetterData('Φ', n_count= 1, value= 8),
+    LetterData('Χ', n_count= 1, value= 8),
+    LetterData('Ψ', n_count= 1, value=10),
+    LetterData('Ω', n_count= 3, value= 3),
+    LetterData('*', n_count= 2, value= 0),
+]
+
+letter_values = {ld.letter: ld.value for ld in LETTER_DATA}
+VALID_LETTERS = sorted(list(letter_values.keys()))
+
+# letter ids of the real letters, used for cross-check bitmasks
+LETTER_IDS = {ld.letter: i for i, ld in enumerate(LETTER_DATA) if ld.letter != "*"}
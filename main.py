@@ -3,20 +3,15 @@ import enum
 import random
 import pprint
 import copy
-from typing import NamedTuple
 from colorama import Back, Fore, Style
 import time
 
-from searcher import PlayWord, PlayLetter, QueryResult, fulfills_query, create_greek_trie, playword_to_str, get_jump_letter, TrieNode
+from hooks import ALL_LETTERS, LETTER_BITS, HookTable, get_hook_table
+from letters import LETTER_DATA, LETTER_IDS, VALID_LETTERS, LetterData, letter_values
+from searcher import PlayWord, PlayLetter, fulfills_query, get_trie, playword_to_str, Trie
 
 BOARD_SIZE = 15
 
-class LetterData(NamedTuple):
-    letter: str
-    n_count: int
-    value: int
-
-
 class Orientation(enum.Enum):
     HORIZONTAL = enum.auto()
     VERTICAL   = enum.auto()
@@ -55,38 +50,12 @@ BOARD = [
     [TW, SS, SS, DL, SS, SS, SS, TW, SS, SS, SS, DL, SS, SS, TW],
 ]
 
-# http://greekscrabble.gr/wp-content/uploads/2021/02/ta-mystika-tou-scrabble.pdf
-
-LETTER_DATA = [
-    LetterData('Α', n_count=12, value= 1),
-    LetterData('Β', n_count= 1, value= 8),
-    LetterData('Γ', n_count= 2, value= 4),
-    LetterData('Δ', n_count= 2, value= 4),
-    LetterData('Ε', n_count= 8, value= 1),
-    LetterData('Ζ', n_count= 1, value=10),
-    LetterData('Η', n_count= 7, value= 1),
-    LetterData('Θ', n_count= 1, value=10),
-    LetterData('Ι', n_count= 8, value= 1),
-    LetterData('Κ', n_count= 4, value= 2),
-    LetterData('Λ', n_count= 3, value= 3),
-    LetterData('Μ', n_count= 3, value= 3),
-    LetterData('Ν', n_count= 6, value= 1),
-    LetterData('Ξ', n_count= 1, value=10),
-    LetterData('Ο', n_count= 9, value= 1),
-    LetterData('Π', n_count= 4, value= 2),
-    LetterData('Ρ', n_count= 5, value= 2),
-    LetterData('Σ', n_count= 7, value= 1),
-    LetterData('Τ', n_count= 8, value= 1),
-    LetterData('Υ', n_count= 4, value= 2),
-    LetterData('Φ', n_count= 1, value= 8),
-    LetterData('Χ', n_count= 1, value= 8),
-    LetterData('Ψ', n_count= 1, value=10),
-    LetterData('Ω', n_count= 3, value= 3),
-    LetterData('*', n_count= 2, value= 0),
-]
+# premium squares as plain integer tables, so scoring is a lookup
+LETTER_MULT = [[{DL: 2, TL: 3}.get(cell, 1) for cell in row] for row in BOARD]
+WORD_MULT   = [[{DW: 2, TW: 3}.get(cell, 1) for cell in row] for row in BOARD]
 
-letter_values = {ld.letter: ld.value for ld in LETTER_DATA}
-VALID_LETTERS = sorted(list(letter_values.keys()))
+BONUS_TILES = 7
+BONUS_POINTS = 50
 
 
 @dataclass
@@ -120,6 +89,55 @@ def create_empty_board() -> Board:
     return [[PlayLetter(letter=" ")] * BOARD_SIZE for _ in range(BOARD_SIZE)]
 
 
+def transpose(table: list[list]) -> list[list]:
+    return [list(col) for col in zip(*table)]
+
+
+def line_pos(orientation: Orientation, i: int, j: int) -> tuple[int, int]:
+    """Square j of line i: row i when horizontal, column i when vertical"""
+    return (j, i) if orientation == Orientation.HORIZONTAL else (i, j)
+
+
+def line_index(orientation: Orientation, pos: tuple[int, int]) -> tuple[int, int]:
+    """(line, square in it) of a position, the inverse of line_pos"""
+    x, y = pos
+    return (y, x) if orientation == Orientation.HORIZONTAL else (x, y)
+
+
+# the premium tables line by line, columns being lines of the transpose
+LETTER_MULT_LINES = {Orientation.HORIZONTAL: LETTER_MULT, Orientation.VERTICAL: transpose(LETTER_MULT)}
+WORD_MULT_LINES = {Orientation.HORIZONTAL: WORD_MULT, Orientation.VERTICAL: transpose(WORD_MULT)}
+
+
+class BoardView:
+    """The board as rows and as columns, updated together
+
+    Line i along either orientation is one contiguous list, so code
+    walking lines has a single path: it works on line i and maps square
+    j back with line_pos. The rows are the board itself; changes have
+    to go through put to reach the columns.
+    """
+
+    def __init__(self, game_board: Board):
+        self.rows = game_board
+        self.cols = transpose(game_board)
+        self.lines = {Orientation.HORIZONTAL: self.rows, Orientation.VERTICAL: self.cols}
+
+
+    def line(self, orientation: Orientation, i: int) -> list[PlayLetter]:
+        return self.lines[orientation][i]
+
+
+    def query(self, orientation: Orientation, i: int) -> str:
+        return "".join(pl.real_letter for pl in self.lines[orientation][i])
+
+
+    def put(self, pos: tuple[int, int], play_letter: PlayLetter):
+        x, y = pos
+        self.rows[y][x] = play_letter
+        self.cols[x][y] = play_letter
+
+
 game_board = create_empty_board()
 
 @dataclass
@@ -138,16 +156,6 @@ class PlaceLettersResult:
     expandable: list[tuple[PositionedLetter, Orientation]]
 
 
-
-
-
-@dataclass
-class HalfExpandResult:
-    word: str
-    multiplier: int
-    points: int
-    player_placed: int
-
 @dataclass
 class ExpandResult:
     word: str
@@ -155,165 +163,294 @@ class ExpandResult:
     is_bonus: bool = False
 
 
-def expand(game_board: Board, pos: tuple[int, int], orientation: Orientation, letters: list[PositionedLetter], visited=None, nxt=None) -> ExpandResult|None:
-    pos_to_letter = {pl.pos: pl for pl in letters}
+@dataclass
+class CrossWord:
+    """Tiles already on the board right before and after a square"""
+    before: str
+    after: str
+    before_points: int
+    after_points: int
+
+    @property
+    def points(self) -> int:
+        return self.before_points + self.after_points
+
+
+def other_orientation(orientation: Orientation) -> Orientation:
+    return Orientation.VERTICAL if orientation == Orientation.HORIZONTAL else Orientation.HORIZONTAL
+
+
+class ScoringEngine:
+    """Scores placements on a board in time proportional to the tiles placed
+
+    For every empty square and orientation it caches the word formed by
+    the neighbouring tiles (see CrossWord). The cache entries are built
+    on first use and dropped only when a placement changes those tiles.
+    Lines are read through a BoardView, so both orientations share the
+    same walks; change the board with place and remove only.
+    """
+
+    def __init__(self, game_board: Board, trie: Trie|None = None, values: dict[str, int]|None = None):
+        self.game_board = game_board
+        self.view = BoardView(game_board)
+
+        # one lexicon for the life of the engine, even if it gets updated
+        self.trie = get_trie() if trie is None else trie
+        self.values = letter_values if values is None else values
+        self.cross: dict[Orientation, dict[tuple[int, int], CrossWord|None]] = {
+            Orientation.HORIZONTAL: dict(),
+            Orientation.VERTICAL: dict(),
+        }
+        self.checks: dict[Orientation, dict[tuple[int, int], int]] = {
+            Orientation.HORIZONTAL: dict(),
+            Orientation.VERTICAL: dict(),
+        }
+
+
+    def _run(self, line: list[PlayLetter], j: int, step: int) -> tuple[str, int]:
+        # tiles after square j of a line in the direction of the step
+        letters = []
+        points = 0
+
+        j += step
+        while 0 <= j < BOARD_SIZE:
+            pl = line[j]
+            if pl.letter == " ":
+                break
 
+            letters.append(pl.real_letter)
+            points += self.values[pl.letter]
 
-    def expand_half(pos: tuple[int, int], orientation: Orientation, backwards: bool) -> HalfExpandResult:
-        # if this letter is expanded already this orient
-        # if orientation in visited[pos]:
-        #     return 
+            j += step
 
-        result = HalfExpandResult("", multiplier=1, points=0, player_placed=0)
+        return "".join(letters), points
 
 
-        step_x = 1 if orientation == orientation.HORIZONTAL else 0
-        step_y = 1 if orientation == orientation.VERTICAL else 0
+    def cross_word(self, pos: tuple[int, int], orientation: Orientation) -> CrossWord|None:
+        """Tiles touching the empty square `pos` along `orientation`, None if there are none
 
-        cur_x, cur_y = pos
+        Entries are kept up to date for empty squares only.
+        """
+        cache = self.cross[orientation]
+        if pos in cache:
+            return cache[pos]
 
-        if backwards:
-            cur_x += step_x
-            cur_y += step_y
+        i, j = line_index(orientation, pos)
+        line = self.view.lines[orientation][i]
 
-            step_x *= -1
-            step_y *= -1
+        before, before_points = self._run(line, j, -1)
+        after, after_points = self._run(line, j, 1)
 
+        cw = None
+        if before != "" or after != "":
+            cw = CrossWord(before[::-1], after, before_points, after_points)
 
-        # dry run 
-        while True:
-            cur_x += step_x
-            cur_y += step_y
+        cache[pos] = cw
+        return cw
 
-            if cur_x < 0 or cur_y < 0 or cur_x >= BOARD_SIZE or cur_y >= BOARD_SIZE:
-                break
 
-            npos = (cur_x, cur_y)
+    def cross_check(self, pos: tuple[int, int], orientation: Orientation) -> int:
+        """Bitmask of the LETTER_IDS that form a word with the tiles touching `pos`"""
+        cache = self.checks[orientation]
+        if pos in cache:
+            return cache[pos]
+
+        cw = self.cross_word(pos, orientation)
+        if cw is None:
+            mask = (1 << len(LETTER_IDS)) - 1
+        else:
+            mask = get_hook_table(self.trie).cross_mask(cw.before, cw.after)
 
-            is_board = False
+        cache[pos] = mask
+        return mask
 
-            if npos in pos_to_letter:
-                letter = pos_to_letter[npos].play_letter
 
-                if visited:
-                    visited[npos].append(orientation)
+    def _main_word(self, letters: list[PositionedLetter], orientation: Orientation) -> ExpandResult|None:
+        i, _ = line_index(orientation, letters[0].pos)
+        line = self.view.lines[orientation][i]
+        letter_mult = LETTER_MULT_LINES[orientation][i]
+        word_mult = WORD_MULT_LINES[orientation][i]
 
-                if nxt:
-                    nxt[cur_y][cur_x] = letter
+        placed = {line_index(orientation, pl.pos)[1]: pl.play_letter for pl in letters}
+        first, last = min(placed), max(placed)
+
+        head = self.cross_word(line_pos(orientation, i, first), orientation)
+        tail = self.cross_word(line_pos(orientation, i, last), orientation)
+
+        word = [head.before] if head is not None else []
+        points = head.before_points if head is not None else 0
+        multiplier = 1
+
+        for j in range(first, last + 1):
+            pl = placed.get(j)
+            if pl is not None:
+                points += self.values[pl.letter] * letter_mult[j]
+                multiplier *= word_mult[j]
 
             else:
-                is_board = True
-                letter = game_board[cur_y][cur_x]
+                # the tiles must be joined by tiles already on the board
+                pl = line[j]
+                if pl.letter == " ":
+                    return None
 
-            if letter.letter == " ":
-                break
+                points += self.values[pl.letter]
+
+            word.append(pl.real_letter)
 
-            result.word += letter.real_letter
+        if tail is not None:
+            word.append(tail.after)
+            points += tail.after_points
 
-            if not is_board:
-                result.player_placed += 1
-                letter_points = letter_values[letter.letter]
+        result = ExpandResult(word="".join(word), points=points * multiplier)
 
-                cell = BOARD[cur_y][cur_x]
+        if len(letters) >= BONUS_TILES:
+            result.is_bonus = True
+            result.points += BONUS_POINTS
 
-                match cell:
-                    case Cell.DOUBLE_LETTER:
-                        letter_points *= 2
+        return result
 
-                    case Cell.TRIPLE_LETTER:
-                        letter_points *= 3
 
-                    case Cell.DOUBLE_WORD:
-                        result.multiplier *= 2
+    def score(self, letters: list[PositionedLetter]) -> PlaceLettersResult|None:
+        """Score placing `letters`, None if the placement is not valid"""
+        if len(letters) == 0:
+            return None
 
-                    case Cell.TRIPLE_WORD:
-                        result.multiplier *= 3 
+        for pl in letters:
+            x, y = pl.pos
+            if self.game_board[y][x].letter != " ":
+                return None
 
-            else:
-                letter_points = letter_values[letter.letter]
+        total_points = 0
+        not_expanded = []
 
-            result.points += letter_points
+        if len(letters) == 1:
+            main = None
+        elif all(pl.pos[1] == letters[0].pos[1] for pl in letters):
+            main = Orientation.HORIZONTAL
+        elif all(pl.pos[0] == letters[0].pos[0] for pl in letters):
+            main = Orientation.VERTICAL
+        else:
+            return None
 
-        if backwards:
-            result.word = result.word[::-1]
+        if main is not None:
+            res = self._main_word(letters, main)
+            if res is None or res.word not in self.trie:
+                return None
 
-        return result
+            total_points += res.points
 
+        for pl in letters:
+            for orient in (Orientation.HORIZONTAL, Orientation.VERTICAL):
+                if orient == main:
+                    continue
 
+                cw = self.cross_word(pl.pos, orient)
+                if cw is None:
+                    not_expanded.append((pl, orient))
+                    continue
 
+                x, y = pl.pos
+                play_letter = pl.play_letter
+                letter_id = LETTER_IDS.get(play_letter.real_letter)
+                if letter_id is None or self.cross_check(pl.pos, orient) >> letter_id & 1 == 0:
+                    return None
 
-    result = ExpandResult(word="", points=0)
-    back  = expand_half(pos, orientation, True)
-    front = expand_half(pos, orientation, False)
+                letter_points = self.values[play_letter.letter] * LETTER_MULT[y][x]
+                total_points += (cw.points + letter_points) * WORD_MULT[y][x]
 
+        return PlaceLettersResult(total_points, not_expanded)
 
-    result.word = back.word + front.word
 
+    def _forget_around(self, x: int, y: int):
+        # the squares at both ends of the runs through (x, y) now see
+        # different tiles
+        for orient in (Orientation.HORIZONTAL, Orientation.VERTICAL):
+            cache = self.cross[orient]
+            checks = self.checks[orient]
+            cache.pop((x, y), None)
+            checks.pop((x, y), None)
+
+            i, j = line_index(orient, (x, y))
+            line = self.view.lines[orient][i]
+            for step in (-1, 1):
+                k = j + step
+                while 0 <= k < BOARD_SIZE:
+                    if line[k].letter == " ":
+                        pos = line_pos(orient, i, k)
+                        cache.pop(pos, None)
+                        checks.pop(pos, None)
+                        break
 
+                    k += step
 
-    if len(result.word) < 2:
-        # not_expanded.append((pl, orient))
-        return result
 
-    if result.word not in T.wordset:
-        return None
+    def place(self, letters: list[PositionedLetter]):
+        """Put `letters` on the board, keeping the cache in sync"""
+        for pl in letters:
+            self.view.put(pl.pos, pl.play_letter)
 
-    points = back.points + front.points
-    multi = back.multiplier * front.multiplier
-    player_placed = back.player_placed + front.player_placed
+        for pl in letters:
+            self._forget_around(*pl.pos)
 
-    result.points = points * multi
 
-    if player_placed >= 7:
-        # Bonus 50
-        result.is_bonus = True
-        result.points += 50
+    def remove(self, positions: list[tuple[int, int]]):
+        """Take the tiles at `positions` off the board, keeping the cache in sync"""
+        for pos in positions:
+            self.view.put(pos, PlayLetter(letter=" "))
 
-    return result
+        # the run ends seen from an emptied square are the ones that
+        # were next to the run it was part of
+        for x, y in positions:
+            self._forget_around(x, y)
 
 
+    def move_letters(self, pw: PositionedWord) -> list[PositionedLetter]:
+        """get_positioned_word_letters, reading the engine's view"""
+        return get_positioned_word_letters(self.game_board, pw, self.view)
 
 
+    def copy(self, game_board: Board) -> "ScoringEngine":
+        """An engine for a copy of the board, starting from this cache"""
+        engine = ScoringEngine.__new__(ScoringEngine)
+        engine.game_board = game_board
+        engine.view = BoardView(game_board)
+        engine.trie = self.trie
+        engine.values = self.values
+        engine.cross = {orient: dict(cache) for orient, cache in self.cross.items()}
+        engine.checks = {orient: dict(cache) for orient, cache in self.checks.items()}
 
+        return engine
 
 
-def play_letters(game_board, letters: list[PositionedLetter], nxt=None) -> PlaceLettersResult|None:
-    visited = {pl.pos: [] for pl in letters}
-    
+
+def play_letters(game_board, letters: list[PositionedLetter], nxt=None, engine: ScoringEngine|None = None) -> PlaceLettersResult|None:
     for pl in letters:
         if game_board[pl.pos[1]][pl.pos[0]].letter != " ":
             print("Could not play")
             return None
-        
-
-    total_points = 0
 
-    not_expanded = []
-    valids = []
-    for pl in letters:
-        # expland horizontal and vertical
-        for orient in (Orientation.HORIZONTAL, Orientation.VERTICAL):
-            if orient in visited[pl.pos]: continue
+    if engine is None:
+        engine = ScoringEngine(game_board)
 
-            res = expand(game_board, pl.pos, orient, letters, visited=visited, nxt=nxt)
+    result = engine.score(letters)
 
-            if res is None:
-                return None
-
-            if len(res.word) < 2:
-                not_expanded.append((pl, orient))
-                continue
+    if result is not None and nxt is not None:
+        for pl in letters:
+            x, y = pl.pos
+            nxt[y][x] = pl.play_letter
 
-            valids.append(res)
+    return result
 
-            total_points += res.points
 
+# -------------------------------------------------------------
 
-    return PlaceLettersResult(total_points, not_expanded)
+def __getattr__(name):
+    # main.T used to be built at import, keep it reachable lazily
+    if name == "T":
+        return get_trie()
 
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-# -------------------------------------------------------------
-T = create_greek_trie()
 
 def find_starts(query: str) -> list[int]:
     starts = []
@@ -331,441 +468,533 @@ def find_starts(query: str) -> list[int]:
 
     return starts
 
-def query_v2(game_board: Board, rc_idx: int, dir: Orientation, jumps: str|list[str]):
-    if isinstance(jumps, str):
-        jumps = list(jumps)
-
-    step_x = 1 if dir == Orientation.HORIZONTAL else 0
-    step_y = 1 if dir == Orientation.VERTICAL else 0
-
-    # find start_pos
-    x = rc_idx if dir == Orientation.VERTICAL else 0
-    y = rc_idx if dir == Orientation.HORIZONTAL else 0
+# -------------------------------------------------------------
 
-    starts = []
-    cur_entry = None
-    for _ in range(BOARD_SIZE):
-        bl = game_board[y][x]
 
-        if not bl.letter.isspace():
-            cur_entry = (x, y)
-        else:
-            if cur_entry is not None:
-                starts.append(cur_entry)
-            cur_entry = None
 
-        x += step_x
-        y += step_y
+def play_word(game_board, word: PlayWord, pos: tuple[int, int], orientation: Orientation, place_letters=True, engine: ScoringEngine|None = None) -> int|None:
+    """Score a word at a position and put its tiles down, None if it is not a valid move
 
-    if cur_entry is not None:
-        starts.append(cur_entry)
+    The tiles already on its squares have to be its letters there.
+    """
+    if engine is None:
+        engine = ScoringEngine(game_board)
 
+    pw = PositionedWord(word, pos, orientation)
+    letters = get_positioned_word_letters(game_board, pw, engine.view)
 
+    i, j = line_index(orientation, pos)
+    line = engine.view.line(orientation, i)
+    for k, play_letter in enumerate(word, j):
+        if not fulfills_query(play_letter.real_letter, line[k].real_letter):
+            return None
 
-    def valid_pos(x: int, y:int) -> bool:
-        return x >= 0 and x < BOARD_SIZE and y >= 0 and y < BOARD_SIZE
+    result = engine.score(letters)
+    if result is None:
+        return None
 
+    if place_letters:
+        engine.place(letters)
 
-    all_results = []
+    return result.points
 
-    for start_pos in starts:
-        start_x, start_y = start_pos
-        starting_pl = game_board[start_y][start_x]
 
-        if starting_pl.real_letter not in T.node_tracker:
-            continue
+def get_positioned_word_letters(game_board, pw: PositionedWord, view: BoardView|None = None) -> list[PositionedLetter]:
+    """The tiles a move puts down: its letters on the squares of its line still empty"""
+    view = BoardView(game_board) if view is None else view
 
-        nodes = T.node_tracker[starting_pl.real_letter]
+    i, j = line_index(pw.orientation, pw.start_pos)
+    if not (0 <= i < BOARD_SIZE and 0 <= j and j + len(pw.word) <= BOARD_SIZE):
+        raise ValueError("The move does not fit on the board")
 
-        if dir == Orientation.HORIZONTAL:
-            query_start = start_x
-            oposite_dir = Orientation.VERTICAL
-        else:
-            query_start = start_y
-            oposite_dir = Orientation.HORIZONTAL
+    line = view.line(pw.orientation, i)
 
+    letters = []
+    for k, play_letter in enumerate(pw.word, j):
+        if line[k].letter == " ":
+            letters.append(PositionedLetter(play_letter, line_pos(pw.orientation, i, k)))
 
-        for start_node in nodes:
-            node = T.nodes[start_node]
+    return letters
 
-            # going_up
 
-            # prune big branches we wont fit
-            if node.depth > query_start + 1:
-                continue
-                # return None
+def play_positioned_word(game_board, pw: PositionedWord, place_letters=True, nxt=None, engine: ScoringEngine|None = None) -> PlaceLettersResult|None:
+    positioned_letters = get_positioned_word_letters(game_board, pw)
 
-            initial_jumps = jumps.copy()
-            our_jumps = jumps.copy()
+    return play_letters(game_board, positioned_letters, nxt=nxt, engine=engine)
 
-            # first walk up
-            prefix_builder: PlayWord = [PlayLetter(letter=node.letter)]
+#
+# def play_positioned_word(game_board, pw: PositionedWord, place_letters=True):
+#     return play_word(game_board, pw.word, pw.start_pos, pw.orientation, place_letters=place_letters)
+#
 
-            x = start_x
-            y = start_y
+def playword_from_str(s: str, wildcards: list[str]|str = "") -> PlayWord|None:
+    n_wilds = s.count("*")
 
+    # we should have all wildcard replacements
+    if isinstance(wildcards, str):
+        wildcards = list(wildcards)
 
-            found_word = True
-            played_letters = []
+    if len(wildcards) != n_wilds:
+        return None
 
-            while node.parent != 0:
-                x -= step_x
-                y -= step_y
+    wildcard_index = 0
+    play_word = []
 
-                parent_node = T.nodes[node.parent]
+    for letter in s:
+        real_letter = letter
+        if letter == "*":
+            real_letter = wildcards[wildcard_index]
+            wildcard_index += 1
 
-                # if out of bounds of query, stop searching
-                if not valid_pos(x, y):
-                    found_word = False
-                    break
-                    # return None
+        pl = PlayLetter(letter=letter, wildcard_letter=real_letter)
+        play_word.append(pl)
 
 
-                query_letter = game_board[y][x]
+    return play_word
 
-                # if query has another fixed letter up and we
-                # do not match, stop searching
-                if not fulfills_query(parent_node.letter, query_letter.letter):
-                    found_word = False
-                    break
-                    # return None
 
-                # if next query up is space, we should just have
-                # an available jump
-                jmp = parent_node.letter
-                if query_letter.letter.isspace():
-                    jmp = get_jump_letter(parent_node.letter, our_jumps)
-                    if jmp is None:
-                        found_word = False
-                        break
-                        # return None
 
-                    our_jumps.remove(jmp)
 
-                play_letter = PlayLetter(letter=jmp, wildcard_letter=parent_node.letter)
-                positioned_letter = PositionedLetter(play_letter=play_letter, pos=(x, y))
+def render_board(game_board):
+    print(" " * 2, end="")
+    for x in range(BOARD_SIZE):
+        print(f"{x:3d}", end="")
 
-                played_letters.append(positioned_letter)
+    print()
 
-                expand_result = expand(game_board, (x, y), oposite_dir, played_letters)
+    for y, row in enumerate(BOARD):
+        print(f"{y:3d}", end="")
+        for x, cell in enumerate(row):
+            style = get_cell_style(cell)
+            wildcard_mark = " "
+            if game_board[y][x].letter == "*":
+                wildcard_mark = "*"
 
-                if expand_result is None:
-                    found_word = False
-                    break
+            content = f" {game_board[y][x].real_letter}{wildcard_mark}"
+            print(style + f"{content}" + Style.RESET_ALL, end="")
 
-                prefix_builder.append(play_letter)
-                node = parent_node
+        print()
 
 
-            if not found_word:
-                continue
-                # return None
 
-            # if we found the root, we need
-            # to check for query boundaries
 
-            x -= step_x
-            y -= step_y
-            if valid_pos(x, y) and not game_board[y][x].letter.isspace():
-                continue
-                # return None
 
-            prefix = prefix_builder[::-1][:-1]
 
-            # return QueryUpResult(prefix=prefix, jumps=our_jumps)
+# search each line with the trie or the lexicon's patterns.PatternIndex,
+# whichever the cost model expects to be cheaper
+USE_PATTERN_INDEX = True
 
-            # no go down
 
-            x = start_x
-            y = start_y
+def find_words(game_board, letters: str, patterns=None, trie: Trie|None = None) -> list[PositionedWord]:
+    """Every word the rack can form on the board, in the shared lexicon by default
 
-            results = []
+    Each line is searched by whichever of the trie or a pattern index the
+    cost model expects to be cheaper. `patterns` is the lexicon's index
+    by default (see patterns.get_pattern_index), built on first use; a
+    given one has to be built from the same lexicon.
+    """
+    T = get_trie() if trie is None else trie
 
-            def dfs_down(node: TrieNode, jumps: list[str], prefix: PlayWord, pos:tuple[int, int]):
-                nonlocal results
+    if patterns is None and USE_PATTERN_INDEX:
+        from patterns import get_pattern_index
+        patterns = get_pattern_index(T)
 
-                if node.terminal and jumps != initial_jumps:
-                    results.append(prefix)
+    if patterns is None:
+        query_line = T.query
+    else:
+        from patterns import query_line as query_either
+        query_line = lambda query, letters: query_either(T, patterns, query, letters)
 
-                x, y = pos
+    view = BoardView(game_board)
 
-                x += step_x
-                y += step_y
-                
-                if not valid_pos(x, y):
-                    return
+    results = []
+    for orient in (Orientation.HORIZONTAL, Orientation.VERTICAL):
+        for i in range(BOARD_SIZE):
+            for w in query_line(view.query(orient, i), letters):
+                results.append(PositionedWord(word=w.word, start_pos=line_pos(orient, i, w.start_index), orientation=orient))
 
-                query_letter = game_board[y][x]
+    return results
 
 
-                for edge_letter, next_node_idx in node.edges.items():
-                    if not fulfills_query(edge_letter, query_letter.real_letter):
-                        continue
+def _runs(view: BoardView, orientation: Orientation):
+    # maximal runs of tiles along an orientation: (line, start, end, word),
+    # end being the square after the last tile
+    for i, line in enumerate(view.lines[orientation]):
+        run_start = None
+        letters = []
+        for j in range(BOARD_SIZE + 1):
+            if j < BOARD_SIZE and line[j].letter != " ":
+                if run_start is None:
+                    run_start = j
 
-                    new_jumps = jumps.copy()
-                    jmp_letter = edge_letter
-                    if query_letter.letter.isspace():
-                        jmp_letter = get_jump_letter(edge_letter, jumps)
-                        if jmp_letter is None:
-                            continue
+                letters.append(line[j].real_letter)
+                continue
 
-                        new_jumps.remove(jmp_letter)
+            if run_start is not None and len(letters) >= 2:
+                yield i, run_start, j, "".join(letters)
 
-                    play_letter = PlayLetter(letter=jmp_letter, wildcard_letter=edge_letter)
-                    positioned_letter = PositionedLetter(play_letter=play_letter, pos=(x, y))
+            run_start = None
+            letters = []
 
-                    expand_result = expand(game_board, (x, y), oposite_dir, [positioned_letter])
 
-                    if expand_result is None:
-                        return
+def hook_moves(game_board: Board, rack: str, table: HookTable|None = None, engine: ScoringEngine|None = None) -> list[PositionedLetter]:
+    """Single tiles that extend a word on the board at its front or back
 
-                    new_prefix  = prefix + [play_letter]
-                    next_node = T.nodes[next_node_idx]
-                    dfs_down(next_node, new_jumps, new_prefix, (x, y))
+    Straight table lookups: the hooks of the word, the rack and the cross
+    check of the square the other way.
+    """
+    if engine is None:
+        engine = ScoringEngine(game_board)
 
+    if table is None:
+        table = get_hook_table(engine.trie)
 
-            node = T.nodes[start_node]
-            dfs_down(node, our_jumps, [], (start_x, start_y))
+    rack_mask = 0
+    for letter in rack:
+        rack_mask |= ALL_LETTERS if letter == "*" else LETTER_BITS.get(letter, 0)
 
-            # check for boundaries with query
-            valid_results = []
+    moves = []
+    for orient in (Orientation.HORIZONTAL, Orientation.VERTICAL):
+        for i, start, end, word in _runs(engine.view, orient):
+            squares = [
+                (start - 1, table.front_hooks(word)),
+                (end, table.back_hooks(word)),
+            ]
 
-            for suffix in results:
-                last_x = start_x + (len(suffix) + 1) * step_x
-                last_y = start_y + (len(suffix) + 1) * step_y
+            for j, hooks in squares:
+                # runs are maximal, the square is empty if on the board
+                if not 0 <= j < BOARD_SIZE:
+                    continue
 
-                if not valid_pos(last_x, last_y) or game_board[last_y][last_x].letter.isspace():
-                    valid_results.append(suffix)
+                # the square may close a gap, so check the whole line
+                pos = line_pos(orient, i, j)
+                hooks &= engine.cross_check(pos, orient) & rack_mask
+                hooks &= engine.cross_check(pos, other_orientation(orient))
 
+                for letter, letter_id in LETTER_IDS.items():
+                    if hooks >> letter_id & 1 == 0:
+                        continue
 
-            start_letter = game_board[start_y][start_x]
+                    jmp = letter if letter in rack else "*"
+                    moves.append(PositionedLetter(PlayLetter(letter=jmp, wildcard_letter=letter), pos))
 
-            for suffix in valid_results:
-                word = prefix + [start_letter] + suffix
-                all_results.append(QueryResult(0-len(prefix), word))
+    # a square can hook runs in both orientations
+    unique = {(pl.pos, pl.play_letter.letter, pl.play_letter.real_letter): pl for pl in moves}
+    return list(unique.values())
 
 
-    return all_results
+def _line_parallel(t: Trie, free: list[bool], allowed: list[int], anchor: list[bool], jumps: list[str]) -> list[tuple[int, list[PlayLetter]]]:
+    # words laid on free squares only, covering at least one anchor and
+    # with free squares (or the edge) at both ends
+    size = len(free)
+    results = []
 
+    n_blanks = jumps.count("*")
+    counts = dict()
+    for letter in jumps:
+        if letter != "*":
+            counts[letter] = counts.get(letter, 0) + 1
 
+    rack_mask = 0
+    for letter in counts:
+        rack_mask |= LETTER_BITS.get(letter, 0)
 
+    # need masks of the trie nodes use the trie's own letter bits
+    trie_bits = t.letter_bits
+    have_mask = t.letters_mask(counts.keys())
 
+    # the letters the rack can put on each square, any allowed one with a blank
+    usable = [mask if n_blanks > 0 else mask & rack_mask for mask in allowed]
 
+    # next_anchor[i]: first anchor at or after i the rack can cover,
+    # blocked[i]: first square at or after i the rack cannot cover
+    next_anchor = [size] * (size + 1)
+    blocked = [size] * (size + 1)
+    for i in range(size - 1, -1, -1):
+        covered = free[i] and usable[i] != 0
+        next_anchor[i] = i if covered and anchor[i] else next_anchor[i+1]
+        blocked[i] = blocked[i+1] if covered else i
 
-# -------------------------------------------------------------
+    n_jumps = len(jumps)
+    nodes, children, is_terminal = t.nodes, t.children, t.is_terminal
 
+    def dfs(idx: int, pos: int, n_left: int, have_mask: int, word: list[PlayLetter], touched: bool, start: int):
+        nonlocal n_blanks
 
+        if is_terminal(idx) and touched and len(word) >= 2:
+            results.append((start, word))
 
-def play_word(game_board, word: PlayWord, pos: tuple[int, int], orientation: Orientation, place_letters=True) -> int|None:
-    points = 0
+        if pos >= blocked[pos] or n_left == 0:
+            return
 
-    step_x = 1 if orientation == Orientation.HORIZONTAL else 0
-    step_y = 1 if orientation == Orientation.VERTICAL else 0
+        # a word that has not covered an anchor yet must reach one
+        if not touched and next_anchor[pos] - pos >= n_left:
+            return
 
+        # a tile right after would join the word to it
+        if pos + 1 < size and not free[pos+1]:
+            return
 
-    # dry run 
-    cur_x, cur_y = pos
-    for play_letter in word:
-        board_letter = game_board[cur_y][cur_x]
+        room = blocked[pos] - pos - 1
+        square_mask = usable[pos]
 
-        if not fulfills_query(play_letter.real_letter, board_letter.real_letter):
-            return None
+        for edge_letter, next_node_idx in children(idx):
+            bit = LETTER_BITS.get(edge_letter, 0)
+            if square_mask & bit == 0:
+                continue
 
-        # TODO: check in the oposite direction
+            child = nodes[next_node_idx]
 
-        cur_x += step_x
-        cur_y += step_y
+            # the nearest word below has to fit in the rack and the line
+            if child.min_remaining > min(n_left - 1, room):
+                continue
 
-    # now place the letters
-    multuplier = 1
-    points = 0
+            if counts.get(edge_letter, 0) > 0:
+                jmp = edge_letter
+                counts[edge_letter] -= 1
+                new_mask = have_mask if counts[edge_letter] > 0 else have_mask & ~trie_bits[edge_letter]
+            elif n_blanks > 0:
+                jmp = "*"
+                n_blanks -= 1
+                new_mask = have_mask
+            else:
+                continue
 
-    cur_x, cur_y = pos
-    for play_letter in word:
-        board_letter = game_board[cur_y][cur_x]
+            missing = child.need_mask & ~new_mask
+            if missing == 0 or missing.bit_count() <= n_blanks:
+                new_word = word + [PlayLetter(letter=jmp, wildcard_letter=edge_letter)]
+                dfs(next_node_idx, pos + 1, n_left - 1, new_mask, new_word, touched or anchor[pos], start)
 
+            if jmp == "*":
+                n_blanks += 1
+            else:
+                counts[edge_letter] += 1
 
-        if board_letter.real_letter == " ":
-            letter_points = letter_values[play_letter.letter]
+    for start in range(size):
+        if start > 0 and not free[start-1]:
+            continue
 
-            if place_letters:
-                game_board[cur_y][cur_x] = play_letter
+        # only from squares with an anchor the rack can cover in reach
+        if next_anchor[start] >= min(blocked[start], start + n_jumps):
+            continue
 
-            cell = BOARD[cur_y][cur_x]
+        dfs(0, start, n_jumps, have_mask, [], False, start)
 
-            match cell:
-                case Cell.DOUBLE_LETTER:
-                    letter_points *= 2
+    return results
 
-                case Cell.TRIPLE_LETTER:
-                    letter_points *= 3
 
-                case Cell.DOUBLE_WORD:
-                    multuplier *= 2
+def opening_moves(rack: str, fit) -> list[PositionedWord]:
+    """Every word of a rack across the centre square, from a rackfit.RackFit of the lexicon"""
+    centre = BOARD_SIZE // 2
 
-                case Cell.TRIPLE_WORD:
-                    multuplier *= 3 
+    moves = []
+    for word in fit.words_at(fit.formable(rack, max_len=len(rack))):
+        # blanks for the letters the rack runs out of, as the trie walks do
+        counts = {letter: rack.count(letter) for letter in set(word)}
+        word_letters = []
+        for letter in word:
+            if counts[letter] > 0:
+                counts[letter] -= 1
+                word_letters.append(PlayLetter(letter=letter, wildcard_letter=letter))
+            else:
+                word_letters.append(PlayLetter(letter="*", wildcard_letter=letter))
 
-        else:
-            letter_points = letter_values[board_letter.letter]
+        for orient in (Orientation.HORIZONTAL, Orientation.VERTICAL):
+            for j in range(max(0, centre - len(word) + 1), min(centre, BOARD_SIZE - len(word)) + 1):
+                moves.append(PositionedWord(word=word_letters, start_pos=line_pos(orient, centre, j), orientation=orient))
 
-        points += letter_points
+    return moves
 
-        cur_x += step_x
-        cur_y += step_y
 
-    points *= multuplier
+def parallel_moves(game_board: Board, rack: str, engine: ScoringEngine|None = None) -> list[PositionedWord]:
+    """Words laid entirely on empty squares next to the tiles on the board
 
-    return points
+    find_words starts every word from a tile in its own line, so it never
+    returns these: words parallel to a word on the board, or touching one
+    only through their cross words. The two lists are disjoint. On an
+    empty board they are the openings across the centre square.
+    """
+    if engine is None:
+        engine = ScoringEngine(game_board)
 
+    t = engine.trie
 
-def get_positioned_word_letters(game_board, pw: PositionedWord) -> list[PositionedLetter]:
-    step_x = 1 if pw.orientation == Orientation.HORIZONTAL else 0
-    step_y = 1 if pw.orientation == Orientation.VERTICAL else 0
+    empty = all(pl.letter == " " for row in engine.view.rows for pl in row)
+    if empty:
+        try:
+            from rackfit import get_rack_fit
+        except ImportError:
+            # numpy is optional, walk the trie from the centre square
+            get_rack_fit = None
 
+        if get_rack_fit is not None:
+            return opening_moves(rack, get_rack_fit(t))
 
-    result = []
+    jumps = list(rack)
+    results = []
 
-    cur_x, cur_y = pw.start_pos
+    for orient in (Orientation.HORIZONTAL, Orientation.VERTICAL):
+        cross = other_orientation(orient)
 
-    for play_letter in pw.word:
-        board_letter = game_board[cur_y][cur_x]
+        for i, line in enumerate(engine.view.lines[orient]):
+            squares = [line_pos(orient, i, j) for j in range(BOARD_SIZE)]
 
-        if board_letter.letter == " ":
-            result.append(PositionedLetter(play_letter, pos=(cur_x, cur_y)))
+            free = [pl.letter == " " for pl in line]
+            anchor = [is_free and engine.cross_word(pos, cross) is not None for pos, is_free in zip(squares, free)]
+            if empty and i == BOARD_SIZE // 2:
+                anchor[BOARD_SIZE // 2] = True
 
-        cur_x += step_x
-        cur_y += step_y
+            if not any(anchor):
+                continue
 
-    return result
+            allowed = [engine.cross_check(pos, cross) if is_free else 0 for pos, is_free in zip(squares, free)]
 
+            for start, word in _line_parallel(t, free, allowed, anchor, jumps):
+                results.append(PositionedWord(word=word, start_pos=squares[start], orientation=orient))
 
-def play_positioned_word(game_board, pw: PositionedWord, place_letters=True, nxt=None) -> PlaceLettersResult|None:
-    positioned_letters = get_positioned_word_letters(game_board, pw)
+    return results
 
-    return play_letters(game_board, positioned_letters, nxt=nxt)
 
-#
-# def play_positioned_word(game_board, pw: PositionedWord, place_letters=True):
-#     return play_word(game_board, pw.word, pw.start_pos, pw.orientation, place_letters=place_letters)
-#
+# below this many candidates the numpy setup costs more than it saves
+BATCH_SCORE_MIN = 256
 
-def playword_from_str(s: str, wildcards: list[str]|str = "") -> PlayWord|None:
-    n_wilds = s.count("*")
 
-    # we should have all wildcard replacements
-    if isinstance(wildcards, str):
-        wildcards = list(wildcards)
+def score_found(game_board, found: list[PositionedWord], engine: ScoringEngine|None = None) -> list[tuple[PositionedWord, int]]:
+    """(move, score) for every generated move with valid cross words"""
+    if engine is None:
+        engine = ScoringEngine(game_board)
 
-    if len(wildcards) != n_wilds:
-        return None
+    try:
+        from batchscore import score_moves
+    except ImportError:
+        # numpy is optional
+        score_moves = None
 
-    wildcard_index = 0
-    play_word = []
+    if score_moves is not None and len(found) >= BATCH_SCORE_MIN:
+        scores, valid = score_moves(game_board, found, engine)
+        return [(pw, score) for pw, score, ok in zip(found, scores.tolist(), valid.tolist()) if ok]
 
-    for letter in s:
-        real_letter = letter
-        if letter == "*":
-            real_letter = wildcards[wildcard_index]
-            wildcard_index += 1
+    found_scores = []
+    for pw in found:
+        score = engine.score(engine.move_letters(pw))
 
-        pl = PlayLetter(letter=letter, wildcard_letter=real_letter)
-        play_word.append(pl)
+        if score is not None:
+            found_scores.append((pw, score.points))
 
+    return found_scores
 
-    return play_word
 
+def plan_moves(T: Trie, plan, orientation: Orientation, i: int, rack: str, memo: dict|None = None) -> list[PositionedWord]:
+    """The words of a rack on a planned board line (see Trie.plan_line)"""
+    moves = []
+    for w in T.query_plan(plan, rack, memo):
+        moves.append(PositionedWord(word=w.word, start_pos=line_pos(orientation, i, w.start_index), orientation=orientation))
 
+    return moves
 
 
-def render_board(game_board):
-    print(" " * 2, end="")
-    for x in range(BOARD_SIZE):
-        print(f"{x:3d}", end="")
+def generate_for_racks(game_board, racks: list[str], score=True, trie: Trie|None = None, values: dict[str, int]|None = None) -> list[list]:
+    """find_words (or the sorted (move, score) list) for many racks on one board
 
-    print()
+    The board lines are planned once: anchors and the walk up from every
+    candidate node do not depend on the rack. Racks with the same letters
+    are generated once, and racks sharing letters share the down walks
+    through a memo kept per line. Cross words and cross checks are cached
+    by one engine, for the parallel plays as well as for scoring.
+    """
 
-    for y, row in enumerate(BOARD):
-        print(f"{y:3d}", end="")
-        for x, cell in enumerate(row):
-            style = get_cell_style(cell)
-            wildcard_mark = " "
-            if game_board[y][x].letter == "*":
-                wildcard_mark = "*"
+    engine = ScoringEngine(game_board, trie, values)
+    T = engine.trie
 
-            content = f" {game_board[y][x].real_letter}{wildcard_mark}"
-            print(style + f"{content}" + Style.RESET_ALL, end="")
+    lines = []
+    for orient in (Orientation.HORIZONTAL, Orientation.VERTICAL):
+        for i in range(BOARD_SIZE):
+            lines.append((T.plan_line(engine.view.query(orient, i)), orient, i))
 
-        print()
+    memos = [dict() for _ in lines]
 
+    by_rack = dict()
+    for rack in racks:
+        key = "".join(sorted(rack))
+        if key in by_rack:
+            continue
 
+        found = []
+        for (plan, orient, i), memo in zip(lines, memos):
+            found.extend(plan_moves(T, plan, orient, i, key, memo))
 
+        found.extend(parallel_moves(game_board, key, engine))
 
+        if score:
+            found = score_found(game_board, found, engine)
+            found.sort(key=lambda x: x[1], reverse=True)
 
+        by_rack[key] = found
 
-def find_words(game_board, letters: str) -> list[PositionedWord]:
-    results = []
-    # find horizontal
-    for y, row in enumerate(game_board):
-        query = "".join(pl.real_letter for pl in row)
-        ret = T.query(query, letters)
+    return [by_rack["".join(sorted(rack))] for rack in racks]
 
-        ret = [PositionedWord(word=w.word, start_pos=(w.start_index, y), orientation=Orientation.HORIZONTAL) for w in ret]
-        results.extend(ret)
 
+def describe_result(rank: int, pw: PositionedWord, score: int) -> str:
+    word = playword_to_str(pw.word)
+    return f"{rank:4d}) {word:15s} (Points: {score:3d})  / Pos: {pw.start_pos} {pw.orientation}"
 
-    # find vertical
-    for x in range(BOARD_SIZE):
-        col = [game_board[y][x] for y in range(BOARD_SIZE)]
-        query = "".join(pl.real_letter for pl in col)
-        ret = T.query(query, letters)
 
-        ret = [PositionedWord(word=w.word, start_pos=(x, w.start_index), orientation=Orientation.VERTICAL) for w in ret]
-        results.extend(ret)
+def get_words_sorted(game_board, letters, print_out=True, top_n=None, patterns=None, trie: Trie|None = None, values: dict[str, int]|None = None):
+    from cache import get_cache
+    from serialize import board_to_rows
 
-    return results
+    T = get_trie() if trie is None else trie
 
+    # with a cache open (see cache.open_cache) a position analyzed
+    # before, here or in an earlier run, is read back
+    cache = get_cache()
+    found_scores = None
+    if cache is not None:
+        rows = board_to_rows(game_board)
+        found_scores = cache.get(rows, letters, top_n, T, values)
 
-def get_words_sorted(game_board, letters):
-    t0 = time.time()
-    found = find_words(game_board, letters)
-    diff = time.time() - t0
+        if found_scores is not None and print_out:
+            print(f"Found {len(found_scores)} cached scores.")
 
-    print(f"Found {len(found)} words in {diff:.2f} seconds.")
+    if found_scores is None:
+        t0 = time.time()
+        engine = ScoringEngine(game_board, T, values)
+        found = find_words(game_board, letters, patterns=patterns, trie=T)
+        found.extend(parallel_moves(game_board, letters, engine))
+        diff = time.time() - t0
 
+        if print_out:
+            print(f"Found {len(found)} words in {diff:.2f} seconds.")
 
-    t0 = time.time()
-    found_scores = []
-    for pw in found:
-        score = play_positioned_word(game_board, pw)
 
-        if score is not None:
-            # TODO: expand more
-            found_scores.append((pw, score.points))
+        t0 = time.time()
+        found_scores = score_found(game_board, found, engine)
+        found_scores.sort(key=lambda x: x[1], reverse=True)
 
+        diff = time.time() - t0
+        if print_out:
+            print(f"Found {len(found_scores)} valid scores in {diff:.2f} seconds.")
 
-    found_scores.sort(key=lambda x: x[1], reverse=True)
+        if cache is not None:
+            cache.put(rows, letters, top_n, T, found_scores[:top_n], values)
 
-    diff = time.time() - t0
-    print(f"Found {len(found_scores)} valid scores in {diff:.2f} seconds.")
 
+    TOP_N = len(found_scores) if top_n is None else top_n
+    out = found_scores[:TOP_N]
 
-    rank = 0
-    TOP_N = len(found_scores)
-    out = []
-    for pw, score in found_scores[:TOP_N]:
-        rank += 1
-        word = playword_to_str(pw.word)
-        desc = f"{rank:4d}) {word:15s} (Points: {score:3d})  / Pos: {pw.start_pos} {pw.orientation}"
-        out.append((pw, score, desc))
-        print(desc)
+    # rows are formatted when shown, see describe_result
+    if print_out:
+        for rank, (pw, score) in enumerate(out, 1):
+            print(describe_result(rank, pw, score))
 
     return out
     #return found_scores[0][0]
 
 
-def get_best_word(game_board, letters):
-    return get_words_sorted(game_board, letters)[0][0]
+def get_best_word(game_board, letters) -> PositionedWord|None:
+    """The highest scoring move, None if the rack has none (see exchange.py)"""
+    results = get_words_sorted(game_board, letters)
+    return results[0][0] if len(results) > 0 else None
 
 if __name__ == "__main__":
 
@@ -778,10 +1007,8 @@ if __name__ == "__main__":
     letters = "ΚΦΣΛΟΕ"
 
     found = find_words(game_board, letters)
-
-    q2 = query_v2(game_board, 6, Orientation.HORIZONTAL, letters)
-    for qr in q2:
-        print(playword_to_str(qr.word))
+    for pw in found:
+        print(playword_to_str(pw.word), pw.start_pos, pw.orientation)
 
 
 
@@ -803,125 +1030,124 @@ if __name__ == "__main__":
 
 
 
-play = [
-    make_pletter("Μ", 10, 4),
-    make_pletter("Γ", 10, 6),
-    make_pletter("Ι", 10, 7),
-    make_pletter("Κ", 10, 8),
-    make_pletter("Ο", 10, 9),
-    make_pletter("Υ", 10,10),
-    make_pletter("Σ", 10,11),
-    make_pletter("Α", 11, 4),
-]
+def example_play() -> list[PositionedLetter]:
+    return [
+        make_pletter("Μ", 10, 4),
+        make_pletter("Γ", 10, 6),
+        make_pletter("Ι", 10, 7),
+        make_pletter("Κ", 10, 8),
+        make_pletter("Ο", 10, 9),
+        make_pletter("Υ", 10,10),
+        make_pletter("Σ", 10,11),
+        make_pletter("Α", 11, 4),
+    ]
 
 # demo 
 @dataclass
 class Player:
     name: str
-    letters: list[PlayLetter]
     points: int = 0
 
-    def pick_letters(self, bag):
-        while len(self.letters) < 7 and len(bag) > 0:
-            l = random.choice(bag)
-            bag.remove(l)
-            self.letters.append(l)
-
-
-def remove_letter_from_list(letter, letter_list):
-    remove_index = None
-    for i, ll in enumerate(letter_list):
-        if letter == ll.letter:
-            remove_index = i
-            break
-
-    assert remove_index is not None, "Played a letter we didnt have?!"
-    letter_list.pop(remove_index)
 
 
-from itertools import cycle
 
+def demo(seed=None, record_path=None):
+    from exchange import MAX_SCORELESS_TURNS
+    from records import NO_PLAYER, open_records
+    from session import GameSession
 
-def demo():
     players = [
-        Player("Player 1", [], 0),
-        Player("Player 2", [], 0),
+        Player("Player 1"),
+        Player("Player 2"),
     ]
 
-    player_iter = cycle(players)
-
-    letter_bag = []
-    for ld in LETTER_DATA:
-        for _ in range(ld.n_count):
-            letter_bag.append(PlayLetter(letter=ld.letter))
-
-
-    random.shuffle(letter_bag)
+    session = GameSession(len(players), seed)
+    tiles = session.tiles
+    rng = tiles.rng
 
-    game_board = create_empty_board()
+    record = None
+    if record_path is not None:
+        record = open_records(record_path)
+        record.start_game(seed, len(players))
 
 
-    wordlist = list(T.wordset)
+    wordlist = list(session.trie.words())
     while True:
-        first_word = random.choice(wordlist)
+        first_word = rng.choice(wordlist)
         if len(first_word) >= 2 and len(first_word) <= 7:
             break
 
     to_play = playword_from_str(first_word)
     if to_play is not None:
-        pos_x = random.randint(BOARD_SIZE//2-len(first_word)+1, BOARD_SIZE//2)
+        pos_x = rng.randint(BOARD_SIZE//2-len(first_word)+1, BOARD_SIZE//2)
         positioned_word = PositionedWord(to_play, (pos_x, BOARD_SIZE//2), Orientation.HORIZONTAL)
 
-        next_board = copy.deepcopy(game_board)
-        points = play_positioned_word(game_board, positioned_word, nxt=next_board)
+        # the first word comes out of the bag
+        points = session.score(positioned_word)
+        session.apply_move(positioned_word, NO_PLAYER)
 
-        # remove letters
-        letters_played = get_positioned_word_letters(game_board, positioned_word)
-        for letter in letters_played:
-            remove_letter_from_list(letter.play_letter.letter, letter_bag)
+        if record is not None:
+            record.move(NO_PLAYER, positioned_word, "", points)
 
-        game_board = next_board
+    render_board(session.board)
 
-    render_board(game_board)
-
-    while len(letter_bag) > 0:
-        player = next(player_iter)
-        player.pick_letters(letter_bag)
+    scoreless = 0
+    while len(tiles.bag) > 0 and scoreless < MAX_SCORELESS_TURNS:
+        i = session.player
+        player = players[i]
+        tiles.refill(i)
 
-        my_letters = "".join(pl.letter for pl in player.letters)
+        my_letters = tiles.rack(i)
 
         print(f"{player.name} playing. Letters: {my_letters}")
 
-        best_word = get_best_word(game_board, my_letters)
+        decision = session.choose_turn(my_letters, i)
+
+        if decision.kind == "X":
+            session.exchange(decision.returned, i)
+            scoreless += 1
 
+            if record is not None:
+                record.exchange(i, my_letters, decision.returned)
+
+            print(player.name, "exchanged:", decision.returned)
+            continue
+
+        if decision.kind == "P":
+            session.pass_turn(i)
+            scoreless += 1
+
+            if record is not None:
+                record.pass_turn(i, my_letters)
+
+            print(player.name, "passed")
+            continue
 
-        next_board = copy.deepcopy(game_board)
+        best_word = decision.move
+        points = session.apply_move(best_word, i)
+        scoreless = 0 if points > 0 else scoreless + 1
 
-        res = play_positioned_word(game_board, best_word, nxt=next_board)
-        assert res is not None
+        if record is not None:
+            record.move(i, best_word, my_letters, points)
 
-        # remove letters
-        letters_played = get_positioned_word_letters(game_board, best_word)
-        for letter in letters_played:
-            remove_letter_from_list(letter.play_letter.letter, player.letters)
 
-            
-        render_board(next_board)
+        render_board(session.board)
 
         pws = playword_to_str(best_word.word)
-        print(player.name, "played word:", pws, best_word.start_pos, best_word.orientation, "Points:", res.points)
+        print(player.name, "played word:", pws, best_word.start_pos, best_word.orientation, "Points:", points)
 
-        player.points += res.points
+        player.points = session.scores[i]
         print("Total points:", player.points)
 
-        game_board = next_board
 
+    if record is not None:
+        record.end_game([player.points for player in players])
 
     for player in players:
         print(f"{player.name}: {player.points:4d} points")
 
 # temp_board = copy.deepcopy(game_board)
-# play_letters(game_board, play, temp_board)
+# play_letters(game_board, example_play(), temp_board)
 #
 # render_board(temp_board)
 
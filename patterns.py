@@ -0,0 +1,267 @@
+import sys
+import threading
+import time
+import weakref
+from collections import Counter
+from typing import Iterable
+
+from searcher import PlayLetter, PlayWord, QueryResult, Trie, get_trie
+
+# Cost model constants, in "trie candidate node" units. A trie query
+# walks up and down from every candidate node of the run it starts
+# from. An index query pays PATTERN_SLOT_COST for every line slot, plus
+# one unit per PATTERN_WORDS_PER_UNIT words in the bitsets it combines.
+# Measured on sparse and dense lines: a slot costs about as much as ten
+# candidate nodes.
+PATTERN_WORDS_PER_UNIT = 200
+PATTERN_SLOT_COST = 10.0
+
+
+def _bits_from(word_indices: list[int], n_words: int) -> int:
+    # set bits through a bytearray, or-ing into an int is quadratic
+    buf = bytearray((n_words + 7) // 8)
+    for i in word_indices:
+        buf[i >> 3] |= 1 << (i & 7)
+
+    return int.from_bytes(buf, "little")
+
+
+def _iter_bits(bits: int):
+    while bits:
+        low = bits & -bits
+        yield low.bit_length() - 1
+        bits ^= low
+
+
+class PatternIndex:
+    """Bitsets over the word list, one bit per word of a given length
+
+    at[(length, pos, letter)] has the bits of the words with `letter` at
+    `pos`, and at_least[(length, letter, k)] the bits of the words with
+    `k` or more copies of `letter`. The latter is the letter-count matrix
+    of the lexicon in bit-sliced form: words a rack can supply are the
+    ones outside every at_least[(length, letter, available + 1)].
+    """
+
+    def __init__(self, words: Iterable[str]):
+        self.words: dict[int, list[str]] = dict()
+        for word in words:
+            if len(word) not in self.words:
+                self.words[len(word)] = []
+
+            self.words[len(word)].append(word)
+
+        self.full: dict[int, int] = dict()
+        self.at: dict[tuple[int, int, str], int] = dict()
+        self.at_least: dict[tuple[int, str, int], int] = dict()
+        self.letters: dict[int, set[str]] = dict()
+
+        for length, bucket in self.words.items():
+            bucket.sort()
+            n_words = len(bucket)
+            self.full[length] = (1 << n_words) - 1
+
+            at = dict()
+            at_least = dict()
+            for i, word in enumerate(bucket):
+                for pos, letter in enumerate(word):
+                    at.setdefault((pos, letter), []).append(i)
+
+                for letter, count in Counter(word).items():
+                    for k in range(1, count + 1):
+                        at_least.setdefault((letter, k), []).append(i)
+
+            for (pos, letter), indices in at.items():
+                self.at[(length, pos, letter)] = _bits_from(indices, n_words)
+
+            for (letter, k), indices in at_least.items():
+                self.at_least[(length, letter, k)] = _bits_from(indices, n_words)
+
+            self.letters[length] = {letter for letter, _ in at_least}
+
+
+    def _slots(self, query: str, n_jumps: int):
+        # every stretch with free cells on both ends that the word would
+        # fill, holding at least one board letter and one rack letter
+        size = len(query)
+        for start in range(size):
+            if start > 0 and not query[start-1].isspace():
+                continue
+
+            n_fixed = 0
+            n_empty = 0
+            for end in range(start + 1, size + 1):
+                if query[end-1].isspace():
+                    n_empty += 1
+                else:
+                    n_fixed += 1
+
+                if n_empty > n_jumps:
+                    break
+
+                if end < size and not query[end].isspace():
+                    continue
+
+                length = end - start
+                if length >= 2 and n_fixed > 0 and n_empty > 0 and length in self.words:
+                    yield start, end
+
+
+    def estimate_cost(self, query: str, n_jumps: int) -> float:
+        cost = 0.0
+        for start, end in self._slots(query, n_jumps):
+            cost += PATTERN_SLOT_COST + len(self.words[end - start]) / PATTERN_WORDS_PER_UNIT
+
+        return cost
+
+
+    def query(self, qu: str, jumps: str|list[str]) -> list[QueryResult]:
+        """Same words as Trie.query, found by and-ing letter bitsets"""
+        qu = qu.replace(".", " ")
+        if isinstance(jumps, str):
+            jumps = list(jumps)
+
+        rack = Counter(jumps)
+        n_blanks = rack.pop("*", 0)
+
+        all_results = []
+        for start, end in self._slots(qu, len(jumps)):
+            length = end - start
+            candidates = self.full[length]
+
+            fixed = Counter()
+            for pos in range(start, end):
+                letter = qu[pos]
+                if letter.isspace():
+                    continue
+
+                fixed[letter] += 1
+                candidates &= self.at.get((length, pos - start, letter), 0)
+                if candidates == 0:
+                    break
+
+            if candidates == 0:
+                continue
+
+            candidates &= self._fit(length, rack, fixed, n_blanks)
+
+            # Trie.query finds a word once from the end of every board
+            # run in it, each time with its own placement of the blanks
+            anchors = [pos for pos in range(start, end) if not qu[pos].isspace() and (pos + 1 == end or qu[pos+1].isspace())]
+
+            bucket = self.words[length]
+            for i in _iter_bits(candidates):
+                placed = set()
+                for anchor in anchors:
+                    word = self._place(bucket[i], qu, start, anchor, rack, n_blanks)
+                    if word is None:
+                        continue
+
+                    blanks = tuple(pl.letter == "*" for pl in word)
+                    if blanks not in placed:
+                        placed.add(blanks)
+                        all_results.append(QueryResult(start, word))
+
+        return all_results
+
+
+    def _fit(self, length: int, rack: Counter, fixed: Counter, n_blanks: int) -> int:
+        # short[k]: words that are short of k or more letters, counted
+        # bit-sliced over the letters. They fit if short by <= n_blanks.
+        short = [self.full[length]] + [0] * (n_blanks + 1)
+
+        for letter in self.letters[length]:
+            available = rack[letter] + fixed[letter]
+            over = [self.at_least.get((length, letter, available + j), 0) for j in range(1, n_blanks + 2)]
+            if over[0] == 0:
+                continue
+
+            # going down so short[k - j] still holds the previous letters
+            for k in range(n_blanks + 1, 0, -1):
+                acc = short[k]
+                for j in range(1, k + 1):
+                    acc |= short[k - j] & over[j - 1]
+
+                short[k] = acc
+
+        return self.full[length] & ~short[n_blanks + 1]
+
+
+    def _place(self, word: str, qu: str, start: int, anchor: int, rack: Counter, n_blanks: int) -> PlayWord|None:
+        # fill the free cells in the order Trie.query does from the board
+        # letter at `anchor`, so blanks land on the same squares: right to
+        # left before it, then left to right after it
+        end = start + len(word)
+        remaining = rack.copy()
+        play_word = [None] * len(word)
+
+        for pos in list(range(anchor, start - 1, -1)) + list(range(anchor + 1, end)):
+            letter = word[pos - start]
+            if not qu[pos].isspace():
+                play_word[pos - start] = PlayLetter(letter=letter)
+
+            elif remaining[letter] > 0:
+                remaining[letter] -= 1
+                play_word[pos - start] = PlayLetter(letter=letter, wildcard_letter=letter)
+
+            elif n_blanks > 0:
+                n_blanks -= 1
+                play_word[pos - start] = PlayLetter(letter="*", wildcard_letter=letter)
+
+            else:
+                return None
+
+        return play_word
+
+
+def trie_cost(t: Trie, qu: str) -> float:
+    """Candidate nodes a Trie.query of `qu` starts from"""
+    index = t.anchors if len(t.anchors) > 0 else t.node_tracker
+
+    cost = 0.0
+    for start in t._find_starts(qu):
+        if qu[start] not in index:
+            continue
+
+        i = start
+        while i >= 0 and qu[i:start+1] in index:
+            i -= 1
+
+        cost += len(index[qu[i+1:start+1]])
+
+    return cost
+
+
+def query_line(t: Trie, patterns: "PatternIndex", qu: str, jumps: str|list[str]) -> list[QueryResult]:
+    """Run whichever of the two engines the cost model expects to be cheaper"""
+    qu = qu.replace(".", " ")
+    if patterns.estimate_cost(qu, len(jumps)) < trie_cost(t, qu):
+        return patterns.query(qu, jumps)
+
+    return t.query(qu, jumps)
+
+
+# pattern index per lexicon, rebuilt when the lexicon is updated
+_patterns: "weakref.WeakKeyDictionary[Trie, tuple[int, PatternIndex]]" = weakref.WeakKeyDictionary()
+_patterns_lock = threading.Lock()
+
+
+def get_pattern_index(t: Trie|None = None) -> PatternIndex:
+    """Return the pattern index of a lexicon, the shared one by default, building it on first use"""
+    if t is None:
+        t = get_trie()
+
+    entry = _patterns.get(t)
+    if entry is None or entry[0] != t.version:
+        with _patterns_lock:
+            entry = _patterns.get(t)
+            if entry is None or entry[0] != t.version:
+                words = list(t.words())
+
+                t0 = time.time()
+                entry = _patterns[t] = (t.version, PatternIndex(words))
+
+                diff = time.time() - t0
+                print(f"Building pattern index took {diff:.2f}s", file=sys.stderr)
+
+    return entry[1]
@@ -0,0 +1,134 @@
+import sys
+import threading
+import time
+import weakref
+from typing import Iterable
+
+import numpy as np
+
+from letters import LETTER_IDS
+from searcher import Trie, get_trie
+
+# bytes of the (racks, words, letters) temporary in formable_batch
+BATCH_BLOCK_BYTES = 32 * 1024 * 1024
+
+
+class RackFit:
+    """Letter counts of every word as a words x letters uint8 matrix
+
+    Which words a multiset of letters can form is then one comparison of
+    the rack counts against every row at once.
+    """
+
+    def __init__(self, words: Iterable[str]):
+        # words with letters outside the tile set can never be formed
+        self.words = sorted(w for w in words if all(letter in LETTER_IDS for letter in w))
+
+        n_words = len(self.words)
+        lengths = np.fromiter((len(w) for w in self.words), dtype=np.int64, count=n_words)
+        letters = np.fromiter((LETTER_IDS[letter] for w in self.words for letter in w), dtype=np.int64, count=int(lengths.sum()))
+        rows = np.repeat(np.arange(n_words), lengths)
+
+        n_letters = len(LETTER_IDS)
+        counts = np.bincount(rows * n_letters + letters, minlength=n_words * n_letters)
+
+        self.counts = counts.reshape(n_words, n_letters).astype(np.uint8)
+        self.lengths = lengths.astype(np.uint8)
+
+
+    def rack_counts(self, letters: str|list[str]) -> tuple[np.ndarray, int]:
+        """Counts of the real letters of a rack and its number of blanks"""
+        counts = np.zeros(len(LETTER_IDS), dtype=np.uint8)
+        blanks = 0
+
+        for letter in letters:
+            if letter == "*":
+                blanks += 1
+            elif letter in LETTER_IDS:
+                counts[LETTER_IDS[letter]] += 1
+            else:
+                raise ValueError(f"Not a tile: {letter!r}")
+
+        return counts, blanks
+
+
+    def _length_mask(self, min_len: int, max_len: int|None) -> np.ndarray:
+        mask = self.lengths >= min_len
+        if max_len is not None:
+            mask &= self.lengths <= max_len
+
+        return mask
+
+
+    def formable(self, rack: str|list[str], extra: str = "", blanks: int = 0, min_len: int = 2, max_len: int|None = None) -> np.ndarray:
+        """Indices of the words that rack + extra can form
+
+        Blanks on the rack ("*") and the `blanks` argument both stand
+        in for any letter.
+        """
+        available, rack_blanks = self.rack_counts(list(rack) + list(extra))
+        blanks += rack_blanks
+
+        if blanks == 0:
+            fits = (self.counts <= available).all(axis=1)
+        else:
+            short = self.counts - np.minimum(self.counts, available)
+            fits = short.sum(axis=1, dtype=np.uint16) <= blanks
+
+        return np.flatnonzero(fits & self._length_mask(min_len, max_len))
+
+
+    def formable_batch(self, racks: list[str], extra: str = "", blanks: int = 0, min_len: int = 2, max_len: int|None = None) -> list[np.ndarray]:
+        """formable() for many racks, sharing one pass over the matrix"""
+        n_racks = len(racks)
+        available = np.zeros((n_racks, len(LETTER_IDS)), dtype=np.uint8)
+        allowed = np.zeros(n_racks, dtype=np.uint16)
+
+        for r, rack in enumerate(racks):
+            available[r], rack_blanks = self.rack_counts(list(rack) + list(extra))
+            allowed[r] = blanks + rack_blanks
+
+        length_mask = self._length_mask(min_len, max_len)
+        fits = np.zeros((n_racks, len(self.words)), dtype=bool)
+
+        block = max(1, BATCH_BLOCK_BYTES // max(1, n_racks * len(LETTER_IDS)))
+        for start in range(0, len(self.words), block):
+            counts = self.counts[start:start+block]
+
+            # racks x words x letters of missing letters
+            short = counts[None, :, :] - np.minimum(counts[None, :, :], available[:, None, :])
+            fits[:, start:start+block] = short.sum(axis=2, dtype=np.uint16) <= allowed[:, None]
+
+        fits &= length_mask
+        return [np.flatnonzero(row) for row in fits]
+
+
+    def words_at(self, indices: np.ndarray) -> list[str]:
+        return [self.words[i] for i in indices.tolist()]
+
+
+
+# per lexicon, rebuilt when the lexicon is updated
+_rack_fits: "weakref.WeakKeyDictionary[Trie, tuple[int, RackFit]]" = weakref.WeakKeyDictionary()
+_rack_fit_lock = threading.Lock()
+
+
+def get_rack_fit(t: Trie|None = None) -> RackFit:
+    """Return the rack-fit matrix of a lexicon, the shared one by default, building it on first use"""
+    if t is None:
+        t = get_trie()
+
+    entry = _rack_fits.get(t)
+    if entry is None or entry[0] != t.version:
+        with _rack_fit_lock:
+            entry = _rack_fits.get(t)
+            if entry is None or entry[0] != t.version:
+                words = list(t.words())
+
+                t0 = time.time()
+                entry = _rack_fits[t] = (t.version, RackFit(words))
+
+                diff = time.time() - t0
+                print(f"Building rack-fit matrix took {diff:.2f}s", file=sys.stderr)
+
+    return entry[1]
@@ -0,0 +1,256 @@
+import argparse
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+
+from compact import attach_trie, share_current_trie
+from main import (
+    Board, PositionedWord, ScoringEngine, create_empty_board, get_words_sorted,
+)
+from serialize import CODE_ORIENTATIONS, ORIENTATION_CODES, move_to_dict, playword_from_chars, playword_to_chars
+
+# Game records are text, one event per line, fields split by spaces.
+# Files are only ever appended to, a file holds any number of games:
+#
+#   G <seed> <players>                         new game, seed "-" if unknown
+#   M <player> <x> <y> <H|V> <tiles> <rack> <score>
+#   X <player> <rack> <returned tiles>         exchange
+#   P <player> <rack>                          pass
+#   E <score> <score> ...                      final scores
+#
+# Tiles are written like board rows (lowercase for wildcards) and cover
+# the whole word, board letters included. An empty rack is "-". Player
+# -1 places tiles straight from the bag, like the opening word of demo().
+
+EMPTY_RACK = "-"
+NO_PLAYER = -1
+
+
+@dataclass
+class MoveRecord:
+    kind: str       # "M", "X" or "P"
+    player: int
+    rack: str
+    move: PositionedWord|None = None
+    score: int = 0
+    returned: str = ""
+
+
+@dataclass
+class GameRecord:
+    seed: int|None
+    n_players: int
+    moves: list[MoveRecord] = field(default_factory=list)
+    final: list[int]|None = None
+
+
+def _rack_field(rack: str) -> str:
+    return rack if rack != "" else EMPTY_RACK
+
+
+def _rack_value(s: str) -> str:
+    return "" if s == EMPTY_RACK else s
+
+
+class RecordWriter:
+    """Writes game events to a text stream as they happen"""
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def _line(self, *fields):
+        self.stream.write(" ".join(str(f) for f in fields) + "\n")
+
+    def start_game(self, seed: int|None, n_players: int):
+        self._line("G", "-" if seed is None else seed, n_players)
+
+    def move(self, player: int, pw: PositionedWord, rack: str, score: int):
+        x, y = pw.start_pos
+        self._line("M", player, x, y, ORIENTATION_CODES[pw.orientation], playword_to_chars(pw.word), _rack_field(rack), score)
+
+    def exchange(self, player: int, rack: str, returned: str):
+        self._line("X", player, _rack_field(rack), returned)
+
+    def pass_turn(self, player: int, rack: str):
+        self._line("P", player, _rack_field(rack))
+
+    def end_game(self, scores: list[int]):
+        self._line("E", *scores)
+        self.stream.flush()
+
+    def write_game(self, game: GameRecord):
+        self.start_game(game.seed, game.n_players)
+        for rec in game.moves:
+            if rec.kind == "M":
+                self.move(rec.player, rec.move, rec.rack, rec.score)
+            elif rec.kind == "X":
+                self.exchange(rec.player, rec.rack, rec.returned)
+            else:
+                self.pass_turn(rec.player, rec.rack)
+
+        if game.final is not None:
+            self.end_game(game.final)
+
+
+def open_records(path: str) -> RecordWriter:
+    """Writer appending to a record file"""
+    return RecordWriter(open(path, "a", encoding="utf-8"))
+
+
+def _parse_line(fields: list[str]) -> MoveRecord:
+    kind = fields[0]
+    if kind == "M" and len(fields) == 8:
+        _, player, x, y, orient, tiles, rack, score = fields
+        pw = PositionedWord(playword_from_chars(tiles), (int(x), int(y)), CODE_ORIENTATIONS[orient])
+        return MoveRecord("M", int(player), _rack_value(rack), pw, int(score))
+
+    if kind == "X" and len(fields) == 4:
+        return MoveRecord("X", int(fields[1]), _rack_value(fields[2]), returned=fields[3])
+
+    if kind == "P" and len(fields) == 3:
+        return MoveRecord("P", int(fields[1]), _rack_value(fields[2]))
+
+    raise ValueError(f"Bad record: {' '.join(fields)!r}")
+
+
+def read_games(stream):
+    """Yield the games of a record stream one at a time"""
+    game = None
+    for line_no, line in enumerate(stream, 1):
+        fields = line.split()
+        if len(fields) == 0:
+            continue
+
+        try:
+            if fields[0] == "G":
+                if game is not None:
+                    yield game
+
+                seed = None if fields[1] == "-" else int(fields[1])
+                game = GameRecord(seed, int(fields[2]))
+
+            elif game is None:
+                raise ValueError("Event before the first game")
+
+            elif fields[0] == "E":
+                game.final = [int(f) for f in fields[1:]]
+
+            else:
+                game.moves.append(_parse_line(fields))
+
+        except (ValueError, KeyError, IndexError) as e:
+            raise ValueError(f"Line {line_no}: {e}") from e
+
+    if game is not None:
+        yield game
+
+
+def replay(game: GameRecord):
+    """Yield (board, engine, record) for every move, before it is applied
+
+    One board is updated in place from move to move, with the engine's
+    cross-word cache invalidated only around the new tiles. Copy the
+    board to keep it past the next step.
+    """
+    game_board = create_empty_board()
+    engine = ScoringEngine(game_board)
+
+    for rec in game.moves:
+        yield game_board, engine, rec
+
+        if rec.move is not None:
+            engine.place(engine.move_letters(rec.move))
+
+
+def board_at(game: GameRecord, turn: int|None = None) -> Board:
+    """The board after the first `turn` moves of a game, or all of them"""
+    game_board = create_empty_board()
+    engine = ScoringEngine(game_board)
+
+    for rec in game.moves[:turn]:
+        if rec.move is not None:
+            engine.place(engine.move_letters(rec.move))
+
+    return game_board
+
+
+def reanalyze_game(game: GameRecord, top: int) -> list[dict]:
+    """Score every recorded move again and list the best moves of its rack"""
+    out = []
+    for turn, (game_board, engine, rec) in enumerate(replay(game)):
+        if rec.player == NO_PLAYER or rec.rack == "":
+            continue
+
+        record = {"turn": turn, "player": rec.player, "rack": rec.rack, "kind": rec.kind}
+
+        if rec.move is not None:
+            result = engine.score(engine.move_letters(rec.move))
+            record["played"] = move_to_dict(rec.move, rec.score)
+            record["rescored"] = None if result is None else result.points
+
+        results = get_words_sorted(game_board, rec.rack, print_out=False, top_n=top)
+        record["best"] = [move_to_dict(pw, score) for pw, score in results]
+
+        out.append(record)
+
+    return out
+
+
+def run_reanalysis(in_stream, out_stream, workers: int, top: int, lexicon_path: str|None = None) -> int:
+    # same ordered window as batch.run_batch, one game per task
+    window = workers * 2
+    pending = deque()
+    n_games = 0
+
+    def flush_one():
+        nonlocal n_games
+        game_index, future = pending.popleft()
+        for record in future.result():
+            out_stream.write(json.dumps({"game": game_index, **record}, ensure_ascii=False) + "\n")
+
+        n_games += 1
+
+    owns_lexicon = lexicon_path is None
+    if owns_lexicon:
+        lexicon_path = share_current_trie()
+
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=attach_trie, initargs=(lexicon_path,)) as pool:
+            for game_index, game in enumerate(read_games(in_stream)):
+                if len(pending) >= window:
+                    flush_one()
+
+                pending.append((game_index, pool.submit(reanalyze_game, game, top)))
+
+            while len(pending) > 0:
+                flush_one()
+
+    finally:
+        if owns_lexicon:
+            os.unlink(lexicon_path)
+
+    out_stream.flush()
+    return n_games
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-analyze recorded games, one JSON line per move")
+    parser.add_argument("input", nargs="?", default="-", help="game record file, - for stdin")
+    parser.add_argument("-o", "--output", default="-", help="output JSONL file, - for stdout")
+    parser.add_argument("-k", "--top", type=int, default=3, help="best moves to list per turn")
+    parser.add_argument("-j", "--workers", type=int, default=4)
+    parser.add_argument("--lexicon", default=None, help="compiled lexicon to map (see compact.py)")
+    args = parser.parse_args()
+
+    in_stream = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8")
+    out_stream = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+
+    t0 = time.time()
+    n_games = run_reanalysis(in_stream, out_stream, args.workers, args.top, args.lexicon)
+    diff = time.time() - t0
+
+    print(f"Re-analyzed {n_games} games in {diff:.2f} seconds.", file=sys.stderr)
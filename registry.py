@@ -0,0 +1,281 @@
+import json
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+
+from compact import CompactTrie, load_compact
+from main import LETTER_DATA, LetterData
+from searcher import ANCHOR_ENTRY_BYTES, ANCHOR_KEY_BYTES, Trie, create_greek_trie, get_trie
+from tiles import TILE_IDS
+
+# A lexicon is a word list plus the tiles it is played with. They are
+# described in a JSON config:
+#
+#   {
+#     "memory_cap_mb": 512,
+#     "lexicons": {
+#       "tournament": {"path": "tournament.bin"},
+#       "casual":     {"path": "casual.txt", "tiles": "casual_tiles.json"},
+#       "children":   {"base": "casual", "remove": "children_remove.txt"}
+#     }
+#   }
+#
+# "path" is a word list, or a lexicon compiled by compact.py, which is
+# mapped instead of built. A lexicon with a "base" is that lexicon with
+# the words of "add" and "remove" (one per line) applied to a snapshot,
+# sharing every node the change does not touch. Lexicons reading the
+# same path share one trie. A tile set maps letters to [count, value],
+# letters it leaves out keep those of LETTER_DATA.
+#
+# The board and the alphabet stay those of main.py, the variants are
+# Greek word lists.
+
+DEFAULT_LEXICON = "default"
+DEFAULT_MEMORY_CAP = 1024 * 1024 * 1024
+
+# measured per node of the dict trie, edges and metadata included
+NODE_BYTES = 450
+NODE_REF_BYTES = 8
+
+
+@dataclass
+class LexiconSpec:
+    path: str|None = None       # None: the lexicon of this process, see get_trie
+    tiles: str|None = None
+    base: str|None = None
+    add: str|None = None
+    remove: str|None = None
+
+
+@dataclass
+class Lexicon:
+    name: str
+    trie: Trie
+    letter_data: list[LetterData]
+    values: dict[str, int]
+    size: int
+    base: str|None = None
+    last_used: float = field(default_factory=time.time)
+
+    def full_counts(self) -> list[int]:
+        """Tile counts in tiles.TILE_IDS order, for TileTracker"""
+        counts = [0] * len(TILE_IDS)
+        for ld in self.letter_data:
+            counts[TILE_IDS[ld.letter]] = ld.n_count
+
+        return counts
+
+
+def load_tile_set(path: str|None) -> list[LetterData]:
+    if path is None:
+        return list(LETTER_DATA)
+
+    with open(path, encoding="utf-8") as f:
+        overrides = json.load(f)
+
+    # the hook masks and tile ids are those of the Greek alphabet
+    for letter in overrides:
+        if letter not in TILE_IDS:
+            raise ValueError(f"{path}: not a tile of the alphabet: {letter!r}")
+
+    letter_data = []
+    for ld in LETTER_DATA:
+        if ld.letter in overrides:
+            n_count, value = overrides[ld.letter]
+            ld = LetterData(ld.letter, n_count=int(n_count), value=int(value))
+
+        letter_data.append(ld)
+
+    return letter_data
+
+
+def _read_words(path: str|None) -> list[str]:
+    if path is None:
+        return []
+
+    with open(path, encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip() != ""]
+
+
+def estimate_size(t: Trie) -> int:
+    """Bytes held by a lexicon itself, leaving out what it shares with another"""
+    if isinstance(t, CompactTrie):
+        # mapped pages, shared with every process mapping the file
+        return len(t.buffer)
+
+    n_own = len(t.nodes) - t.shared_nodes + len(t.copied_nodes)
+    own_keys = t.anchors.keys() if t.shared_nodes == 0 else t.copied_keys
+    n_entries = sum(len(t.anchors[key]) for key in own_keys if key in t.anchors)
+
+    return (n_own * NODE_BYTES + len(t.nodes) * NODE_REF_BYTES
+            + n_entries * ANCHOR_ENTRY_BYTES + len(t.anchors) * ANCHOR_KEY_BYTES)
+
+
+class LexiconRegistry:
+    """Lexicons by name, loaded on first use and evicted least recently used first
+
+    Once the estimated size of the loaded lexicons passes memory_cap,
+    the coldest ones are dropped, except those another loaded lexicon
+    is based on. A dropped lexicon is loaded again on its next use.
+    """
+
+    def __init__(self, specs: dict[str, LexiconSpec]|None = None, memory_cap: int = DEFAULT_MEMORY_CAP):
+        self.specs = {DEFAULT_LEXICON: LexiconSpec()}
+        if specs is not None:
+            self.specs.update(specs)
+
+        self.memory_cap = memory_cap
+        self.loaded: OrderedDict[str, Lexicon] = OrderedDict()
+        self.lock = threading.RLock()
+
+
+    def register(self, name: str, spec: LexiconSpec):
+        with self.lock:
+            self.specs[name] = spec
+            self.loaded.pop(name, None)
+
+
+    def names(self) -> list[str]:
+        return list(self.specs.keys())
+
+
+    def get(self, name: str = DEFAULT_LEXICON) -> Lexicon:
+        with self.lock:
+            lexicon = self.loaded.get(name)
+
+            # the lexicon of this process moves on with update_trie
+            if lexicon is not None and self.specs[name].path is None and self.specs[name].base is None:
+                if lexicon.trie is not get_trie():
+                    lexicon = None
+
+            if lexicon is None:
+                lexicon = self._load(name)
+
+                # a reload goes to the end too, _evict spares the last entry
+                self.loaded.pop(name, None)
+                self.loaded[name] = lexicon
+                self._evict()
+
+            self.loaded.move_to_end(name)
+            lexicon.last_used = time.time()
+
+            return lexicon
+
+
+    def _load(self, name: str) -> Lexicon:
+        spec = self.specs.get(name)
+        if spec is None:
+            raise KeyError(f"Unknown lexicon: {name!r}")
+
+        t0 = time.time()
+        letter_data = load_tile_set(spec.tiles)
+
+        if spec.base is not None:
+            base = self.get(spec.base)
+
+            t = base.trie.snapshot()
+            t.add_words(_read_words(spec.add))
+            t.remove_words(_read_words(spec.remove))
+
+        elif spec.path is None:
+            t = get_trie()
+
+        else:
+            t = self._shared_trie(spec.path)
+            if t is None and spec.path.endswith(".bin"):
+                t = load_compact(spec.path)
+            elif t is None:
+                t = create_greek_trie(spec.path)
+
+        size = estimate_size(t)
+        diff = time.time() - t0
+        print(f"Loading lexicon {name} took {diff:.2f}s (~{size // (1024 * 1024)} MiB)", file=sys.stderr)
+
+        values = {ld.letter: ld.value for ld in letter_data}
+        return Lexicon(name, t, letter_data, values, size, spec.base)
+
+
+    def _shared_trie(self, path: str) -> Trie|None:
+        for lexicon in self.loaded.values():
+            spec = self.specs[lexicon.name]
+            if spec.base is None and spec.path is not None and os.path.abspath(spec.path) == os.path.abspath(path):
+                return lexicon.trie
+
+        return None
+
+
+    def memory_used(self) -> int:
+        # a trie shared by several lexicons counts once
+        sizes = {id(lexicon.trie): lexicon.size for lexicon in self.loaded.values()}
+        return sum(sizes.values())
+
+
+    def _evict(self):
+        while self.memory_used() > self.memory_cap:
+            bases = {lexicon.base for lexicon in self.loaded.values()}
+
+            # oldest first, never the one just loaded
+            victim = next((name for name in list(self.loaded)[:-1] if name not in bases), None)
+            if victim is None:
+                break
+
+            del self.loaded[victim]
+            print(f"Evicted lexicon {victim}", file=sys.stderr)
+
+
+    def to_dict(self) -> dict:
+        return {
+            "memory_used": self.memory_used(),
+            "memory_cap": self.memory_cap,
+            "loaded": [
+                {"name": lexicon.name, "words": len(lexicon.trie), "size": lexicon.size, "last_used": lexicon.last_used}
+                for lexicon in self.loaded.values()
+            ],
+            "available": self.names(),
+        }
+
+
+
+def load_registry(path: str) -> LexiconRegistry:
+    """Registry of the lexicons in a JSON config, paths relative to it"""
+    with open(path, encoding="utf-8") as f:
+        config = json.load(f)
+
+    root = os.path.dirname(os.path.abspath(path))
+
+    def resolve(p: str|None) -> str|None:
+        return None if p is None else os.path.join(root, p)
+
+    specs = dict()
+    for name, entry in config.get("lexicons", {}).items():
+        specs[name] = LexiconSpec(
+            path=resolve(entry.get("path")),
+            tiles=resolve(entry.get("tiles")),
+            base=entry.get("base"),
+            add=resolve(entry.get("add")),
+            remove=resolve(entry.get("remove")),
+        )
+
+    memory_cap = int(config.get("memory_cap_mb", DEFAULT_MEMORY_CAP // (1024 * 1024))) * 1024 * 1024
+    return LexiconRegistry(specs, memory_cap)
+
+
+LEXICONS_PATH = "lexicons.json"
+
+_registry: LexiconRegistry|None = None
+_registry_lock = threading.Lock()
+
+
+def get_registry() -> LexiconRegistry:
+    """Return the registry of this process, from lexicons.json if there is one"""
+    global _registry
+
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = load_registry(LEXICONS_PATH) if os.path.exists(LEXICONS_PATH) else LexiconRegistry()
+
+    return _registry
@@ -1,6 +1,9 @@
 import pprint
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
+import heapq
 import pickle
+import sys
+import threading
 import time
 
 @dataclass
@@ -8,6 +11,9 @@ class TrieEdge:
     letter: str
     index: int
 
+# min_remaining of a node that no word passes through
+NO_WORD = 255
+
 @dataclass
 class TrieNode:
     letter: str
@@ -17,6 +23,12 @@ class TrieNode:
     parent: int
     edges: dict[str, int]
 
+    # subtree metadata, filled in by Trie.annotate. The defaults
+    # never prune, so a trie that was not annotated still works.
+    min_remaining: int = 0  # letters to the nearest terminal at or below
+    max_remaining: int = 0  # letters to the deepest node below
+    need_mask: int = 0      # letters every word below this node uses
+
 
 @dataclass
 class PlayLetter:
@@ -52,6 +64,22 @@ class QueryResult:
         return hash(f"{self.start_index}{rw}")
 
 
+@dataclass
+class UpPath:
+    node: int       # candidate node the board run ends at
+    start: int      # query index of that node
+    path: list[tuple[str, bool]]  # letters above it, nearest first, and whether their cell is free
+
+
+@dataclass
+class LinePlan:
+    """Rack-independent part of a query: one board line, walked up once"""
+    query: str
+    line_info: tuple[list[int], list[int]]
+    # grouped by how many rack letters the path takes and which ones
+    ups: dict[tuple[int, int], list[UpPath]]
+
+
 def get_jump_letter(letter_to_get: str, jumps: list[str]) -> str|None:
     """Return the letter used to jump to `letter_to_get`, else None"""
     if letter_to_get in jumps:
@@ -72,6 +100,25 @@ def get_counts(dct):
     return {a:len(b) for a, b in dct.items()}
 
 
+# the anchor index is sized in bytes: a list slot per node entry plus
+# the dict entry, key string and list header of every key
+ANCHOR_ENTRY_BYTES = 8
+ANCHOR_KEY_BYTES = 160
+
+# default budget, in multiples of the single letter index (one entry per
+# node); a fixed byte budget would not scale, a large lexicon fills it
+# with single letters. On 7.5k, 15k and 30k word lists 2x cuts the
+# candidates the lines of 52 positions start from 3 to 3.2 times, 4x
+# gets within 1-4% of an unlimited index. Rerun on a lexicon with
+# bench.py --anchor-sweep
+ANCHOR_BUDGET_FACTOR = 4
+
+# do not spend memory on keys that save scanning fewer nodes than this.
+# A tie breaker at the tail: 1 to 64 all give the same candidates within
+# 0.5% once the budget is what stops the build
+ANCHOR_MIN_BENEFIT = 4
+
+
 def debug_print_q_starts(q, s):
     qu_p = q.replace(' ', '.')
     points = [' '] * len(qu_p)
@@ -84,20 +131,116 @@ def debug_print_q_starts(q, s):
     print(points_s)
 
 
+# FNV-1a, 64 bit. The state after a prefix can be extended letter by
+# letter, so hashing a word does not need the word as one string.
+FNV_OFFSET = 0xcbf29ce484222325
+FNV_PRIME = 0x100000001b3
+FNV_MASK = (1 << 64) - 1
+
+BLOOM_BITS_PER_WORD = 10
+
+
+def fnv_extend(h: int, letters) -> int:
+    for letter in letters:
+        h = ((h ^ ord(letter)) * FNV_PRIME) & FNV_MASK
+
+    return h
+
+
+class BloomFilter:
+    """Bit array answering "maybe a word" or "certainly not a word"
+
+    The k probes are derived from one FNV hash by double hashing.
+    """
+
+    def __init__(self, n_bits: int, n_hashes: int, bits=None):
+        self.n_bits = n_bits
+        self.n_hashes = n_hashes
+        self.bits = bytearray((n_bits + 7) // 8) if bits is None else bits
+
+
+    def add(self, word):
+        h = fnv_extend(FNV_OFFSET, word)
+        h1, h2 = h & 0xffffffff, (h >> 32) | 1
+        for i in range(self.n_hashes):
+            bit = (h1 + i * h2) % self.n_bits
+            self.bits[bit >> 3] |= 1 << (bit & 7)
+
+
+    def might_contain_hash(self, h: int) -> bool:
+        bits, n_bits = self.bits, self.n_bits
+        h1, h2 = h & 0xffffffff, (h >> 32) | 1
+        for i in range(self.n_hashes):
+            bit = (h1 + i * h2) % n_bits
+            if not bits[bit >> 3] >> (bit & 7) & 1:
+                return False
+
+        return True
+
+
+    def might_contain(self, word) -> bool:
+        return self.might_contain_hash(fnv_extend(FNV_OFFSET, word))
+
+
+
 class Trie:
 
     def __init__(self):
-        self.wordset = set()
+        self.n_words = 0
         self.nodes: list[TrieNode] = []
         self.node_tracker: dict[str, list[int]] = dict()
 
-        self.collapsed = set()
+        # letter run -> nodes where that run ends, see build_anchor_index
+        self.anchors: dict[str, list[int]] = dict()
+
+        # bit of every letter in the need_mask of the nodes
+        self.letter_bits: dict[str, int] = dict()
+
+        # optional filter in front of the membership walk, see build_bloom
+        self.bloom: BloomFilter|None = None
+
+        # bumped by every update, see snapshot
+        self.version = 0
+
+        # nodes below this index and the index lists not in copied_keys
+        # are shared with an older snapshot and copied before a write
+        self.shared_nodes = 0
+        self.copied_nodes: set[int] = set()
+        self.copied_keys: set[str] = set()
+
         # create root node
         self.nodes.append(TrieNode("", index=0, depth=0, terminal=False, parent=-1, edges=dict()))
 
 
+    def _writable(self, idx: int) -> TrieNode:
+        # copy a node shared with an older snapshot before changing it
+        if idx < self.shared_nodes and idx not in self.copied_nodes:
+            node = self.nodes[idx]
+            self.nodes[idx] = replace(node, edges=dict(node.edges))
+            self.copied_nodes.add(idx)
+
+        return self.nodes[idx]
+
+
+    def _writable_list(self, index: dict[str, list[int]], key: str) -> list[int]:
+        if self.shared_nodes > 0 and key not in self.copied_keys:
+            copied = list(index[key])
+
+            # single letters are one list in both indexes
+            if key in self.node_tracker and self.anchors.get(key) is self.node_tracker[key]:
+                self.anchors[key] = copied
+
+            if len(key) == 1:
+                self.node_tracker[key] = copied
+
+            index[key] = copied
+            self.copied_keys.add(key)
+
+        return index[key]
+
+
     def create_node(self, letter:str, parent_idx: int):
-        parent_node = self.nodes[parent_idx]
+        parent_node = self._writable(parent_idx)
         new_node = TrieNode(
             letter=letter,
             index=len(self.nodes),
@@ -112,14 +255,19 @@ class Trie:
 
         if letter not in self.node_tracker:
             self.node_tracker[letter] = []
+            self.copied_keys.add(letter)
+            if letter not in self.letter_bits:
+                self.letter_bits[letter] = 1 << len(self.letter_bits)
 
-        self.node_tracker[letter].append(new_node.index)
+            if len(self.anchors) > 0:
+                self.anchors[letter] = self.node_tracker[letter]
+
+        self._writable_list(self.node_tracker, letter).append(new_node.index)
 
         return self.nodes[-1]
 
 
     def add(self, word):
-        self.wordset.add(word)
         current = self.nodes[0] # root
 
         for letter in word:
@@ -130,9 +278,224 @@ class Trie:
 
 
         # mark the final node as terminal
+        if not current.terminal:
+            self.n_words += 1
+
         current.terminal = True
 
 
+    def child(self, idx: int, letter: str) -> int:
+        """Index of the child of node `idx` through `letter`, else -1"""
+        return self.nodes[idx].edges.get(letter, -1)
+
+
+    def is_terminal(self, idx: int) -> bool:
+        return self.nodes[idx].terminal
+
+
+    def children(self, idx: int):
+        """(letter, child index) of every edge of node `idx`"""
+        return self.nodes[idx].edges.items()
+
+
+    def walk(self, letters, idx: int = 0) -> int:
+        """Node reached from node `idx` through `letters`, else -1"""
+        nodes = self.nodes
+        for letter in letters:
+            idx = nodes[idx].edges.get(letter, -1)
+            if idx < 0:
+                return -1
+
+        return idx
+
+
+    def __contains__(self, word) -> bool:
+        """Whether `word` (a string or any sequence of letters) is a word"""
+        if self.bloom is not None and not self.bloom.might_contain(word):
+            return False
+
+        idx = self.walk(word)
+        return idx >= 0 and self.is_terminal(idx)
+
+
+    def __len__(self):
+        return self.n_words
+
+
+    def words(self):
+        """Every word, built from the trie paths"""
+        stack = [(0, "")]
+        while stack:
+            idx, prefix = stack.pop()
+            node = self.nodes[idx]
+            if node.terminal:
+                yield prefix
+
+            for letter, child_idx in node.edges.items():
+                stack.append((child_idx, prefix + letter))
+
+
+    def build_bloom(self, bits_per_word=BLOOM_BITS_PER_WORD):
+        # about 1% false positives at 10 bits per word
+        n_hashes = max(1, round(bits_per_word * 0.69))
+        bloom = BloomFilter(max(8, self.n_words * bits_per_word), n_hashes)
+        for word in self.words():
+            bloom.add(word)
+
+        self.bloom = bloom
+
+
+
+    def _annotate_node(self, node: TrieNode):
+        min_remaining = 0 if node.terminal else NO_WORD
+        max_remaining = 0
+        need_mask = -1
+
+        for letter, child_idx in node.edges.items():
+            child = self.nodes[child_idx]
+            if child.min_remaining == NO_WORD:
+                continue
+
+            min_remaining = min(min_remaining, child.min_remaining + 1)
+            max_remaining = max(max_remaining, child.max_remaining + 1)
+            need_mask &= self.letter_bits[letter] | child.need_mask
+
+        node.min_remaining = min_remaining
+        node.max_remaining = max_remaining
+        node.need_mask = 0 if node.terminal or need_mask == -1 else need_mask
+
+
+    def annotate(self):
+        """Fill in the subtree metadata used to prune queries"""
+        # children are always created after their parents, so walking
+        # the nodes backwards visits every subtree before its root
+        for node in reversed(self.nodes):
+            self._annotate_node(node)
+
+
+    def _path_letters(self, idx: int) -> str:
+        letters = []
+        while idx > 0:
+            node = self.nodes[idx]
+            letters.append(node.letter)
+            idx = node.parent
+
+        return "".join(reversed(letters))
+
+
+    def _index_new_node(self, idx: int):
+        # add the node to the anchor keys of the runs ending at it. Keys
+        # only exist when their one letter shorter suffix does, so stop at
+        # the first run that is not a key. Single letters are node_tracker.
+        node = self.nodes[idx]
+        key = node.letter
+        while node.parent > 0:
+            node = self.nodes[node.parent]
+            key = node.letter + key
+            if key not in self.anchors:
+                return
+
+            self._writable_list(self.anchors, key).append(idx)
+
+
+    def add_words(self, words) -> set[int]:
+        """Add words in place, returning the nodes created or made terminal"""
+        changed = set()
+        for word in words:
+            if len(word) == 0:
+                continue
+
+            n_nodes = len(self.nodes)
+            idx = 0
+            for letter in word:
+                child = self.child(idx, letter)
+                if child < 0:
+                    child = self.create_node(letter, idx).index
+
+                idx = child
+
+            for new_idx in range(n_nodes, len(self.nodes)):
+                self._index_new_node(new_idx)
+                changed.add(new_idx)
+
+            node = self._writable(idx)
+            if not node.terminal:
+                node.terminal = True
+                self.n_words += 1
+                changed.add(idx)
+
+                if self.bloom is not None:
+                    self.bloom.add(word)
+
+            self._reannotate(idx)
+
+        return changed
+
+
+    def remove_words(self, words) -> set[int]:
+        """Remove words in place, returning the nodes that stopped being terminal
+
+        Their nodes stay in the trie, the subtree metadata marks branches
+        without words (min_remaining == NO_WORD) so queries skip them,
+        and adding the word back reuses them. A Bloom filter cannot
+        forget a word, it keeps answering "maybe" for it.
+        """
+        changed = set()
+        for word in words:
+            idx = self.walk(word)
+            if idx <= 0 or not self.nodes[idx].terminal:
+                continue
+
+            self._writable(idx).terminal = False
+            self.n_words -= 1
+            changed.add(idx)
+
+            self._reannotate(idx)
+
+        return changed
+
+
+    def _reannotate(self, idx: int):
+        # metadata only depends on the children, so the path up is enough
+        while idx >= 0:
+            node = self._writable(idx)
+            self._annotate_node(node)
+            idx = node.parent
+
+
+    def snapshot(self) -> "Trie":
+        """A copy to update while readers keep using this one
+
+        Nodes and index lists are shared until the copy writes to them,
+        so taking it costs a list of node references. Only update the
+        newest snapshot: the older ones see writes to what they share.
+        """
+        new = Trie.__new__(Trie)
+        new.__dict__.update(self.__dict__)
+
+        new.nodes = list(self.nodes)
+        new.node_tracker = dict(self.node_tracker)
+        new.anchors = dict(self.anchors)
+        new.letter_bits = dict(self.letter_bits)
+
+        if self.bloom is not None:
+            new.bloom = BloomFilter(self.bloom.n_bits, self.bloom.n_hashes, bytearray(self.bloom.bits))
+
+        new.version = self.version + 1
+        new.shared_nodes = len(self.nodes)
+        new.copied_nodes = set()
+        new.copied_keys = set()
+
+        return new
+
+
+    def letters_mask(self, letters) -> int:
+        mask = 0
+        for letter in letters:
+            mask |= self.letter_bits.get(letter, 0)
+
+        return mask
+
 
     def _find_starts(self, query: str) -> list[int]:
         starts = []
@@ -151,7 +514,8 @@ class Trie:
         return starts
 
 
-    def _query_up(self, node: TrieNode, query: str, query_start: int, jumps: list[str]) -> QueryUpResult|None:
+    def _query_up(self, idx: int, query: str, query_start: int, jumps: list[str]) -> QueryUpResult|None:
+        node = self.nodes[idx]
 
         # prune big branches we wont fit
         if node.depth > query_start + 1:
@@ -209,9 +573,46 @@ class Trie:
         return QueryUpResult(prefix=prefix, jumps=our_jumps)
 
 
-    def _query_down(self, node: TrieNode, query: str, query_start: int, jumps: list[str], initial_jumps: list[str]) -> list[PlayWord]:
+    def _line_info(self, query: str) -> tuple[list[int], list[int]]:
+        # empties[i]: free cells in query[:i]
+        # board_masks[i]: letters on the board in query[i:]
+        empties = [0]
+        for letter in query:
+            empties.append(empties[-1] + letter.isspace())
+
+        board_masks = [0] * (len(query) + 1)
+        for i in range(len(query) - 1, -1, -1):
+            board_masks[i] = board_masks[i+1] | self.letter_bits.get(query[i], 0)
+
+        return empties, board_masks
+
+
+    def _query_down(self, idx: int, query: str, query_start: int, jumps: list[str], initial_jumps: list[str], line_info=None) -> list[PlayWord]:
+        node = self.nodes[idx]
         results = []
 
+        if line_info is None:
+            line_info = self._line_info(query)
+
+        empties, board_masks = line_info
+
+        if query_start + node.min_remaining >= len(query):
+            return results
+
+        def can_finish(child: TrieNode, query_index: int, jumps: list[str], jumps_mask: int) -> bool:
+            # the nearest word below must fit in the query
+            last_index = query_index + child.min_remaining
+            if last_index >= len(query):
+                return False
+
+            # and the rack has to cover the free cells up to its end
+            if empties[last_index+1] - empties[query_index+1] > len(jumps):
+                return False
+
+            missing = child.need_mask & ~(jumps_mask | board_masks[query_index+1])
+            return missing == 0 or missing.bit_count() <= jumps.count("*")
+
+
         def dfs_down(node: TrieNode, jumps: list[str], prefix: PlayWord, query_index:int):
             nonlocal results
 
@@ -219,10 +620,11 @@ class Trie:
                 results.append(prefix)
 
             query_index += 1
-            if query_index >= len(query):
+            if query_index >= len(query) or node.max_remaining == 0:
                 return
 
             query_letter = query[query_index]
+            jumps_mask = self.letters_mask(jumps)
 
 
             for edge_letter, next_node_idx in node.edges.items():
@@ -238,9 +640,17 @@ class Trie:
 
                     new_jumps.remove(jmp_letter)
 
+                next_node = self.nodes[next_node_idx]
+
+                new_mask = jumps_mask
+                if jmp_letter not in new_jumps:
+                    new_mask &= ~self.letter_bits.get(jmp_letter, 0)
+
+                if not can_finish(next_node, query_index, new_jumps, new_mask):
+                    continue
+
                 play_letter = PlayLetter(letter=jmp_letter, wildcard_letter=edge_letter)
                 new_prefix  = prefix + [play_letter]
-                next_node = self.nodes[next_node_idx]
                 dfs_down(next_node, new_jumps, new_prefix, query_index)
 
 
@@ -276,16 +686,19 @@ class Trie:
 
         all_results = []
 
+        index = self.anchors if len(self.anchors) > 0 else self.node_tracker
+        line_info = self._line_info(qu)
+
         for start in starts:
             starting_letter = qu[start]
 
-            if starting_letter not in self.node_tracker:
+            if starting_letter not in index:
                 continue
 
-            # speed up to bigger nodes
+            # use the longest indexed run of board letters ending here
             if speed_up:
                 i = start
-                while i >= 0 and qu[i:start+1] in self.node_tracker:
+                while i >= 0 and qu[i:start+1] in index:
                     i -= 1
 
                 query_key = qu[i+1:start+1]
@@ -293,12 +706,10 @@ class Trie:
             else:
                 query_key = starting_letter
 
-            nodes = self.node_tracker[query_key]
+            nodes = index[query_key]
 
             for start_node in nodes:
-                node = self.nodes[start_node]
-
-                result_up = self._query_up(node, qu, start-len(query_key)+1, jumps)
+                result_up = self._query_up(start_node, qu, start, jumps)
 
                 if result_up is None:
                     continue
@@ -306,16 +717,12 @@ class Trie:
                 prefix = result_up.prefix
                 remaining_jumps = result_up.jumps
 
-                node = self.nodes[start_node]
-                for step in query_key[1:]:
-                    node = self.nodes[node.edges[step]]
-
-                results = self._query_down(node, qu, start, remaining_jumps, jumps)
+                results = self._query_down(start_node, qu, start, remaining_jumps, jumps, line_info)
 
 
                 for suffix in results:
-                    word = prefix + [PlayLetter(letter=l) for l in query_key] + suffix
-                    all_results.append(QueryResult(start-len(prefix) - len(query_key) + 1, word))
+                    word = prefix + [PlayLetter(letter=starting_letter)] + suffix
+                    all_results.append(QueryResult(start-len(prefix), word))
 
 
         all_results = list(set(all_results))
@@ -343,38 +750,245 @@ class Trie:
         return all_results
 
 
-    def _parent_letter(self, idx):
-        return self.nodes[self.nodes[idx].parent].letter
+    def plan_line(self, qu: str) -> LinePlan:
+        """Walk up from every candidate node of a line, before any rack is known"""
+        qu = qu.replace(".", " ")
+        index = self.anchors if len(self.anchors) > 0 else self.node_tracker
+
+        ups = dict()
+        for start in self._find_starts(qu):
+            if qu[start] not in index:
+                continue
+
+            i = start
+            while i >= 0 and qu[i:start+1] in index:
+                i -= 1
+
+            for start_node in index[qu[i+1:start+1]]:
+                node = self.nodes[start_node]
+                if node.depth > start + 1:
+                    continue
+
+                # same walk as _query_up, keeping the free cells for later
+                path = []
+                query_index = start
+                while node.parent != 0:
+                    query_index -= 1
+                    parent_node = self.nodes[node.parent]
+                    if query_index < 0 or not fulfills_query(parent_node.letter, qu[query_index]):
+                        break
+
+                    path.append((parent_node.letter, qu[query_index].isspace()))
+                    node = parent_node
+
+                else:
+                    left_nei_pos = query_index - 1
+                    if left_nei_pos < 0 or qu[left_nei_pos].isspace():
+                        free = [letter for letter, is_free in path if is_free]
+                        key = (len(free), self.letters_mask(free))
+                        ups.setdefault(key, []).append(UpPath(start_node, start, path))
+
+        return LinePlan(qu, self._line_info(qu), ups)
+
+
+    def query_plan(self, plan: LinePlan, jumps: str|list[str], memo: dict|None = None) -> list[QueryResult]:
+        """Trie.query over a planned line
+
+        `memo` caches the words below a node per remaining rack, so racks
+        sharing letters reuse each other's down walks on the same line.
+        """
+        if isinstance(jumps, str):
+            jumps = list(jumps)
+
+        if memo is None:
+            memo = dict()
+
+        qu = plan.query
+        all_results = []
 
+        n_jumps = len(jumps)
+        n_blanks = jumps.count("*")
+        jumps_mask = self.letters_mask(jumps)
 
-    def _collapse_entry(self, key):
-        self.collapsed.add(key)
+        for (n_free, need_mask), group in plan.ups.items():
+            # most paths need letters the rack does not have
+            if n_free > n_jumps:
+                continue
 
-        new_d = {}
-        for idx in self.node_tracker[key]:
-            pl = self._parent_letter(idx)
-            nk = pl + key
-            if nk == key:
+            missing = need_mask & ~jumps_mask
+            if missing != 0 and missing.bit_count() > n_blanks:
                 continue
 
-            if nk not in new_d:
-                new_d[nk] = []
+            all_results.extend(self._query_ups(group, qu, jumps, plan.line_info, memo))
+
+        return list(set(all_results))
+
+
+    def _query_ups(self, group: list[UpPath], qu: str, jumps: list[str], line_info, memo: dict) -> list[QueryResult]:
+        results = []
+        for up in group:
+            node = self.nodes[up.node]
+            if up.start + node.min_remaining >= len(qu):
+                continue
+
+            our_jumps = jumps.copy()
+            prefix_builder: PlayWord = [PlayLetter(letter=node.letter)]
+
+            for letter, free in up.path:
+                jmp = letter
+                if free:
+                    jmp = get_jump_letter(letter, our_jumps)
+                    if jmp is None:
+                        break
+
+                    our_jumps.remove(jmp)
+
+                prefix_builder.append(PlayLetter(letter=jmp, wildcard_letter=letter))
+
+            else:
+                prefix = prefix_builder[::-1][:-1]
+                used_up = len(jumps) - len(our_jumps)
+
+                for suffix, used in self._suffixes(up.node, qu, up.start, our_jumps, line_info, memo):
+                    if used_up + used == 0:
+                        continue
+
+                    right_nei_idx = up.start + len(suffix) + 1
+                    if right_nei_idx < len(qu) and not qu[right_nei_idx].isspace():
+                        continue
 
-            new_d[nk].append(self.nodes[idx].parent)
+                    word = prefix + [PlayLetter(letter=qu[up.start])] + list(suffix)
+                    results.append(QueryResult(up.start-len(prefix), word))
 
-        return new_d
+        return results
 
 
-    def collapse_once(self):
-        counts = get_counts(self.node_tracker)
-        keys = set(counts.keys())
+    def _suffixes(self, idx: int, query: str, query_index: int, jumps: list[str], line_info, memo: dict) -> list[tuple[tuple[PlayLetter, ...], int]]:
+        # every way down from node `idx`, with the rack letters each one uses.
+        # The result only depends on the remaining letters, not their order.
+        key = (idx, query_index, tuple(sorted(jumps)))
+        if key in memo:
+            return memo[key]
 
-        collapsible_keys = keys - self.collapsed
+        node = self.nodes[idx]
 
-        max_key = max(collapsible_keys, key=lambda x:counts[x])
-        new_keys = self._collapse_entry(max_key)
+        empties, board_masks = line_info
+        results = []
 
-        self.node_tracker.update(new_keys)
+        if node.terminal:
+            results.append(((), 0))
+
+        next_index = query_index + 1
+        if next_index < len(query) and node.max_remaining > 0:
+            query_letter = query[next_index]
+            free = query_letter.isspace()
+            jumps_mask = self.letters_mask(jumps)
+
+            for edge_letter, next_node_idx in node.edges.items():
+                if not fulfills_query(edge_letter, query_letter):
+                    continue
+
+                new_jumps = jumps
+                jmp_letter = edge_letter
+                new_mask = jumps_mask
+                if free:
+                    jmp_letter = get_jump_letter(edge_letter, jumps)
+                    if jmp_letter is None:
+                        continue
+
+                    new_jumps = jumps.copy()
+                    new_jumps.remove(jmp_letter)
+                    if jmp_letter not in new_jumps:
+                        new_mask &= ~self.letter_bits.get(jmp_letter, 0)
+
+                # same pruning as _query_down
+                child = self.nodes[next_node_idx]
+                last_index = next_index + child.min_remaining
+                if last_index >= len(query):
+                    continue
+
+                if empties[last_index+1] - empties[next_index+1] > len(new_jumps):
+                    continue
+
+                missing = child.need_mask & ~(new_mask | board_masks[next_index+1])
+                if missing != 0 and missing.bit_count() > new_jumps.count("*"):
+                    continue
+
+                play_letter = PlayLetter(letter=jmp_letter, wildcard_letter=edge_letter)
+                for suffix, used in self._suffixes(next_node_idx, query, next_index, new_jumps, line_info, memo):
+                    results.append(((play_letter,) + suffix, used + free))
+
+        memo[key] = results
+        return results
+
+
+    def _split_anchor(self, runs: dict[str, list[tuple[int, int]]], key: str) -> dict[str, list[tuple[int, int]]]:
+        # extend a run by one letter to the left, keeping the end nodes
+        extended = {}
+        for end, run_start in runs[key]:
+            parent = self.nodes[run_start].parent
+            if parent == 0:
+                continue
+
+            new_key = self.nodes[parent].letter + key
+            if new_key not in extended:
+                extended[new_key] = []
+
+            extended[new_key].append((end, parent))
+
+        return extended
+
+
+    def build_anchor_index(self, budget=None):
+        """Index letter runs to the nodes where they end, within `budget` bytes
+
+        A board run is looked up by its longest indexed suffix, and each
+        node of that key is a candidate the query has to walk. Keys are
+        extended greedily by how many candidates the extension removes
+        from the worst case lookup, while the index fits the budget:
+        ANCHOR_BUDGET_FACTOR times the single letter index by default.
+        The worst case stands in for the runs boards actually have, which
+        are not known when the lexicon is built.
+        """
+        runs = {letter: [(idx, idx) for idx in nodes] for letter, nodes in self.node_tracker.items()}
+        used = sum(len(v) for v in runs.values()) * ANCHOR_ENTRY_BYTES + len(runs) * ANCHOR_KEY_BYTES
+        if budget is None:
+            budget = ANCHOR_BUDGET_FACTOR * used
+
+        def candidate(key):
+            extended = self._split_anchor(runs, key)
+            if len(extended) == 0:
+                return None
+
+            benefit = len(runs[key]) - max(len(v) for v in extended.values())
+            cost = sum(len(v) for v in extended.values()) * ANCHOR_ENTRY_BYTES + len(extended) * ANCHOR_KEY_BYTES
+            return (-benefit, key, cost, extended)
+
+        heap = [c for c in map(candidate, runs) if c is not None]
+        heapq.heapify(heap)
+
+        while heap:
+            neg_benefit, key, cost, extended = heapq.heappop(heap)
+
+            if -neg_benefit < ANCHOR_MIN_BENEFIT:
+                break
+
+            if used + cost > budget:
+                continue
+
+            used += cost
+            runs.update(extended)
+
+            for new_key in extended:
+                c = candidate(new_key)
+                if c is not None:
+                    heapq.heappush(heap, c)
+
+        # single letters share their lists with node_tracker
+        self.anchors = {key: [end for end, _ in v] for key, v in runs.items() if len(key) > 1}
+        self.anchors.update(self.node_tracker)
+
+        return used
 
 
     def __str__(self):
@@ -382,70 +996,128 @@ class Trie:
 
 
 
-def create_greek_trie(n_colapses=0):
+WORDLIST_PATH = "wordlist.txt"
+
+
+def create_greek_trie(path=WORDLIST_PATH, anchor_budget=None, bloom=False):
     t = Trie()
 
     t0 = time.time()
-    with open("wordlist.txt", encoding="utf-8") as f:
+    with open(path, encoding="utf-8") as f:
         for line in f:
             line = line.strip()
             t.add(line)
 
     diff = time.time() - t0
-    print(f"Creating trie took {diff:.2f}s")
+    print(f"Creating trie took {diff:.2f}s", file=sys.stderr)
 
-    for _ in range(n_colapses):
-        t.collapse_once()
+    t.annotate()
+
+    t0 = time.time()
+    used = t.build_anchor_index(anchor_budget)
+
+    diff = time.time() - t0
+    print(f"Building anchor index took {diff:.2f}s ({len(t.anchors)} keys, {used // 1024} KiB)", file=sys.stderr)
+
+    if bloom:
+        t.build_bloom()
 
     return t
 
 
+_trie: Trie|None = None
+_trie_lock = threading.Lock()
 
-if __name__ == "__main__":
-    T = create_greek_trie()
 
-    parent_letter = lambda idx: T.nodes[T.nodes[idx].parent].letter
+def get_trie() -> Trie:
+    """Return the shared lexicon, building it on first use"""
+    global _trie
 
-    collapsed = set()
+    if _trie is None:
+        with _trie_lock:
+            if _trie is None:
+                _trie = create_greek_trie()
 
-    def collapse_entry(dct, key):
-        global collapsed
+    return _trie
 
-        collapsed.add(key)
 
-        new_d = {}
-        for idx in dct[key]:
-            pl = parent_letter(idx)
-            nk = pl + key
-            if nk == key:
-                continue
+def set_trie(t: Trie):
+    """Replace the shared lexicon, e.g. with one mapped from shared memory"""
+    global _trie
+
+    with _trie_lock:
+        _trie = t
+
+
+# called as listener(old, new, changed) before an update is published
+_update_listeners = []
 
-            if nk not in new_d:
-                new_d[nk] = []
 
-            new_d[nk].append(T.nodes[idx].parent)
+def add_update_listener(listener):
+    """Keep state derived from the lexicon in step with update_trie"""
+    _update_listeners.append(listener)
 
-        # print(get_counts(new_d))
-        return new_d
 
-    def collapse_once(dct: dict):
-        counts = get_counts(dct)
+def update_trie(add=(), remove=()) -> Trie:
+    """Add and remove words, publishing the result as a new lexicon
 
-        keys = set(counts.keys())
-        collapsible_keys = keys - collapsed
+    Readers holding the previous lexicon (everything that called
+    get_trie before) keep a consistent view of it, the update goes to a
+    snapshot that replaces it once complete.
+    """
+    # build it first, get_trie takes the lock too
+    get_trie()
 
-        max_key = max(collapsible_keys, key=lambda x:counts[x])
+    with _trie_lock:
+        new = _trie.snapshot()
 
+        changed = new.add_words(add)
+        changed |= new.remove_words(remove)
 
-        new_keys = collapse_entry(dct, max_key)
+        _publish(new, changed)
 
-        dct.update(new_keys)
+    return new
 
-        # counts = get_counts(dct)
-        # print(counts)
 
+def _publish(new: Trie, changed: set[int]):
+    global _trie
+
+    for listener in _update_listeners:
+        listener(_trie, new, changed)
+
+    _trie = new
+
+
+def publish_trie(new: Trie, changed: set[int]):
+    """Replace the shared lexicon by an update of it made elsewhere
+
+    `new` has the node numbering of the current lexicon, with `changed`
+    the nodes add_words and remove_words returned, e.g. a compiled copy
+    of a Trie that took the update (see server.Analyzer.update_lexicon).
+    """
+    get_trie()
+
+    with _trie_lock:
+        _publish(new, changed)
+
+
+def preload_trie() -> threading.Thread:
+    """Start building the shared lexicon in the background"""
+    thread = threading.Thread(target=get_trie, daemon=True)
+    thread.start()
+
+    return thread
+
+
+
+if __name__ == "__main__":
+    T = create_greek_trie()
 
-    for i in range(15):
-        collapse_once(T.node_tracker)
+    counts = get_counts(T.anchors)
+    n_entries = sum(counts.values())
+    longest = max(len(key) for key in counts)
 
+    print(f"{len(counts)} anchor keys, {n_entries} entries, longest key {longest}")
 
+    for key in sorted(counts, key=lambda k: counts[k], reverse=True)[:20]:
+        print(f"{key:>8s} {counts[key]:8d}")
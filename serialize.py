@@ -0,0 +1,114 @@
+from main import BOARD_SIZE, LETTER_IDS, Board, Orientation, PositionedLetter, PositionedWord, create_empty_board, get_words_sorted
+from registry import get_registry
+from searcher import PlayLetter, PlayWord, playword_to_str
+
+# Boards travel as BOARD_SIZE strings of BOARD_SIZE characters.
+# An empty cell is " " or ".", a tile is its (uppercase) letter and a
+# wildcard tile is the lowercase form of the letter it stands for.
+
+EMPTY_CHARS = " ."
+
+ORIENTATION_CODES = {
+    Orientation.HORIZONTAL: "H",
+    Orientation.VERTICAL: "V",
+}
+
+CODE_ORIENTATIONS = {code: orient for orient, code in ORIENTATION_CODES.items()}
+
+
+def letter_to_char(pl: PlayLetter) -> str:
+    if pl.letter.isspace():
+        return "."
+
+    if pl.letter == "*":
+        return pl.wildcard_letter.lower()
+
+    return pl.letter
+
+
+def char_to_letter(c: str) -> PlayLetter:
+    if c in EMPTY_CHARS:
+        return PlayLetter(letter=" ")
+
+    if c.islower():
+        return PlayLetter(letter="*", wildcard_letter=c.upper())
+
+    return PlayLetter(letter=c)
+
+
+def playword_to_chars(word: PlayWord) -> str:
+    return "".join(letter_to_char(pl) for pl in word)
+
+
+def playword_from_chars(s: str) -> PlayWord:
+    return [char_to_letter(c) for c in s]
+
+
+def board_to_rows(game_board: Board) -> list[str]:
+    return ["".join(letter_to_char(pl) for pl in row) for row in game_board]
+
+
+def board_from_rows(rows: list[str]) -> Board:
+    if len(rows) != BOARD_SIZE:
+        raise ValueError(f"Expected {BOARD_SIZE} rows, got {len(rows)}")
+
+    game_board = create_empty_board()
+    for y, row in enumerate(rows):
+        if len(row) != BOARD_SIZE:
+            raise ValueError(f"Row {y} has {len(row)} cells, expected {BOARD_SIZE}")
+
+        for x, c in enumerate(row):
+            if c not in EMPTY_CHARS:
+                game_board[y][x] = char_to_letter(c)
+
+    return game_board
+
+
+def move_to_dict(pw: PositionedWord, score: int) -> dict:
+    x, y = pw.start_pos
+    return {
+        "word": playword_to_str(pw.word),
+        "tiles": playword_to_chars(pw.word),
+        "x": x,
+        "y": y,
+        "orientation": ORIENTATION_CODES[pw.orientation],
+        "score": score,
+    }
+
+
+def move_from_dict(d: dict) -> PositionedWord:
+    return PositionedWord(
+        word=playword_from_chars(d["tiles"]),
+        start_pos=(d["x"], d["y"]),
+        orientation=CODE_ORIENTATIONS[d["orientation"]],
+    )
+
+
+def tiles_to_lists(letters: list[PositionedLetter]) -> list[list]:
+    # board diffs travel as [x, y, tile] triples, tile as in board rows
+    return [[pl.pos[0], pl.pos[1], letter_to_char(pl.play_letter)] for pl in letters]
+
+
+def tiles_from_lists(items: list[list]) -> list[PositionedLetter]:
+    letters = []
+    for x, y, c in items:
+        pl = char_to_letter(c) if len(c) == 1 else None
+        if pl is None or pl.real_letter not in LETTER_IDS:
+            raise ValueError(f"Bad tile {c!r} at {(x, y)}")
+
+        letters.append(PositionedLetter(pl, (int(x), int(y))))
+
+    return letters
+
+
+def analyze(rows: list[str], rack: str, top: int, lexicon: str|None = None) -> list[dict]:
+    """Best moves for a board given as rows and a rack, in a lexicon of registry.py by name"""
+    game_board = board_from_rows(rows)
+
+    if lexicon is None:
+        results = get_words_sorted(game_board, rack, print_out=False, top_n=top)
+    else:
+        lex = get_registry().get(lexicon)
+        results = get_words_sorted(game_board, rack, print_out=False, top_n=top, trie=lex.trie, values=lex.values)
+
+    return [move_to_dict(pw, score) for pw, score in results]
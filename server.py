@@ -0,0 +1,647 @@
+import argparse
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import CancelledError, Future, ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from cache import DEFAULT_MAX_BYTES, open_cache
+from compact import attach_trie, load_compact, share_current_trie, share_trie
+from registry import get_registry
+from searcher import Trie, get_trie, publish_trie
+from serialize import analyze, board_from_rows, board_to_rows, move_from_dict, move_to_dict, tiles_from_lists, tiles_to_lists
+from session import GameSession
+
+
+DEFAULT_TOP = 10
+LATENCY_WINDOW = 10000
+
+# superseded lexicon files kept for tasks submitted before an update
+LEXICON_HISTORY = 4
+
+# open game sessions, the least recently used is closed past this
+MAX_SESSIONS = 256
+
+_worker_version = 0
+
+
+def _init_worker(lexicon_path: str, cache_path: str|None, cache_bytes: int):
+    # every worker maps the same read-only lexicon pages
+    attach_trie(lexicon_path)
+    open_cache(cache_path, max_bytes=cache_bytes)
+
+
+def _analyze(lexicon_path: str, version: int, lexicon: str|None, rows: list[str], rack: str, top: int) -> list[dict]:
+    # move to the lexicon the task was submitted against
+    global _worker_version
+
+    if version != _worker_version:
+        attach_trie(lexicon_path)
+        _worker_version = version
+
+    # named lexicons load in each worker on first use
+    return analyze(rows, rack, top, lexicon)
+
+
+class ServerBusy(Exception):
+    pass
+
+
+class StalePosition(Exception):
+    pass
+
+
+@dataclass
+class LexiconVersion:
+    version: int
+    path: str
+    added: list[str]
+    removed: list[str]
+    words: int
+    time: float
+
+    def to_dict(self) -> dict:
+        return {
+            "version": self.version,
+            "added": len(self.added),
+            "removed": len(self.removed),
+            "words": self.words,
+            "time": self.time,
+        }
+
+
+@dataclass
+class ServerStats:
+    requests: int = 0
+    coalesced: int = 0
+    rejected: int = 0
+    timeouts: int = 0
+    errors: int = 0
+    latencies: deque = field(default_factory=lambda: deque(maxlen=LATENCY_WINDOW))
+
+    # handler threads update the counters concurrently
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def count(self, name: str):
+        with self.lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def add_latency(self, ms: float):
+        with self.lock:
+            self.latencies.append(ms)
+
+    def percentile(self, p: float) -> float|None:
+        with self.lock:
+            ordered = sorted(self.latencies)
+
+        if len(ordered) == 0:
+            return None
+
+        idx = min(len(ordered) - 1, int(p / 100 * len(ordered)))
+        return ordered[idx]
+
+    def to_dict(self) -> dict:
+        return {
+            "requests": self.requests,
+            "coalesced": self.coalesced,
+            "rejected": self.rejected,
+            "timeouts": self.timeouts,
+            "errors": self.errors,
+            "p50_ms": self.percentile(50),
+            "p99_ms": self.percentile(99),
+        }
+
+
+@dataclass
+class PendingAnalysis:
+    """An analysis in flight and the requests waiting on it"""
+    result: Future
+    task: Future|None = None
+    waiters: int = 1
+
+
+class Analyzer:
+    """Runs analyses on a process pool, merging identical in-flight requests"""
+
+    def __init__(self, lexicon_path: str, workers: int, max_concurrent: int, timeout: float,
+                 cache_path: str|None = None, cache_bytes: int = DEFAULT_MAX_BYTES):
+        initargs = (lexicon_path, cache_path, cache_bytes)
+        self.pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=initargs)
+        self.slots = threading.BoundedSemaphore(max_concurrent)
+        self.timeout = timeout
+
+        self.lock = threading.Lock()
+        self.in_flight: dict[tuple, PendingAnalysis] = dict()
+        self.stats = ServerStats()
+
+        # the version log, indexed by version. Workers catch up to the
+        # newest entry on their next task. Updates hold update_lock.
+        self.update_lock = threading.Lock()
+        self.lexicons = [LexiconVersion(0, lexicon_path, [], [], len(get_trie()), time.time())]
+        self.owned_paths: list[str] = []
+
+        # the mutable trie updates are applied to, copied from the shared
+        # lexicon once on the first update, which every update compiles
+        self.master: Trie|None = None
+
+        # files tasks were submitted against and are still running on,
+        # and the superseded ones among them, unlinked once they finish
+        self.pins: dict[str, int] = dict()
+        self.retired: set[str] = set()
+        self.unlinked: set[str] = set()
+
+
+    def _drop(self, key: tuple, pending: PendingAnalysis):
+        # only the entry itself, a newer request may have replaced it
+        with self.lock:
+            if self.in_flight.get(key) is pending:
+                del self.in_flight[key]
+
+
+    def _run(self, key: tuple, pending: PendingAnalysis, deadline: float):
+        if not self.slots.acquire(timeout=max(0.0, deadline - time.monotonic())):
+            self.stats.count("rejected")
+            self._drop(key, pending)
+            pending.result.set_exception(ServerBusy())
+            return
+
+        version, lexicon, rows, rack, top = key
+        with self.lock:
+            # a request older than the history falls back to the newest version
+            if self.lexicons[version].path in self.unlinked:
+                version = self.lexicons[-1].version
+
+            lexicon_path = self.lexicons[version].path
+            self.pins[lexicon_path] = self.pins.get(lexicon_path, 0) + 1
+
+        task = self.pool.submit(_analyze, lexicon_path, version, lexicon, list(rows), rack, top)
+
+        def done(task: Future):
+            self.slots.release()
+            self._drop(key, pending)
+            self._unpin(lexicon_path)
+
+            if task.cancelled():
+                pending.result.cancel()
+            elif task.exception() is not None:
+                pending.result.set_exception(task.exception())
+            else:
+                pending.result.set_result(task.result())
+
+        with self.lock:
+            pending.task = task
+
+        task.add_done_callback(done)
+
+
+    def _unpin(self, path: str):
+        with self.lock:
+            self.pins[path] -= 1
+            if self.pins[path] > 0:
+                return
+
+            del self.pins[path]
+            if path not in self.retired:
+                return
+
+            self.retired.discard(path)
+
+        os.unlink(path)
+
+
+    def _give_up(self, key: tuple, pending: PendingAnalysis):
+        # the last request waiting on an analysis cancels it if it has
+        # not started yet, a running one finishes and frees its slot
+        self.stats.count("timeouts")
+
+        with self.lock:
+            pending.waiters -= 1
+            if pending.waiters > 0:
+                return
+
+            if self.in_flight.get(key) is pending:
+                del self.in_flight[key]
+
+            task = pending.task
+
+        if task is not None:
+            task.cancel()
+
+
+    def best_moves(self, rows: list[str], rack: str, top: int, lexicon: str|None = None, version: int|None = None) -> list[dict]:
+        """Moves of a position, raising ServerBusy or TimeoutError past self.timeout
+
+        The timeout covers waiting for a slot and for the analysis both.
+        `version` is the lexicon version to analyze with, the newest by
+        default; one past the history runs on the newest.
+        """
+        if lexicon is not None and lexicon not in get_registry().names():
+            raise KeyError(f"Unknown lexicon: {lexicon!r}")
+
+        deadline = time.monotonic() + self.timeout
+
+        if version is None:
+            version = self.lexicons[-1].version
+
+        # the result does not depend on the order of the rack, but does
+        # on the lexicon, requests never merge across an update
+        key = (version, lexicon, tuple(rows), "".join(sorted(rack)), top)
+
+        self.stats.count("requests")
+        with self.lock:
+            pending = self.in_flight.get(key)
+            owner = pending is None
+
+            if owner:
+                # concurrent duplicates wait on this future instead
+                # of running the same analysis again
+                pending = self.in_flight[key] = PendingAnalysis(Future())
+            else:
+                pending.waiters += 1
+
+        if not owner:
+            self.stats.count("coalesced")
+        else:
+            self._run(key, pending, deadline)
+
+        try:
+            return pending.result.result(timeout=max(0.0, deadline - time.monotonic()))
+        except (FutureTimeoutError, CancelledError):
+            self._give_up(key, pending)
+            raise FutureTimeoutError() from None
+
+
+    def update_lexicon(self, add: list[str], remove: list[str]) -> LexiconVersion:
+        """Apply a word list change and publish it to the workers"""
+        with self.update_lock:
+            # the shared lexicon is read-only, it is copied into a mutable
+            # trie once. The copy's node numbering is the one of the compiled
+            # files, so a new file can replace the shared lexicon directly
+            if self.master is None:
+                self.master = get_trie().snapshot()
+            else:
+                self.master = self.master.snapshot()
+            changed = self.master.add_words(add)
+            changed |= self.master.remove_words(remove)
+
+            path = share_trie(self.master)
+            publish_trie(load_compact(path), changed)
+
+            entry = LexiconVersion(self.lexicons[-1].version + 1, path, list(add), list(remove), len(self.master), time.time())
+
+            # tasks submitted before an update still read older files,
+            # the ones past the history go once their last task is done
+            unlink = []
+            with self.lock:
+                self.lexicons.append(entry)
+                self.owned_paths.append(path)
+
+                while len(self.owned_paths) > LEXICON_HISTORY:
+                    old = self.owned_paths.pop(0)
+                    self.unlinked.add(old)
+                    if old in self.pins:
+                        self.retired.add(old)
+                    else:
+                        unlink.append(old)
+
+            for old in unlink:
+                os.unlink(old)
+
+            return entry
+
+
+    def shutdown(self):
+        self.pool.shutdown(cancel_futures=True)
+
+        for path in self.owned_paths + list(self.retired):
+            os.unlink(path)
+
+
+
+@dataclass
+class OpenSession:
+    session: GameSession
+    lexicon: str|None       # registry name, None for the lexicon of the server
+    version: int            # Analyzer lexicon version the session was opened on
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+
+class SessionStore:
+    """Game sessions kept by the server between requests
+
+    A session holds its board, its history and the lexicon it was opened
+    with, one request at a time each. Plays, edits and undo run in the
+    server process; move lists are analyzed on the Analyzer's pool, like
+    /moves, against the lexicon version of the session.
+    """
+
+    def __init__(self, max_sessions: int = MAX_SESSIONS):
+        self.max_sessions = max_sessions
+        self.lock = threading.Lock()
+        self.sessions: OrderedDict[str, OpenSession] = OrderedDict()
+
+
+    def create(self, version: int, rows: list[str]|None = None, lexicon: str|None = None) -> str:
+        game_board = None if rows is None else board_from_rows(rows)
+        session = GameSession(game_board=game_board, lexicon=lexicon, track_tiles=False)
+
+        session_id = uuid.uuid4().hex
+        with self.lock:
+            self.sessions[session_id] = OpenSession(session, lexicon, version)
+            while len(self.sessions) > self.max_sessions:
+                self.sessions.popitem(last=False)
+
+        return session_id
+
+
+    def get(self, session_id: str) -> OpenSession:
+        with self.lock:
+            entry = self.sessions[session_id]
+            self.sessions.move_to_end(session_id)
+
+        return entry
+
+
+    def close(self, session_id: str):
+        with self.lock:
+            del self.sessions[session_id]
+
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+    analyzer: Analyzer
+    sessions: SessionStore
+
+    def _reply(self, status: int, body: dict):
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+    def _read_json(self) -> dict:
+        length = int(self.headers.get("Content-Length", 0))
+        if length == 0:
+            return dict()
+
+        return json.loads(self.rfile.read(length).decode("utf-8"))
+
+
+    def do_GET(self):
+        match self.path:
+            case "/health":
+                self._reply(200, {"status": "ok"})
+            case "/stats":
+                self._reply(200, self.analyzer.stats.to_dict())
+            case "/lexicon":
+                self._reply(200, {
+                    "versions": [entry.to_dict() for entry in self.analyzer.lexicons],
+                    "available": get_registry().names(),
+                })
+            case _:
+                self._reply(404, {"error": "not found"})
+
+
+    def do_POST(self):
+        if self.path == "/lexicon":
+            self._update_lexicon()
+            return
+
+        if self.path == "/sessions" or self.path.startswith("/sessions/"):
+            self._session_request()
+            return
+
+        if self.path != "/moves":
+            self._reply(404, {"error": "not found"})
+            return
+
+        t0 = time.time()
+        stats = self.analyzer.stats
+
+        try:
+            request = self._read_json()
+            rows = request["board"]
+            rack = request["rack"].upper()
+            top = int(request.get("top", DEFAULT_TOP))
+            lexicon = request.get("lexicon")
+
+            moves = self.analyzer.best_moves(rows, rack, top, lexicon)
+
+        except (KeyError, ValueError, TypeError) as e:
+            stats.count("errors")
+            self._reply(400, {"error": str(e)})
+            return
+
+        except ServerBusy:
+            self._reply(503, {"error": "too many concurrent requests"})
+            return
+
+        except FutureTimeoutError:
+            self._reply(504, {"error": "analysis timed out"})
+            return
+
+        except Exception as e:
+            stats.count("errors")
+            self._reply(500, {"error": f"{type(e).__name__}: {e}"})
+            return
+
+        elapsed = (time.time() - t0) * 1000
+        stats.add_latency(elapsed)
+
+        self._reply(200, {"moves": moves, "elapsed_ms": elapsed})
+
+
+    def _update_lexicon(self):
+        try:
+            request = self._read_json()
+            add = [word.upper() for word in request.get("add", [])]
+            remove = [word.upper() for word in request.get("remove", [])]
+
+        except (ValueError, TypeError, AttributeError) as e:
+            self._reply(400, {"error": str(e)})
+            return
+
+        entry = self.analyzer.update_lexicon(add, remove)
+        self._reply(200, entry.to_dict())
+
+
+    def do_DELETE(self):
+        parts = self.path.strip("/").split("/")
+        if len(parts) != 2 or parts[0] != "sessions":
+            self._reply(404, {"error": "not found"})
+            return
+
+        try:
+            self.sessions.close(parts[1])
+        except KeyError:
+            self._reply(404, {"error": "unknown session"})
+            return
+
+        self._reply(200, {})
+
+
+    def _session_request(self):
+        # POST /sessions, or /sessions/<id>/<action>
+        parts = self.path.strip("/").split("/")
+        stats = self.analyzer.stats
+
+        try:
+            request = self._read_json()
+
+            if len(parts) == 1:
+                # no update between the lexicon the session takes and its version
+                with self.analyzer.update_lock:
+                    version = self.analyzer.lexicons[-1].version
+                    session_id = self.sessions.create(version, request.get("board"), request.get("lexicon"))
+
+                self._reply(200, {"session": session_id, "position": 0})
+                return
+
+            if len(parts) != 3:
+                self._reply(404, {"error": "not found"})
+                return
+
+            _, session_id, action = parts
+            try:
+                open_session = self.sessions.get(session_id)
+            except KeyError:
+                self._reply(404, {"error": "unknown session"})
+                return
+
+            t0 = time.time()
+            with open_session.lock:
+                body = self._session_action(open_session, action, request)
+
+        except StalePosition:
+            self._reply(409, {"error": "the session has moved on", "position": open_session.session.position})
+            return
+
+        except (KeyError, ValueError, TypeError) as e:
+            stats.count("errors")
+            self._reply(400, {"error": str(e)})
+            return
+
+        except ServerBusy:
+            self._reply(503, {"error": "too many concurrent requests"})
+            return
+
+        except FutureTimeoutError:
+            self._reply(504, {"error": "analysis timed out"})
+            return
+
+        except Exception as e:
+            stats.count("errors")
+            self._reply(500, {"error": f"{type(e).__name__}: {e}"})
+            return
+
+        if body is None:
+            self._reply(404, {"error": "not found"})
+            return
+
+        elapsed = (time.time() - t0) * 1000
+        stats.add_latency(elapsed)
+
+        self._reply(200, {**body, "elapsed_ms": elapsed})
+
+
+    def _best_moves(self, open_session: OpenSession, request: dict) -> list[dict]:
+        # on the pool, with the deadline and the merging of /moves
+        top = int(request.get("top", DEFAULT_TOP))
+        rows = board_to_rows(open_session.session.board)
+        return self.analyzer.best_moves(rows, request["rack"].upper(), top, open_session.lexicon, open_session.version)
+
+
+    def _session_action(self, open_session: OpenSession, action: str, request: dict) -> dict|None:
+        session = open_session.session
+
+        # a request made against an older position would apply to a
+        # board the client has not seen
+        if "position" in request and int(request["position"]) != session.position:
+            raise StalePosition()
+
+        match action:
+            case "moves":
+                return {"moves": self._best_moves(open_session, request), "position": session.position}
+
+            case "play":
+                score = session.apply_move(move_from_dict(request["move"]))
+                return {"score": score, "position": session.position}
+
+            case "diff":
+                # placed: [[x, y, tile], ...], removed: [[x, y], ...]
+                placed = tiles_from_lists(request.get("placed", []))
+                removed = [(int(x), int(y)) for x, y in request.get("removed", [])]
+                session.set_tiles(placed, removed)
+
+                body = {"position": session.position}
+                if "rack" in request:
+                    body["moves"] = self._best_moves(open_session, request)
+
+                return body
+
+            case "undo":
+                turn = session.undo()
+
+                undone = None
+                if turn is not None and turn.move is not None:
+                    undone = move_to_dict(turn.move, turn.score)
+                elif turn is not None:
+                    undone = {"placed": tiles_to_lists(turn.letters), "removed": tiles_to_lists(turn.removed)}
+
+                return {"undone": undone, "position": session.position}
+
+        return None
+
+
+    def log_message(self, format, *args):
+        # one line per request is too much under load
+        pass
+
+
+
+def serve(host: str, port: int, workers: int, max_concurrent: int, timeout: float, lexicon_path: str|None = None,
+          cache_path: str|None = None, cache_bytes: int = DEFAULT_MAX_BYTES):
+    owns_lexicon = lexicon_path is None
+    if owns_lexicon:
+        lexicon_path = share_current_trie()
+
+    analyzer = Analyzer(lexicon_path, workers, max_concurrent, timeout, cache_path, cache_bytes)
+    RequestHandler.analyzer = analyzer
+    RequestHandler.sessions = SessionStore()
+
+    httpd = ThreadingHTTPServer((host, port), RequestHandler)
+    print(f"Serving on http://{host}:{port} with {workers} workers")
+
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
+        analyzer.shutdown()
+
+        if owns_lexicon:
+            os.unlink(lexicon_path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local scrabble analysis server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--max-concurrent", type=int, default=16, help="analyses queued or running at once")
+    parser.add_argument("--timeout", type=float, default=10.0, help="seconds before a request gives up")
+    parser.add_argument("--lexicon", default=None, help="compiled lexicon to map (see compact.py), built from wordlist.txt if missing")
+    parser.add_argument("--cache", default=None, help="SQLite file keeping analyses across restarts (see cache.py)")
+    parser.add_argument("--cache-max-mb", type=int, default=DEFAULT_MAX_BYTES // (1024 * 1024))
+    args = parser.parse_args()
+
+    serve(args.host, args.port, args.workers, args.max_concurrent, args.timeout, args.lexicon,
+          args.cache, args.cache_max_mb * 1024 * 1024)
@@ -0,0 +1,305 @@
+from dataclasses import dataclass, field
+
+from main import (
+    BOARD_SIZE, Board, Orientation, PositionedLetter, PositionedWord, ScoringEngine,
+    create_empty_board, parallel_moves, plan_moves, score_found,
+)
+from exchange import Decision, LeaveEvaluator, LeaveTable
+from letters import LETTER_IDS
+from records import NO_PLAYER
+from registry import get_registry
+from tiles import TileTracker
+
+# line memos grow with every rack tried on an unchanged line
+LINE_MEMO_LIMIT = 50000
+
+
+@dataclass
+class Turn:
+    player: int
+    move: PositionedWord|None   # None for a board edit, an exchange or a pass
+    letters: list[PositionedLetter]
+    score: int
+    tiles: TileTracker|None     # the tiles before the move, for undo
+    removed: list[PositionedLetter] = field(default_factory=list)
+    returned: str = ""          # the tiles put back by an exchange
+
+
+class GameSession:
+    """One game: the board, the tiles and what the generator derived from them
+
+    The scoring engine's cross words and cross checks, the plan of every
+    board line and the per-line query memos carry over from turn to turn.
+    A move only drops what it touched: the cross words around its tiles
+    and the plans of its rows and columns. Board changes have to go
+    through apply_move, set_tiles and undo to keep all of it in sync.
+    """
+
+    def __init__(self, n_players: int = 2, seed: int|None = None, game_board: Board|None = None,
+                 lexicon: str|None = None, track_tiles: bool = True):
+        lex = None if lexicon is None else get_registry().get(lexicon)
+
+        self.board = create_empty_board() if game_board is None else [row[:] for row in game_board]
+        self.engine = ScoringEngine(self.board, None if lex is None else lex.trie, None if lex is None else lex.values)
+        self.trie = self.engine.trie
+
+        # without tracking, racks come from the caller and are not checked
+        self.tiles = None
+        if track_tiles:
+            self.tiles = TileTracker(n_players, seed, None if lex is None else lex.full_counts())
+
+        self.scores = [0] * n_players
+        self.player = 0
+        self.history: list[Turn] = []
+
+        # bumped by every change of the board, clients send board diffs
+        # against the position they last saw
+        self.position = 0
+
+        # (orientation, line) -> (plan, memo), planned on first use
+        self.lines: dict[tuple[Orientation, int], tuple] = dict()
+
+        # sorted rack -> every scored move, until the board changes
+        self.results: dict[str, list[tuple[PositionedWord, int]]] = dict()
+
+
+    def _line(self, orientation: Orientation, i: int) -> tuple:
+        entry = self.lines.get((orientation, i))
+        if entry is None:
+            plan = self.trie.plan_line(self.engine.view.query(orientation, i))
+            entry = self.lines[(orientation, i)] = (plan, dict())
+
+        elif len(entry[1]) > LINE_MEMO_LIMIT:
+            entry[1].clear()
+
+        return entry
+
+
+    def _changed(self, positions: list[tuple[int, int]]):
+        for x, y in positions:
+            self.lines.pop((Orientation.HORIZONTAL, y), None)
+            self.lines.pop((Orientation.VERTICAL, x), None)
+
+        self.results.clear()
+
+
+    def rack(self, player: int|None = None) -> str:
+        return self.tiles.rack(self.player if player is None else player)
+
+
+    def best_moves(self, rack: str, top: int|None = None) -> list[tuple[PositionedWord, int]]:
+        """(move, score) of every move of a rack, best first"""
+        key = "".join(sorted(rack))
+        results = self.results.get(key)
+
+        if results is None:
+            found = []
+            for orient in (Orientation.HORIZONTAL, Orientation.VERTICAL):
+                for i in range(BOARD_SIZE):
+                    plan, memo = self._line(orient, i)
+                    found.extend(plan_moves(self.trie, plan, orient, i, key, memo))
+
+            found.extend(parallel_moves(self.board, key, self.engine))
+
+            results = score_found(self.board, found, self.engine)
+            results.sort(key=lambda x: x[1], reverse=True)
+            self.results[key] = results
+
+        return results if top is None else results[:top]
+
+
+    def score(self, pw: PositionedWord) -> int|None:
+        result = self.engine.score(self.engine.move_letters(pw))
+        return None if result is None else result.points
+
+
+    def apply_move(self, pw: PositionedWord, player: int|None = None) -> int:
+        """Play a move for a player (the one to move by default), returning its score
+
+        NO_PLAYER places the tiles straight from the bag, without
+        scoring or passing the turn. Raises ValueError for a move that
+        is not valid on the board or not in the player's rack.
+        """
+        if player is None:
+            player = self.player
+
+        letters = self.engine.move_letters(pw)
+        result = self.engine.score(letters)
+        if result is None:
+            raise ValueError("Not a valid move on this board")
+
+        tiles_before = None
+        if self.tiles is not None:
+            tiles_before = self.tiles.copy()
+            if player == NO_PLAYER:
+                self.tiles.place(pl.play_letter.letter for pl in letters)
+            else:
+                self.tiles.play(player, (pl.play_letter.letter for pl in letters))
+
+        self.engine.place(letters)
+        self._changed([pl.pos for pl in letters])
+
+        score = 0
+        if player != NO_PLAYER:
+            score = result.points
+            self.scores[player] += score
+
+            if player == self.player:
+                self.player = (self.player + 1) % len(self.scores)
+
+        self.history.append(Turn(player, pw, letters, score, tiles_before))
+        self.position += 1
+
+        return score
+
+
+    def exchange(self, letters: str, player: int|None = None) -> list[str]:
+        """Put tiles of a player's rack back in the bag, returning those drawn instead
+
+        Raises ValueError if the tiles are not in the rack or the bag
+        holds fewer tiles than are put back.
+        """
+        if self.tiles is None:
+            raise ValueError("The session does not track tiles, there is no bag to exchange with")
+
+        if player is None:
+            player = self.player
+
+        tiles_before = self.tiles.copy()
+        drawn = self.tiles.exchange(player, letters)
+
+        self.history.append(Turn(player, None, [], 0, tiles_before, returned=letters))
+        if player == self.player:
+            self.player = (self.player + 1) % len(self.scores)
+
+        return drawn
+
+
+    def pass_turn(self, player: int|None = None):
+        if player is None:
+            player = self.player
+
+        tiles_before = None if self.tiles is None else self.tiles.copy()
+        self.history.append(Turn(player, None, [], 0, tiles_before))
+        if player == self.player:
+            self.player = (self.player + 1) % len(self.scores)
+
+
+    def choose_turn(self, rack: str|None = None, player: int|None = None, table: LeaveTable|None = None) -> Decision:
+        """Play, exchange or pass for a player, whichever exchange.LeaveEvaluator values most
+
+        The draws are taken from what the player cannot see, so the
+        session has to track tiles, else this raises ValueError.
+        """
+        if self.tiles is None:
+            raise ValueError("The session does not track tiles, the unseen tiles are not known")
+
+        if player is None:
+            player = self.player
+
+        if rack is None:
+            rack = self.rack(player)
+
+        try:
+            from rackfit import get_rack_fit
+            rack_fit = get_rack_fit(self.trie)
+        except ImportError:
+            # numpy is optional, leaves are then valued letter by letter
+            rack_fit = None
+
+        evaluator = LeaveEvaluator(self.tiles.unseen[player].counts, len(self.tiles.bag), table, rack_fit=rack_fit)
+        return evaluator.choose(rack, self.best_moves(rack), self.engine)
+
+
+    def set_tiles(self, placed: list[PositionedLetter] = (), removed: list[tuple[int, int]] = ()) -> int:
+        """Edit the board by a diff, returning the new position
+
+        `removed` are taken off first, so a square can be in both. The
+        edit is not a move: nothing is scored and the turn stays, but
+        undo takes it back like one. Raises ValueError for a square off
+        the board, removing from an empty square, placing on a full one
+        or a blank that stands for no letter.
+        """
+        if self.tiles is not None:
+            raise ValueError("The session tracks tiles, play moves instead")
+
+        placed = list(placed)
+        removed = list(removed)
+
+        def check_square(x: int, y: int):
+            if not (0 <= x < BOARD_SIZE and 0 <= y < BOARD_SIZE):
+                raise ValueError(f"Square {(x, y)} is off the board")
+
+        for x, y in removed:
+            check_square(x, y)
+            if self.board[y][x].letter == " ":
+                raise ValueError(f"No tile to remove at {(x, y)}")
+
+        freed = set(removed)
+        if len(freed) != len(removed):
+            raise ValueError("A square is removed twice")
+
+        targets = set()
+        for pl in placed:
+            x, y = pl.pos
+            check_square(x, y)
+            if pl.pos in targets or (self.board[y][x].letter != " " and pl.pos not in freed):
+                raise ValueError(f"Square {(x, y)} is taken")
+            if pl.play_letter.letter == "*" and pl.play_letter.wildcard_letter not in LETTER_IDS:
+                raise ValueError(f"The blank at {(x, y)} stands for no letter")
+
+            targets.add(pl.pos)
+
+        taken = [PositionedLetter(self.board[y][x], (x, y)) for x, y in removed]
+
+        self.engine.remove(removed)
+        self.engine.place(placed)
+        self._changed(removed + [pl.pos for pl in placed])
+
+        self.history.append(Turn(NO_PLAYER, None, placed, 0, None, taken))
+        self.position += 1
+
+        return self.position
+
+
+    def undo(self) -> Turn|None:
+        """Take back the last move, None if there is none"""
+        if len(self.history) == 0:
+            return None
+
+        turn = self.history.pop()
+
+        positions = [pl.pos for pl in turn.letters]
+        self.engine.remove(positions)
+        self.engine.place(turn.removed)
+        self._changed(positions + [pl.pos for pl in turn.removed])
+        self.position += 1
+
+        if turn.tiles is not None:
+            # snapshots share the history, keep its trackers as they were
+            self.tiles = turn.tiles.copy()
+
+        if turn.player != NO_PLAYER:
+            self.scores[turn.player] -= turn.score
+            self.player = turn.player
+
+        return turn
+
+
+    def snapshot(self) -> "GameSession":
+        """An independent copy to try moves on, sharing nothing that changes"""
+        session = GameSession.__new__(GameSession)
+        session.board = [row[:] for row in self.board]
+        session.engine = self.engine.copy(session.board)
+        session.trie = self.trie
+        session.tiles = None if self.tiles is None else self.tiles.copy()
+        session.scores = self.scores.copy()
+        session.player = self.player
+        session.history = self.history.copy()
+        session.position = self.position
+
+        # plans are never changed in place, only replaced
+        session.lines = {key: (plan, dict()) for key, (plan, _) in self.lines.items()}
+        session.results = dict(self.results)
+
+        return session
@@ -0,0 +1,30 @@
+import os
+import random
+import sys
+
+import pytest
+
+# the modules live at the top of the repository
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from searcher import create_greek_trie
+
+LETTERS = "ΑΕΙΟΣΤΝΚΡΛ"
+
+
+@pytest.fixture(scope="session")
+def words() -> list[str]:
+    # a small dense lexicon, so many words meet on one board
+    rng = random.Random(5)
+    found = set()
+    while len(found) < 300:
+        found.add("".join(rng.choice(LETTERS) for _ in range(rng.randint(2, 6))))
+
+    return sorted(found)
+
+
+@pytest.fixture(scope="session")
+def trie(words, tmp_path_factory):
+    path = tmp_path_factory.mktemp("lexicon") / "words.txt"
+    path.write_text("\n".join(words) + "\n", encoding="utf-8")
+    return create_greek_trie(str(path))
@@ -0,0 +1,38 @@
+import io
+import json
+import os
+
+import pytest
+
+from batch import run_batch
+from compact import share_trie
+from main import create_empty_board
+from searcher import set_trie
+from serialize import analyze, board_to_rows
+from test_moves import make_board
+
+
+@pytest.fixture
+def lexicon_path(trie):
+    path = share_trie(trie)
+    yield path
+    os.unlink(path)
+
+
+def test_batch_keeps_input_order(trie, words, lexicon_path, tmp_path):
+    boards = [board_to_rows(make_board(trie, words)), board_to_rows(create_empty_board())]
+    positions = [{"id": i, "board": boards[i % 2], "rack": rack} for i, rack in enumerate(["ΑΕΣΤΝΚΡ", "αιοσλ*", "ΕΕΡΤ**", "ΣΤΑ", "ΚΡΑΤ"])]
+    lines = [json.dumps(p, ensure_ascii=False) for p in positions]
+    lines.insert(2, json.dumps({"id": "bad", "board": boards[0]}))
+
+    set_trie(trie)
+    expected = [{"id": p["id"], "moves": analyze(p["board"], p["rack"].upper(), 3)} for p in positions]
+    expected.insert(2, {"id": "bad", "error": "'rack'"})
+
+    text = "\n".join(lines) + "\n\n"
+    for cache_path in (None, str(tmp_path / "analyses.db"), str(tmp_path / "analyses.db")):
+        out = io.StringIO()
+        n = run_batch(io.StringIO(text), out, workers=2, top=3, chunk_size=2, lexicon_path=lexicon_path, cache_path=cache_path)
+
+        assert n == len(expected)
+        assert [json.loads(line) for line in out.getvalue().splitlines()] == expected
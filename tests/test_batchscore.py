@@ -0,0 +1,34 @@
+import pytest
+
+pytest.importorskip("numpy")
+
+import main
+from batchscore import score_moves
+from main import ScoringEngine, create_empty_board, find_words, parallel_moves, score_found
+from test_moves import make_board
+
+
+@pytest.mark.parametrize("rack", ["ΑΕΣΤΝΚΡ", "ΑΙΟΣΛ*", "ΕΕΡΤ**"])
+def test_batch_scores_match_engine(trie, words, rack):
+    game_board = make_board(trie, words)
+    engine = ScoringEngine(game_board, trie)
+    found = find_words(game_board, rack, trie=trie) + parallel_moves(game_board, rack, engine)
+    assert len(found) > 0
+
+    scores, valid = score_moves(game_board, found, engine)
+    for pw, score, ok in zip(found, scores.tolist(), valid.tolist()):
+        result = engine.score(engine.move_letters(pw))
+        assert ok == (result is not None)
+        if ok:
+            assert score == result.points
+
+
+def test_score_found_paths_agree(trie, words, monkeypatch):
+    for game_board in (make_board(trie, words), create_empty_board()):
+        engine = ScoringEngine(game_board, trie)
+        found = find_words(game_board, "ΑΕΣΤΝ*", trie=trie) + parallel_moves(game_board, "ΑΕΣΤΝ*", engine)
+
+        monkeypatch.setattr(main, "BATCH_SCORE_MIN", 0)
+        batch = score_found(game_board, found, engine)
+        monkeypatch.setattr(main, "BATCH_SCORE_MIN", len(found) + 1)
+        assert score_found(game_board, found, engine) == batch
@@ -0,0 +1,63 @@
+import pytest
+
+from cache import canonical_rows, open_cache
+from main import (
+    Orientation, PositionedWord, ScoringEngine, create_empty_board, get_positioned_word_letters, get_words_sorted,
+    playword_from_str, transpose,
+)
+from searcher import create_greek_trie
+from serialize import board_from_rows, board_to_rows, playword_to_chars
+
+RACK = "ΑΕΣΤΝΚ*"
+
+
+@pytest.fixture
+def cache(tmp_path):
+    yield open_cache(str(tmp_path / "analyses.db"))
+    open_cache(None)
+
+
+def make_rows(trie, words: list[str]) -> list[str]:
+    game_board = create_empty_board()
+    engine = ScoringEngine(game_board, trie)
+    for pw in (PositionedWord(playword_from_str(words[10]), (5, 7), Orientation.HORIZONTAL),
+               PositionedWord(playword_from_str(words[200]), (6, 3), Orientation.VERTICAL)):
+        engine.place(get_positioned_word_letters(game_board, pw))
+
+    return board_to_rows(game_board)
+
+
+def move_keys(moves) -> set:
+    return {(pw.start_pos, pw.orientation, playword_to_chars(pw.word), score) for pw, score in moves}
+
+
+def test_transposed_board_hits(cache, trie, words):
+    rows = make_rows(trie, words)
+    flipped = ["".join(col) for col in transpose(rows)]
+    assert canonical_rows(rows)[0] == canonical_rows(flipped)[0]
+
+    moves = get_words_sorted(board_from_rows(rows), RACK, print_out=False, trie=trie)
+    assert len(moves) > 0
+    assert cache.stats()["entries"] == 1 and cache.misses == 1
+
+    # the transpose, with the rack in another order, reads the same entry
+    cached = get_words_sorted(board_from_rows(flipped), RACK[::-1], print_out=False, trie=trie)
+    assert cache.hits == 1 and cache.stats()["entries"] == 1
+    assert [score for _, score in cached] == [score for _, score in moves]
+
+    open_cache(None)
+    fresh = get_words_sorted(board_from_rows(flipped), RACK, print_out=False, trie=trie)
+    assert move_keys(cached) == move_keys(fresh)
+
+
+def test_other_lexicon_misses(cache, trie, words, tmp_path):
+    rows = make_rows(trie, words)
+    get_words_sorted(board_from_rows(rows), RACK, print_out=False, top_n=5, trie=trie)
+
+    path = tmp_path / "more.txt"
+    path.write_text("\n".join(words + ["ΣΤΑΣΤΑ"]) + "\n", encoding="utf-8")
+    other = create_greek_trie(str(path))
+
+    assert cache.get(rows, RACK, 5, other) is None
+    assert cache.get(rows, RACK, 10, trie) is None
+    assert len(cache.get(rows, RACK, 3, trie)) == 3
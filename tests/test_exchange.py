@@ -0,0 +1,65 @@
+import itertools
+from collections import Counter
+
+import pytest
+
+from exchange import VOWELS, LeaveEvaluator, counts_of, default_leave_table
+from rackfit import RackFit
+from tiles import TILE_LETTERS
+
+# a pool small enough to enumerate every draw of it
+POOL = "ΑΑΕΕΙΣΣΤΝΚ*"
+
+
+def rack_value(table, rack: str) -> float:
+    counts = Counter(rack)
+    value = sum(row[counts[letter]] for letter, row in zip(TILE_LETTERS, table.values))
+    n_letters = len(rack) - counts["*"]
+    return value + table.balance(sum(counts[letter] for letter in VOWELS), n_letters)
+
+
+def enumerate_value(table, leave: str, n_draw: int, words: list[str]|None = None, rack_size: int = 0) -> float:
+    """Mean value over every draw of distinct tiles, and with words the bingo term"""
+    draws = list(itertools.combinations(POOL, n_draw))
+    value = sum(rack_value(table, leave + "".join(draw)) for draw in draws) / len(draws)
+    if words is None:
+        return value
+
+    targets = [Counter(word) for word in words if len(word) == rack_size]
+    bingos = 0
+    for draw in draws:
+        if "*" in draw:
+            continue
+
+        rack = Counter(leave + "".join(draw))
+        bingos += sum(1 for word in targets if sum((word - rack).values()) <= rack["*"])
+
+    return value + table.bingo_weight * min(1.0, bingos / len(draws))
+
+
+@pytest.mark.parametrize("leave", ["", "Α", "ΑΑ", "ΕΙΟ", "ΣΣΣ*", "Κ*"])
+def test_leave_value_matches_enumeration(leave):
+    table = default_leave_table()
+    evaluator = LeaveEvaluator(counts_of(POOL), bag_size=50, rack_size=5)
+
+    assert evaluator.leave_value(leave) == pytest.approx(enumerate_value(table, leave, 5 - len(leave)))
+
+    # the order of the leave does not matter
+    assert evaluator.leave_value(leave[::-1]) == evaluator.leave_value(leave)
+
+
+def test_short_bag_draws_what_is_left():
+    table = default_leave_table()
+    evaluator = LeaveEvaluator(counts_of(POOL), bag_size=2, rack_size=5)
+
+    assert evaluator.leave_value("Α") == pytest.approx(enumerate_value(table, "Α", 2))
+    assert evaluator.leave_value("ΑΕΣΤΝ") == pytest.approx(rack_value(table, "ΑΕΣΤΝ"))
+
+
+@pytest.mark.parametrize("leave", ["", "Σ", "ΑΕ*"])
+def test_leave_value_with_bingos(words, leave):
+    table = default_leave_table()
+    evaluator = LeaveEvaluator(counts_of(POOL), bag_size=50, rack_size=4, rack_fit=RackFit(words))
+
+    expected = enumerate_value(table, leave, 4 - len(leave), words, 4)
+    assert evaluator.leave_value(leave) == pytest.approx(expected)
@@ -0,0 +1,104 @@
+from main import (
+    BOARD_SIZE, Orientation, PositionedWord, ScoringEngine, create_empty_board, get_positioned_word_letters,
+    other_orientation, playword_from_str,
+)
+from heatmap import compute_heatmap, exposure, run_extent
+from tiles import RACK_SIZE
+
+
+def make_board(trie, words: list[str]):
+    # one word on the centre, one against the bottom right corner
+    game_board = create_empty_board()
+    engine = ScoringEngine(game_board, trie)
+    corner = words[30]
+    for pw in (PositionedWord(playword_from_str(words[10]), (5, 7), Orientation.HORIZONTAL),
+               PositionedWord(playword_from_str(corner), (BOARD_SIZE - len(corner), BOARD_SIZE - 1), Orientation.HORIZONTAL)):
+        engine.place(get_positioned_word_letters(game_board, pw))
+
+    return game_board, engine
+
+
+def valid_moves(game_board, engine: ScoringEngine, words: list[str]):
+    """Every move of any rack, trying each word at each square, with its letters and points"""
+    moves = []
+    for word in sorted(set(words)):
+        for orientation in (Orientation.HORIZONTAL, Orientation.VERTICAL):
+            for y in range(BOARD_SIZE):
+                for x in range(BOARD_SIZE):
+                    pw = PositionedWord(playword_from_str(word), (x, y), orientation)
+                    try:
+                        letters = get_positioned_word_letters(game_board, pw)
+                    except ValueError:
+                        continue
+
+                    if not 0 < len(letters) <= RACK_SIZE:
+                        continue
+
+                    # the word or a cross word has to take a board tile
+                    touches = len(letters) < len(word) or any(
+                        engine.cross_word(pl.pos, other_orientation(orientation)) is not None for pl in letters)
+                    if not touches:
+                        continue
+
+                    result = engine.score(letters)
+                    if result is not None:
+                        moves.append((pw, letters, result.points))
+
+    return moves
+
+
+def test_run_extent_matches_words(trie, words):
+    runs = {word[i:j] for word in words[:40] for i in range(len(word)) for j in range(i + 1, len(word) + 1)}
+
+    for run in sorted(runs) + ["ΣΣΣΣ"]:
+        expected = None
+        for word in set(words):
+            for i in range(len(word) - len(run) + 1):
+                if word[i:i+len(run)] == run:
+                    before, after = expected or (-1, -1)
+                    expected = (max(before, i), max(after, len(word) - i - len(run)))
+
+        assert run_extent(trie, run) == expected, run
+
+
+def test_heat_bounds_every_move(trie, words):
+    game_board, engine = make_board(trie, words)
+    heat = compute_heatmap(engine)
+    moves = valid_moves(game_board, engine, words)
+
+    # the corner word makes moves along the edges
+    assert any(x == BOARD_SIZE - 1 or y == BOARD_SIZE - 1 for _, letters, _ in moves for x, y in (pl.pos for pl in letters))
+
+    for pw, letters, points in moves:
+        for pl in letters:
+            sq = heat.get(pl.pos)
+            assert sq.reachable and sq.max_len >= len(pw.word)
+            assert sq.bound >= points
+
+    for y in range(BOARD_SIZE):
+        for x in range(BOARD_SIZE):
+            sq = heat.get((x, y))
+            assert (sq is None) == (game_board[y][x].letter != " ")
+
+    # the far corner is out of reach of any word
+    assert not heat.get((0, 0)).reachable
+    assert heat.max_bound == max(sq.bound for _, sq in heat.hottest(1))
+
+
+def test_exposure_bounds_the_reply(trie, words):
+    game_board, engine = make_board(trie, words)
+    moves = valid_moves(game_board, engine, words)
+    before = [row[:] for row in game_board]
+
+    pw, letters, _ = max(moves, key=lambda move: move[2])
+    exposed = exposure(engine, pw)
+    assert game_board == before
+
+    after_board = [row[:] for row in game_board]
+    after = ScoringEngine(after_board, trie)
+    after.place(letters)
+    assert exposed == compute_heatmap(after).max_bound
+
+    # no reply scores past the bound
+    replies = valid_moves(after_board, after, words)
+    assert exposed >= max(points for _, _, points in replies)
@@ -0,0 +1,155 @@
+import sys
+from collections import Counter
+
+import pytest
+
+from main import (
+    BOARD_SIZE, Orientation, PositionedWord, ScoringEngine, create_empty_board, find_words, get_positioned_word_letters,
+    other_orientation, parallel_moves, play_word, playword_from_str, transpose,
+)
+
+
+def make_board(trie, words: list[str]):
+    game_board = create_empty_board()
+    engine = ScoringEngine(game_board, trie)
+    assert play_word(game_board, playword_from_str(words[10]), (5, 7), Orientation.HORIZONTAL, engine=engine) is not None
+    assert play_word(game_board, playword_from_str(words[200]), (6, 3), Orientation.VERTICAL, engine=engine) is not None
+    assert play_word(game_board, playword_from_str(words[120]), (9, 9), Orientation.HORIZONTAL, engine=engine) is not None
+    return game_board
+
+
+def valid_keys(game_board, engine: ScoringEngine, moves: list[PositionedWord]) -> set:
+    keys = set()
+    for pw in moves:
+        if engine.score(get_positioned_word_letters(game_board, pw)) is not None:
+            keys.add((pw.start_pos, pw.orientation, "".join(pl.real_letter for pl in pw.word)))
+
+    return keys
+
+
+def brute_force(game_board, engine: ScoringEngine, words: list[str], rack: str) -> set:
+    """Every valid move, trying each word at each square"""
+    rack_counts = Counter(rack)
+    keys = set()
+
+    # the opening has to cover the centre square
+    empty = all(pl.letter == " " for row in game_board for pl in row)
+    centre = (BOARD_SIZE // 2, BOARD_SIZE // 2)
+
+    for word in words:
+        for orientation in (Orientation.HORIZONTAL, Orientation.VERTICAL):
+            dx, dy = (1, 0) if orientation == Orientation.HORIZONTAL else (0, 1)
+
+            for y in range(BOARD_SIZE):
+                for x in range(BOARD_SIZE):
+                    cells = [(x + dx * k, y + dy * k) for k in range(len(word))]
+                    if any(cx >= BOARD_SIZE or cy >= BOARD_SIZE for cx, cy in cells):
+                        continue
+
+                    before = (x - dx, y - dy)
+                    after = (x + dx * len(word), y + dy * len(word))
+                    if any(0 <= px < BOARD_SIZE and 0 <= py < BOARD_SIZE and game_board[py][px].letter != " " for px, py in (before, after)):
+                        continue
+
+                    placed = []
+                    touches = False
+                    for (cx, cy), letter in zip(cells, word):
+                        board_letter = game_board[cy][cx]
+                        if board_letter.letter == " ":
+                            placed.append(letter)
+                            touches = touches or engine.cross_word((cx, cy), other_orientation(orientation)) is not None
+                            touches = touches or (empty and (cx, cy) == centre)
+                        elif board_letter.real_letter != letter:
+                            break
+                        else:
+                            touches = True
+                    else:
+                        if len(placed) == 0 or not touches:
+                            continue
+
+                        missing = Counter(placed) - rack_counts
+                        if sum(missing.values()) > rack_counts["*"]:
+                            continue
+
+                        # real letters first, blanks for the rest
+                        left = rack_counts.copy()
+                        wildcards = []
+                        pattern = ""
+                        for (cx, cy), letter in zip(cells, word):
+                            if game_board[cy][cx].letter != " " or left[letter] > 0:
+                                pattern += letter
+                                if game_board[cy][cx].letter == " ":
+                                    left[letter] -= 1
+                            else:
+                                pattern += "*"
+                                wildcards.append(letter)
+
+                        pw = PositionedWord(playword_from_str(pattern, wildcards), (x, y), orientation)
+                        if engine.score(get_positioned_word_letters(game_board, pw)) is not None:
+                            keys.add(((x, y), orientation, word))
+
+    return keys
+
+
+@pytest.mark.parametrize("rack", ["ΑΕΣΤΝΚΡ", "ΑΙΟΣΛ*", "ΕΕΡΤ**"])
+def test_generators_match_brute_force(trie, words, rack):
+    game_board = make_board(trie, words)
+    engine = ScoringEngine(game_board, trie)
+
+    lines = find_words(game_board, rack, trie=trie)
+    parallel = parallel_moves(game_board, rack, engine)
+
+    expected = brute_force(game_board, engine, words, rack)
+    assert valid_keys(game_board, engine, lines) | valid_keys(game_board, engine, parallel) == expected
+
+    # parallel moves are exactly the ones find_words cannot reach
+    assert valid_keys(game_board, engine, lines).isdisjoint(valid_keys(game_board, engine, parallel))
+
+
+@pytest.mark.parametrize("use_fit", [True, False])
+@pytest.mark.parametrize("rack", ["ΑΕΣΤΝΚΡ", "ΑΙΟΣΛ*"])
+def test_openings_match_brute_force(trie, words, rack, use_fit, monkeypatch):
+    if not use_fit:
+        # as without numpy: the trie walk from the centre square
+        monkeypatch.setitem(sys.modules, "rackfit", None)
+
+    game_board = create_empty_board()
+    engine = ScoringEngine(game_board, trie)
+
+    openings = parallel_moves(game_board, rack, engine)
+    assert valid_keys(game_board, engine, openings) == brute_force(game_board, engine, words, rack)
+
+
+def test_view_rows_and_columns_agree(trie, words):
+    game_board = make_board(trie, words)
+    engine = ScoringEngine(game_board, trie)
+    view = engine.view
+
+    def check():
+        assert view.rows is game_board and view.cols == transpose(game_board)
+        for i in range(BOARD_SIZE):
+            assert view.query(Orientation.VERTICAL, i) == "".join(row[i].real_letter for row in game_board)
+
+        # the engine of the transposed board sees every empty square the other way round
+        flipped = ScoringEngine(transpose(game_board), trie)
+        fresh = ScoringEngine([row[:] for row in game_board], trie)
+        for y in range(BOARD_SIZE):
+            for x in range(BOARD_SIZE):
+                if game_board[y][x].letter != " ":
+                    continue
+
+                for orientation in (Orientation.HORIZONTAL, Orientation.VERTICAL):
+                    cw = engine.cross_word((x, y), orientation)
+                    assert cw == flipped.cross_word((y, x), other_orientation(orientation)) == fresh.cross_word((x, y), orientation)
+                    assert engine.cross_check((x, y), orientation) == fresh.cross_check((x, y), orientation)
+
+    check()
+
+    # placing and taking off tiles keeps the columns and the caches in step
+    pw = PositionedWord(playword_from_str(words[50]), (2, 9), Orientation.VERTICAL)
+    letters = get_positioned_word_letters(game_board, pw, view)
+    engine.place(letters)
+    check()
+
+    engine.remove([pl.pos for pl in letters[:2]])
+    check()
@@ -0,0 +1,51 @@
+import pytest
+
+import main
+import patterns
+from main import BOARD_SIZE, BoardView, Orientation, ScoringEngine, create_empty_board, find_words, play_word, playword_from_str
+from patterns import PatternIndex
+from searcher import playword_to_str
+
+
+def keys(results) -> set:
+    # the trie finds a word from every board run in it, with equal
+    # placements not always merged, so compare as sets
+    return {(qr.start_index, "".join(pl.letter for pl in qr.word), playword_to_str(qr.word)) for qr in results}
+
+
+@pytest.fixture(scope="module")
+def board(trie, words):
+    game_board = create_empty_board()
+    engine = ScoringEngine(game_board, trie)
+    play_word(game_board, playword_from_str(words[10]), (5, 7), Orientation.HORIZONTAL, engine=engine)
+    play_word(game_board, playword_from_str(words[200]), (6, 3), Orientation.VERTICAL, engine=engine)
+    play_word(game_board, playword_from_str(words[120]), (9, 9), Orientation.HORIZONTAL, engine=engine)
+    play_word(game_board, playword_from_str(words[40]), (2, 12), Orientation.HORIZONTAL, engine=engine)
+    return game_board
+
+
+@pytest.mark.parametrize("rack", ["ΑΕΣΤΝΚΡ", "ΑΙΟΣΛ*", "ΕΕΡΤ**"])
+def test_index_matches_trie(trie, words, board, rack):
+    index = PatternIndex(words)
+    view = BoardView(board)
+
+    for orient in (Orientation.HORIZONTAL, Orientation.VERTICAL):
+        for i in range(BOARD_SIZE):
+            qu = view.query(orient, i)
+            assert keys(index.query(qu, rack)) == keys(trie.query(qu, rack)), (orient, i)
+
+
+def test_find_words_uses_index(trie, board, monkeypatch):
+    key = lambda pw: (pw.start_pos, pw.orientation, "".join(pl.letter for pl in pw.word), playword_to_str(pw.word))
+
+    # a lexicon this small never needs the index, make every line use it
+    monkeypatch.setattr(patterns, "PATTERN_SLOT_COST", 0.0)
+    monkeypatch.setattr(patterns, "PATTERN_WORDS_PER_UNIT", float("inf"))
+
+    with_index = {key(pw) for pw in find_words(board, "ΑΕ*ΣΤ", trie=trie)}
+    assert trie in patterns._patterns
+
+    monkeypatch.setattr(main, "USE_PATTERN_INDEX", False)
+    trie_only = {key(pw) for pw in find_words(board, "ΑΕ*ΣΤ", trie=trie)}
+
+    assert with_index == trie_only
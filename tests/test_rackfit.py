@@ -0,0 +1,53 @@
+import itertools
+from collections import Counter
+
+import pytest
+
+from exchange import LeaveEvaluator, counts_of
+from rackfit import RackFit
+
+# a pool small enough to enumerate every draw of it
+POOL = "ΑΑΕΕΙΣΣΤΝ*"
+
+
+def test_formable_matches_counts(words):
+    fit = RackFit(words)
+
+    for rack in ["ΑΕΣΤΝΚΡ", "ΑΙΟΣΛ*", "ΕΕΡΤ**"]:
+        rack_counts = Counter(rack)
+        expected = set()
+        for word in words:
+            missing = Counter(word) - rack_counts
+            if len(word) <= len(rack) and sum(missing.values()) <= rack_counts["*"]:
+                expected.add(word)
+
+        assert set(fit.words_at(fit.formable(rack))) == expected
+
+
+def test_rack_counts_rejects_other_letters(words):
+    fit = RackFit(words)
+
+    with pytest.raises(ValueError):
+        fit.rack_counts("ΑΒc")
+
+
+@pytest.mark.parametrize("leave", ["", "Α", "ΑΕ", "ΣΤΝ", "Σ*", "**"])
+def test_bingo_term_matches_enumeration(words, leave):
+    rack_size = 4
+    fit = RackFit(words)
+    evaluator = LeaveEvaluator(counts_of(POOL), bag_size=50, rack_size=rack_size, rack_fit=fit)
+
+    targets = [Counter(word) for word in words if len(word) == rack_size]
+
+    # every draw of distinct tiles is equally likely, drawn blanks do not count
+    total = 0
+    draws = list(itertools.combinations(range(len(POOL)), rack_size - len(leave)))
+    for draw in draws:
+        drawn = [POOL[i] for i in draw]
+        if "*" in drawn:
+            continue
+
+        rack = Counter(leave + "".join(drawn))
+        total += sum(1 for word in targets if sum((word - rack).values()) <= rack["*"])
+
+    assert evaluator._bingos(counts_of(leave)) == pytest.approx(total / len(draws))
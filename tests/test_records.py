@@ -0,0 +1,85 @@
+import io
+
+import pytest
+
+from main import BOARD_SIZE, Orientation, PositionedWord, playword_from_str
+from records import NO_PLAYER, RecordWriter, board_at, read_games, reanalyze_game, replay
+from searcher import set_trie
+from serialize import board_to_rows
+from session import GameSession
+
+
+@pytest.fixture
+def played(trie, words):
+    """A few turns of a two player game, as a session and its record"""
+    set_trie(trie)
+    session = GameSession(2, seed=7)
+    stream = io.StringIO()
+    writer = RecordWriter(stream)
+    writer.start_game(7, 2)
+
+    opening = PositionedWord(playword_from_str(words[10]), (BOARD_SIZE // 2, BOARD_SIZE // 2), Orientation.VERTICAL)
+    writer.move(NO_PLAYER, opening, "", session.score(opening))
+    session.apply_move(opening, NO_PLAYER)
+
+    for turn in range(8):
+        player = session.player
+        session.tiles.refill(player)
+        rack = session.tiles.rack(player)
+
+        moves = session.best_moves(rack, 1)
+        if turn == 3:
+            writer.exchange(player, rack, rack[:2])
+            session.exchange(rack[:2], player)
+        elif len(moves) == 0:
+            writer.pass_turn(player, rack)
+            session.pass_turn(player)
+        else:
+            pw, _ = moves[0]
+            writer.move(player, pw, rack, session.apply_move(pw, player))
+
+    writer.end_game([0, 0])
+    return session, stream.getvalue()
+
+
+def test_write_read_round_trip(played):
+    _, text = played
+    games = list(read_games(io.StringIO(text + text)))
+    assert len(games) == 2 and games[0] == games[1]
+
+    game = games[0]
+    assert game.seed == 7 and game.n_players == 2 and game.final == [0, 0]
+    assert [rec.kind for rec in game.moves].count("X") == 1
+
+    # writing what was read gives the same text back
+    stream = io.StringIO()
+    RecordWriter(stream).write_game(game)
+    assert stream.getvalue() == text
+
+
+def test_replay_rescores_every_move(played):
+    session, text = played
+    game = next(read_games(io.StringIO(text)))
+
+    n_moves = 0
+    for game_board, engine, rec in replay(game):
+        if rec.move is not None:
+            assert engine.score(engine.move_letters(rec.move)).points == rec.score
+            n_moves += 1
+
+    assert n_moves > 1
+    assert board_to_rows(board_at(game)) == board_to_rows(session.board)
+
+    for record in reanalyze_game(game, 1):
+        if "played" in record:
+            # the moves were the best of their racks
+            assert record["rescored"] == record["played"]["score"] == record["best"][0]["score"]
+
+
+def test_bad_line_names_it(played):
+    _, text = played
+    lines = text.splitlines()
+    lines[2] = "M 0 1 2"
+
+    with pytest.raises(ValueError, match="Line 3"):
+        list(read_games(io.StringIO("\n".join(lines))))
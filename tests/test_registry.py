@@ -0,0 +1,25 @@
+from registry import DEFAULT_LEXICON, LexiconRegistry, LexiconSpec
+from searcher import get_trie, set_trie, update_trie
+
+
+def test_reloaded_default_is_not_evicted(trie, tmp_path):
+    set_trie(trie)
+
+    path = tmp_path / "small.txt"
+    path.write_text("ΑΣΤΡΟ\nΝΕΡΟ\n", encoding="utf-8")
+    registry = LexiconRegistry({"small": LexiconSpec(path=str(path))})
+
+    try:
+        registry.get(DEFAULT_LEXICON)
+        small = registry.get("small")
+        registry.memory_cap = small.size + 1
+
+        # the default lexicon is the oldest entry when it is reloaded
+        update_trie(add=["ΣΤΑΣΤΑ"])
+        lexicon = registry.get(DEFAULT_LEXICON)
+
+        assert lexicon.trie is get_trie() and "ΣΤΑΣΤΑ" in lexicon.trie
+        assert list(registry.loaded) == [DEFAULT_LEXICON]
+
+    finally:
+        set_trie(trie)
@@ -0,0 +1,166 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from http.server import ThreadingHTTPServer
+from urllib.error import HTTPError
+from urllib.request import urlopen
+
+import pytest
+
+import server
+from searcher import get_trie, set_trie
+from server import Analyzer, RequestHandler, ServerBusy, SessionStore
+
+ROWS = ["." * 15] * 15
+
+
+@pytest.fixture
+def analyzer(trie, monkeypatch):
+    set_trie(trie)
+
+    # analyses run in threads and block until the test lets them finish
+    release = threading.Event()
+    calls = []
+
+    def analyze(lexicon_path, version, lexicon, rows, rack, top):
+        calls.append(rack)
+        release.wait(5)
+        return [{"rack": rack}]
+
+    monkeypatch.setattr(server, "_analyze", analyze)
+
+    a = Analyzer("unused.bin", workers=1, max_concurrent=1, timeout=0.5)
+    a.pool.shutdown()
+    a.pool = ThreadPoolExecutor(max_workers=1)
+    a.release, a.calls = release, calls
+
+    yield a
+
+    release.set()
+    a.pool.shutdown()
+
+
+def test_coalesces_identical_requests(analyzer):
+    with ThreadPoolExecutor(max_workers=2) as clients:
+        first = clients.submit(analyzer.best_moves, ROWS, "ΑΣΤ", 5)
+        second = clients.submit(analyzer.best_moves, ROWS, "ΤΣΑ", 5)
+
+        while analyzer.stats.coalesced == 0:
+            threading.Event().wait(0.01)
+
+        analyzer.release.set()
+        assert first.result() == second.result() == [{"rack": "ΑΣΤ"}]
+
+    assert analyzer.calls == ["ΑΣΤ"]
+    assert analyzer.stats.requests == 2
+    assert len(analyzer.in_flight) == 0
+
+
+def test_timeout_and_busy(analyzer):
+    # the running analysis holds the only slot past the deadline
+    t0 = time.monotonic()
+    with pytest.raises(FutureTimeoutError):
+        analyzer.best_moves(ROWS, "ΑΣΤ", 5)
+
+    assert time.monotonic() - t0 < 2 * analyzer.timeout
+
+    assert analyzer.stats.timeouts == 1
+    assert len(analyzer.in_flight) == 0
+
+    # a different position cannot get a slot before its deadline
+    with pytest.raises(ServerBusy):
+        analyzer.best_moves(ROWS, "ΚΝΡ", 5)
+
+    assert analyzer.stats.rejected == 1
+
+    # once the slot is free again, analyses run
+    analyzer.release.set()
+    assert analyzer.slots.acquire(timeout=5)
+    analyzer.slots.release()
+    assert analyzer.best_moves(ROWS, "ΚΝΡ", 5) == [{"rack": "ΚΝΡ"}]
+
+
+def test_update_keeps_files_of_running_tasks(analyzer, trie, monkeypatch):
+    monkeypatch.setattr(server, "LEXICON_HISTORY", 1)
+
+    try:
+        analyzer.update_lexicon(["ΑΣΤΑΣΤ"], [])
+        with ThreadPoolExecutor(max_workers=1) as clients:
+            running = clients.submit(analyzer.best_moves, ROWS, "ΑΣΤ", 5)
+            while len(analyzer.pins) == 0:
+                threading.Event().wait(0.01)
+
+            # the task runs on version 1, which two updates push out of the history
+            path = analyzer.lexicons[1].path
+            assert analyzer.pins == {path: 1}
+
+            analyzer.update_lexicon(["ΣΤΑΣΤΑ"], [])
+            analyzer.update_lexicon([], ["ΑΣΤΑΣΤ"])
+            assert os.path.exists(path) and path in analyzer.retired
+
+            analyzer.release.set()
+            running.exception()
+
+        assert not os.path.exists(path)
+        assert analyzer.pins == {} and analyzer.retired == set()
+        assert "ΣΤΑΣΤΑ" in get_trie() and "ΑΣΤΑΣΤ" not in get_trie()
+
+    finally:
+        analyzer.shutdown()
+        analyzer.owned_paths = []
+        set_trie(trie)
+
+
+@pytest.fixture
+def post(analyzer, monkeypatch):
+    """POST to a server of the analyzer fixture, returning the JSON reply"""
+    monkeypatch.setattr(RequestHandler, "analyzer", analyzer, raising=False)
+    monkeypatch.setattr(RequestHandler, "sessions", SessionStore(), raising=False)
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), RequestHandler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+
+    def post(path, body):
+        url = f"http://127.0.0.1:{httpd.server_port}{path}"
+        with urlopen(url, json.dumps(body).encode()) as response:
+            return json.loads(response.read())
+
+    yield post
+
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_session_moves_run_on_the_pool(analyzer, post):
+    session_id = post("/sessions", {})["session"]
+
+    # the analysis is the pool's, and gives up at the deadline of /moves
+    with pytest.raises(HTTPError) as e:
+        post(f"/sessions/{session_id}/moves", {"rack": "αστ"})
+    assert e.value.code == 504
+    assert analyzer.stats.timeouts == 1
+
+    analyzer.release.set()
+    body = post(f"/sessions/{session_id}/moves", {"rack": "ΚΝΡ"})
+    assert body["moves"] == [{"rack": "ΚΝΡ"}] and body["position"] == 0
+    assert analyzer.calls == ["ΑΣΤ", "ΚΝΡ"]
+
+
+def test_session_diffs_against_a_position(analyzer, post):
+    session_id = post("/sessions", {})["session"]
+    path = f"/sessions/{session_id}"
+
+    assert post(f"{path}/diff", {"position": 0, "placed": [[7, 7, "Σ"], [8, 7, "Α"]]})["position"] == 1
+
+    # a client still on position 0 is told where the session is
+    with pytest.raises(HTTPError) as e:
+        post(f"{path}/diff", {"position": 0, "removed": [[7, 7]]})
+    assert e.value.code == 409 and json.loads(e.value.read())["position"] == 1
+
+    with pytest.raises(HTTPError) as e:
+        post(f"{path}/diff", {"position": 1, "removed": [[0, 0]]})
+    assert e.value.code == 400
+
+    body = post(f"{path}/undo", {"position": 1})
+    assert body["position"] == 2 and body["undone"] == {"placed": [[7, 7, "Σ"], [8, 7, "Α"]], "removed": []}
@@ -0,0 +1,67 @@
+import pytest
+
+from main import PositionedLetter
+from searcher import PlayLetter, set_trie
+from serialize import board_to_rows
+from session import GameSession
+from test_moves import make_board
+
+RACK = "ΑΕΣΤΝΚ*"
+
+
+def tile(letter: str, x: int, y: int, wildcard: str = "") -> PositionedLetter:
+    return PositionedLetter(PlayLetter(letter=letter, wildcard_letter=wildcard), (x, y))
+
+
+@pytest.fixture
+def session(trie, words):
+    set_trie(trie)
+    return GameSession(game_board=make_board(trie, words), track_tiles=False)
+
+
+def test_diffs_keep_moves_current(session):
+    start = board_to_rows(session.board)
+    session.best_moves(RACK)
+
+    # tiles in two corners and one off a word, one back on, one replaced
+    x, y = next((x, y) for y, row in enumerate(session.board) for x, pl in enumerate(row) if pl.letter != " ")
+    diffs = [
+        ([tile("Σ", 0, 0), tile("*", 14, 14, "Α")], [(x, y)]),
+        ([tile("Τ", x, y)], []),
+        ([tile("Ο", 0, 0)], [(0, 0)]),
+    ]
+
+    for position, (placed, removed) in enumerate(diffs, 1):
+        assert session.set_tiles(placed, removed) == position
+
+        # the cached line plans and results follow the edits
+        fresh = GameSession(game_board=session.board, track_tiles=False)
+        assert session.best_moves(RACK) == fresh.best_moves(RACK)
+
+    for position in (4, 5, 6):
+        assert session.undo() is not None
+        assert session.position == position
+
+    assert board_to_rows(session.board) == start
+    assert session.best_moves(RACK) == GameSession(game_board=session.board, track_tiles=False).best_moves(RACK)
+
+
+@pytest.mark.parametrize("placed, removed", [
+    ([tile("Σ", 15, 0)], []),
+    ([], [(0, 0)]),
+    ([tile("Σ", 0, 0), tile("Τ", 0, 0)], []),
+    ([tile("*", 0, 0)], []),
+])
+def test_bad_diff_changes_nothing(session, placed, removed):
+    start = board_to_rows(session.board)
+
+    with pytest.raises(ValueError):
+        session.set_tiles(placed, removed)
+
+    assert board_to_rows(session.board) == start and session.position == 0
+
+
+def test_tracked_session_refuses_diffs(trie):
+    set_trie(trie)
+    with pytest.raises(ValueError):
+        GameSession(seed=1).set_tiles([tile("Σ", 7, 7)])
@@ -0,0 +1,98 @@
+import random
+from collections import Counter
+
+import pytest
+
+from tiles import FULL_COUNTS, TILE_IDS, TILE_LETTERS, TilePool, TileTracker
+
+
+def check_pool(pool: TilePool):
+    # counts, flat list and the index of each tile agree
+    assert pool.counts == [pool.tiles.count(letter) for letter in TILE_LETTERS]
+    assert len(pool.slot) == len(pool.tiles)
+
+    for letter_id, positions in enumerate(pool.where):
+        assert len(positions) == pool.counts[letter_id]
+        for k, pos in enumerate(positions):
+            assert TILE_IDS[pool.tiles[pos]] == letter_id and pool.slot[pos] == k
+
+
+def test_pool_keeps_its_index():
+    rng = random.Random(3)
+    pool = TilePool(FULL_COUNTS)
+    expected = Counter({letter: n for letter, n in zip(TILE_LETTERS, FULL_COUNTS)})
+    check_pool(pool)
+
+    for _ in range(300):
+        match rng.randrange(4):
+            case 0:
+                drawn = pool.draw(rng.randint(0, 7), rng)
+                expected -= Counter(drawn)
+            case 1:
+                letters = rng.sample(pool.tiles, min(len(pool), rng.randint(0, 7)))
+                pool.remove(letters)
+                expected -= Counter(letters)
+            case 2:
+                letters = [rng.choice(TILE_LETTERS) for _ in range(rng.randint(0, 7))]
+                pool.add(letters)
+                expected += Counter(letters)
+            case 3:
+                sample = pool.sample(rng.randint(0, 7), rng)
+                assert Counter(sample) <= expected
+
+        check_pool(pool)
+        assert Counter(pool.tiles) == expected
+
+    copy = pool.copy()
+    copy.draw(5, rng)
+    check_pool(copy)
+    assert Counter(pool.tiles) == expected
+
+
+def test_pool_remove_is_all_or_nothing():
+    pool = TilePool()
+    pool.add("ΑΑΣ")
+
+    with pytest.raises(ValueError):
+        pool.remove("ΑΑΑ")
+    with pytest.raises(ValueError):
+        pool.remove("Α?")
+
+    assert Counter(pool.tiles) == Counter("ΑΑΣ")
+    check_pool(pool)
+
+
+def test_tracker_conserves_tiles():
+    tracker = TileTracker(2, seed=11)
+    full = Counter({letter: n for letter, n in zip(TILE_LETTERS, FULL_COUNTS)})
+
+    def check():
+        racks = [Counter(rack.tiles) for rack in tracker.racks]
+        bag, board = Counter(tracker.bag.tiles), Counter(tracker.board.tiles)
+        assert bag + board + racks[0] + racks[1] == full
+
+        # a player cannot see the bag and the other rack
+        assert Counter(tracker.unseen[0].tiles) == bag + racks[1]
+        assert Counter(tracker.unseen[1].tiles) == bag + racks[0]
+
+        for pool in [tracker.bag, tracker.board, *tracker.racks, *tracker.unseen]:
+            check_pool(pool)
+
+    for player in (0, 1):
+        tracker.refill(player)
+    check()
+
+    tracker.play(0, tracker.racks[0].tiles[:3])
+    tracker.refill(0)
+    check()
+
+    tracker.exchange(1, tracker.racks[1].tiles[:4])
+    tracker.place(tracker.bag.tiles[:2])
+    check()
+
+    # a copy goes on with the same draws, and leaves the original be
+    copy = tracker.copy()
+    assert copy.refill(0, 9) == tracker.copy().refill(0, 9)
+    check()
+
+    assert Counter(tracker.sample_rack(0)) <= Counter(tracker.unseen[0].tiles)
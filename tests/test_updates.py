@@ -0,0 +1,73 @@
+import os
+import random
+
+import pytest
+
+from compact import load_compact, share_trie
+from conftest import LETTERS
+from main import get_words_sorted
+from searcher import create_greek_trie
+from serialize import playword_to_chars
+from test_moves import make_board
+
+
+def move_keys(game_board, rack: str, t) -> set:
+    moves = get_words_sorted(game_board, rack, print_out=False, trie=t)
+    return {(pw.start_pos, pw.orientation, playword_to_chars(pw.word), score) for pw, score in moves}
+
+
+@pytest.fixture
+def change(words):
+    rng = random.Random(8)
+    add = set()
+    while len(add) < 60:
+        add.add("".join(rng.choice(LETTERS) for _ in range(rng.randint(2, 8))))
+
+    return sorted(add - set(words)), words[::7]
+
+
+def fresh_trie(tmp_path, words: list[str]):
+    path = tmp_path / "words.txt"
+    path.write_text("\n".join(words) + "\n", encoding="utf-8")
+    return create_greek_trie(str(path))
+
+
+@pytest.mark.parametrize("compiled", [False, True])
+def test_update_matches_a_fresh_build(trie, words, change, tmp_path, compiled):
+    add, remove = change
+    expected = sorted(set(words) - set(remove) | set(add))
+
+    if compiled:
+        # a mapped lexicon turned back into a mutable trie, as the server does
+        path = share_trie(trie)
+        try:
+            updated = load_compact(path).snapshot()
+        finally:
+            os.unlink(path)
+    else:
+        updated = trie.snapshot()
+
+    updated.add_words(add)
+    updated.remove_words(remove)
+
+    assert sorted(updated.words()) == expected
+    assert all(word in updated for word in add) and not any(word in updated for word in remove)
+
+    # the readers of the old lexicon do not see the change
+    assert sorted(trie.words()) == words
+
+    fresh = fresh_trie(tmp_path, expected)
+    game_board = make_board(trie, words)
+    for rack in ["ΑΕΣΤΝΚΡ", "ΑΙΟΣΛ*"]:
+        assert move_keys(game_board, rack, updated) == move_keys(game_board, rack, fresh)
+        assert move_keys(game_board, rack, trie) == move_keys(game_board, rack, fresh_trie(tmp_path, words))
+
+
+def test_removed_word_comes_back(trie, words):
+    updated = trie.snapshot()
+    updated.remove_words(words[:5])
+    assert not any(word in updated for word in words[:5])
+
+    newer = updated.snapshot()
+    newer.add_words(words[:5])
+    assert sorted(newer.words()) == words and newer.version == updated.version + 1
@@ -0,0 +1,223 @@
+import random
+from typing import Iterable
+
+from main import LETTER_DATA
+
+RACK_SIZE = 7
+
+# tile ids follow LETTER_DATA, blanks ("*") included
+TILE_LETTERS = [ld.letter for ld in LETTER_DATA]
+TILE_IDS = {letter: i for i, letter in enumerate(TILE_LETTERS)}
+FULL_COUNTS = [ld.n_count for ld in LETTER_DATA]
+
+
+class TilePool:
+    """Multiset of tiles as per-letter counts plus a flat list of the tiles
+
+    Counts answer "how many" in O(1). The flat list, kept in no
+    particular order, makes random draws O(1) per tile: pick an index,
+    swap the last tile into it and pop. where[i] lists the positions in
+    the flat list of the tiles of id i, and slot[pos] is where in that
+    list a position is, so taking out a given letter is a swap too.
+    """
+
+    def __init__(self, counts: list[int]|None = None):
+        self.counts = [0] * len(TILE_LETTERS)
+        self.tiles: list[str] = []
+        self.slot: list[int] = []
+        self.where: list[list[int]] = [[] for _ in TILE_LETTERS]
+
+        if counts is not None:
+            self.add(letter for letter, n in zip(TILE_LETTERS, counts) for _ in range(n))
+
+    def __len__(self):
+        return len(self.tiles)
+
+    def count(self, letter: str) -> int:
+        return self.counts[TILE_IDS[letter]]
+
+    def copy(self) -> "TilePool":
+        pool = TilePool.__new__(TilePool)
+        pool.counts = self.counts.copy()
+        pool.tiles = self.tiles.copy()
+        pool.slot = self.slot.copy()
+        pool.where = [positions.copy() for positions in self.where]
+
+        return pool
+
+
+    def _swap(self, i: int, j: int):
+        tiles, slot, where = self.tiles, self.slot, self.where
+        where[TILE_IDS[tiles[i]]][slot[i]] = j
+        where[TILE_IDS[tiles[j]]][slot[j]] = i
+        tiles[i], tiles[j] = tiles[j], tiles[i]
+        slot[i], slot[j] = slot[j], slot[i]
+
+
+    def _pop(self) -> str:
+        # take the last tile off, its entry in `where` moves to the end first
+        tiles, slot = self.tiles, self.slot
+        letter_id = TILE_IDS[tiles[-1]]
+        positions = self.where[letter_id]
+
+        moved = positions[-1]
+        positions[slot[-1]] = moved
+        slot[moved] = slot[-1]
+        positions.pop()
+
+        slot.pop()
+        self.counts[letter_id] -= 1
+        return tiles.pop()
+
+
+    def add(self, letters: Iterable[str]):
+        for letter in letters:
+            positions = self.where[TILE_IDS[letter]]
+            self.counts[TILE_IDS[letter]] += 1
+            self.slot.append(len(positions))
+            positions.append(len(self.tiles))
+            self.tiles.append(letter)
+
+
+    def remove(self, letters: Iterable[str]):
+        """Take specific tiles out, raising ValueError if one is missing"""
+        letters = list(letters)
+        for letter in letters:
+            if letter not in TILE_IDS:
+                raise ValueError(f"Not a tile: {letter!r}")
+
+        needed = [0] * len(TILE_LETTERS)
+        for letter in letters:
+            needed[TILE_IDS[letter]] += 1
+
+        for i, n in enumerate(needed):
+            if n > self.counts[i]:
+                raise ValueError(f"Only {self.counts[i]} {TILE_LETTERS[i]!r} left, need {n}")
+
+        for letter in letters:
+            self._swap(self.where[TILE_IDS[letter]][-1], len(self.tiles) - 1)
+            self._pop()
+
+
+    def draw(self, n: int, rng: random.Random) -> list[str]:
+        """Take up to n random tiles out"""
+        drawn = []
+        for _ in range(min(n, len(self.tiles))):
+            self._swap(rng.randrange(len(self.tiles)), len(self.tiles) - 1)
+            drawn.append(self._pop())
+
+        return drawn
+
+
+    def sample(self, n: int, rng: random.Random) -> list[str]:
+        """Up to n random tiles, leaving the pool as it is
+
+        A partial Fisher-Yates shuffle of the first n slots. It reorders
+        the flat list, which holds the same tiles afterwards.
+        """
+        size = len(self.tiles)
+        n = min(n, size)
+        for i in range(n):
+            self._swap(i, rng.randrange(i, size))
+
+        return self.tiles[:n]
+
+
+
+class TileTracker:
+    """Where the tiles of a game are: the bag, the board and the racks
+
+    unseen[p] is what player p cannot see, the bag and the other racks,
+    kept up to date as tiles move so opponent racks can be sampled from
+    it directly.
+    """
+
+    def __init__(self, n_players: int, seed: int|None = None, full_counts: list[int]|None = None):
+        self.rng = random.Random(seed)
+
+        # a lexicon can bring its own tile distribution, see registry.py
+        if full_counts is None:
+            full_counts = FULL_COUNTS
+
+        self.bag = TilePool(full_counts)
+        self.board = TilePool()
+        self.racks = [TilePool() for _ in range(n_players)]
+        self.unseen = [TilePool(full_counts) for _ in range(n_players)]
+
+
+    def copy(self) -> "TileTracker":
+        """An independent tracker in the same state, random state included"""
+        tracker = TileTracker.__new__(TileTracker)
+        tracker.rng = random.Random()
+        tracker.rng.setstate(self.rng.getstate())
+
+        tracker.bag = self.bag.copy()
+        tracker.board = self.board.copy()
+        tracker.racks = [rack.copy() for rack in self.racks]
+        tracker.unseen = [unseen.copy() for unseen in self.unseen]
+
+        return tracker
+
+
+    def rack(self, player: int) -> str:
+        return "".join(sorted(self.racks[player].tiles))
+
+
+    def refill(self, player: int, rack_size: int = RACK_SIZE) -> list[str]:
+        """Draw from the bag until the rack is full or the bag empty"""
+        drawn = self.bag.draw(rack_size - len(self.racks[player]), self.rng)
+
+        self.racks[player].add(drawn)
+        self.unseen[player].remove(drawn)
+
+        return drawn
+
+
+    def play(self, player: int, letters: Iterable[str]):
+        """Move tiles from a rack to the board"""
+        letters = list(letters)
+        self.racks[player].remove(letters)
+        self.board.add(letters)
+
+        for other, unseen in enumerate(self.unseen):
+            if other != player:
+                unseen.remove(letters)
+
+
+    def place(self, letters: Iterable[str]):
+        """Move tiles from the bag straight to the board"""
+        letters = list(letters)
+        self.bag.remove(letters)
+        self.board.add(letters)
+
+        for unseen in self.unseen:
+            unseen.remove(letters)
+
+
+    def exchange(self, player: int, letters: Iterable[str]) -> list[str]:
+        """Put tiles back in the bag and draw as many new ones"""
+        letters = list(letters)
+        if len(letters) > len(self.bag):
+            raise ValueError(f"Cannot exchange {len(letters)} tiles with {len(self.bag)} in the bag")
+
+        self.racks[player].remove(letters)
+
+        # draw first so the returned tiles cannot come straight back
+        drawn = self.bag.draw(len(letters), self.rng)
+        self.racks[player].add(drawn)
+        self.unseen[player].remove(drawn)
+
+        self.bag.add(letters)
+        self.unseen[player].add(letters)
+
+        return drawn
+
+
+    def sample_rack(self, player: int, rack_size: int = RACK_SIZE) -> str:
+        """A random rack for an opponent of `player`, from the tiles they cannot see"""
+        return "".join(self.unseen[player].sample(rack_size, self.rng))
+
+
+    def sample_racks(self, player: int, n: int, rack_size: int = RACK_SIZE) -> list[str]:
+        unseen = self.unseen[player]
+        return ["".join(unseen.sample(rack_size, self.rng)) for _ in range(n)]
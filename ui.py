@@ -1,13 +1,15 @@
 import tkinter as tk
 import tkinter.ttk as ttk
+import tkinter.font as tkfont
 from functools import partial
-from main import BOARD, BOARD_SIZE, Cell, Orientation, create_empty_board, Board, get_words_sorted, play_positioned_word, play_word, playword_from_str, VALID_LETTERS
+from main import BOARD, BOARD_SIZE, Cell, Orientation, create_empty_board, Board, describe_result, PositionedLetter, VALID_LETTERS
 from threading import Thread
 from tkinter.simpledialog import askstring
 from tkinter.messagebox import askokcancel
-import copy
 
-from searcher import PlayLetter
+from heatmap import Heatmap, compute_heatmap
+from searcher import PlayLetter, preload_trie
+from session import GameSession
 
 
 
@@ -21,6 +23,15 @@ CELL_COLORS = {
 
 CELL_FONT = ("TkDefaultFont", 24)
 
+PREVIEW_COLOR = "black"
+
+# squares a move can reach, coldest to hottest by their score bound
+HEAT_COLORS = ["#ffffcc", "#fed976", "#fd8d3c", "#e31a1c", "#800026"]
+HEAT_FONT = ("TkDefaultFont", 10)
+
+# how often to check whether the lexicon is built, in ms
+LOADING_POLL_MS = 100
+
 def font_size(sz):
     return ("TkDefaultFont", sz)
 
@@ -28,11 +39,18 @@ def font_size(sz):
 class GameFrame(tk.Frame):
 
 
-    def __init__(self, master):
+    def __init__(self, master, on_commit, on_edit):
         super().__init__(master)
 
+        # the board of the session, only ever changed through it
         self.game_board = create_empty_board()
 
+        # called with the previewed letters to make them part of the board
+        self.on_commit = on_commit
+
+        # called with (x, y, letter) for a cell changed by hand, " " to clear it
+        self.on_edit = on_edit
+
         self.grid_rowconfigure(list(range(15)), weight=1)
         self.grid_columnconfigure(list(range(15)), weight=1)
 
@@ -47,8 +65,23 @@ class GameFrame(tk.Frame):
                 btn.grid(row=y, column=x, sticky=tk.NSEW)
                 self.buttons[-1].append(btn)
 
+        # letters drawn over the board by show_preview, not part of game_board
+        self.preview: list[PositionedLetter] = []
+
+        # score bounds drawn on the empty squares, see show_heat
+        self.heat: Heatmap|None = None
+
+
+    def set_enabled(self, enabled: bool):
+        state = tk.NORMAL if enabled else tk.DISABLED
+        for row in self.buttons:
+            for btn in row:
+                btn.config(state=state)
+
 
     def on_button_click(self, x, y):
+        self.commit_preview()
+
         letter = askstring("Enter letter", "Enter letter", initialvalue="")
 
         if letter is None:
@@ -62,16 +95,196 @@ class GameFrame(tk.Frame):
         if letter != " " and letter not in VALID_LETTERS:
             return
 
-        self.buttons[y][x].config(text=letter)
-        self.game_board[y][x] = PlayLetter(letter=letter)
+        # a blank on the board always stands for some letter
+        wildcard = ""
+        if letter == "*":
+            wildcard = askstring("Blank tile", "Letter of the blank", initialvalue="")
+            if wildcard is None:
+                return
+
+            wildcard = wildcard.upper()
+            if wildcard == "*" or wildcard not in VALID_LETTERS:
+                return
+
+        self.on_edit(x, y, letter, wildcard)
+        self.refresh_cells([(x, y)])
 
 
     def set_board(self, board: Board):
+        self.preview = []
         self.game_board = board
 
         for y in range(BOARD_SIZE):
             for x in range(BOARD_SIZE):
-                self.buttons[y][x].config(text=self.game_board[y][x].real_letter)
+                self.draw_cell(x, y)
+
+
+    def refresh_cells(self, positions: list[tuple[int, int]]):
+        for x, y in positions:
+            self.draw_cell(x, y)
+
+
+    def draw_cell(self, x: int, y: int):
+        sq = None if self.heat is None else self.heat.get((x, y))
+        if sq is None or not sq.reachable:
+            self.buttons[y][x].config(text=self.game_board[y][x].real_letter, fg="white", bg=CELL_COLORS[BOARD[y][x]], font=CELL_FONT)
+            return
+
+        level = 0 if self.heat.max_bound == 0 else sq.bound * (len(HEAT_COLORS) - 1) // self.heat.max_bound
+        self.buttons[y][x].config(text=str(sq.bound), fg="black", bg=HEAT_COLORS[level], font=HEAT_FONT)
+
+
+    def show_heat(self, heat: Heatmap|None):
+        """Draw the score bounds of a heat map on the empty squares, None to take them off"""
+        self.heat = heat
+
+        for y in range(BOARD_SIZE):
+            for x in range(BOARD_SIZE):
+                if not any(pl.pos == (x, y) for pl in self.preview):
+                    self.draw_cell(x, y)
+
+
+    def show_preview(self, letters: list[PositionedLetter]):
+        # only touch the buttons of the previous and the new preview
+        self.clear_preview()
+
+        for pl in letters:
+            x, y = pl.pos
+            self.buttons[y][x].config(text=pl.play_letter.real_letter, fg=PREVIEW_COLOR, bg=CELL_COLORS[BOARD[y][x]], font=CELL_FONT)
+
+        self.preview = letters
+
+
+    def clear_preview(self):
+        for pl in self.preview:
+            x, y = pl.pos
+            self.draw_cell(x, y)
+
+        self.preview = []
+
+
+    def commit_preview(self):
+        """Make the previewed letters part of the board"""
+        if len(self.preview) == 0:
+            return
+
+        letters = self.preview
+        self.clear_preview()
+        self.on_commit(letters)
+
+
+
+class VirtualListbox(tk.Frame):
+    """Listbox that only builds the rows currently in view"""
+
+    def __init__(self, master, font, on_select=None):
+        super().__init__(master)
+
+        self.on_select = on_select
+        self.count = 0
+        self.get_row = lambda idx: ""
+        self.offset = 0
+        self.selected = None
+
+        self.row_height = tkfont.Font(font=font).metrics("linespace")
+
+        self.listbox = tk.Listbox(self, font=font, exportselection=False)
+        self.scrollbar = tk.Scrollbar(self, orient=tk.VERTICAL, command=self.on_scroll)
+
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+
+        self.listbox.bind("<<ListboxSelect>>", self.on_listbox_select)
+        self.listbox.bind("<Configure>", lambda evt: self.refresh())
+        self.listbox.bind("<MouseWheel>", self.on_mousewheel)
+        self.listbox.bind("<Button-4>", lambda evt: self.scroll_to(self.offset - 3))
+        self.listbox.bind("<Button-5>", lambda evt: self.scroll_to(self.offset + 3))
+        self.listbox.bind("<Up>", lambda evt: self.select(self.selected - 1 if self.selected is not None else 0))
+        self.listbox.bind("<Down>", lambda evt: self.select(self.selected + 1 if self.selected is not None else 0))
+        self.listbox.bind("<Prior>", lambda evt: self.scroll_to(self.offset - self.visible_rows()))
+        self.listbox.bind("<Next>", lambda evt: self.scroll_to(self.offset + self.visible_rows()))
+
+
+    def set_items(self, count: int, get_row):
+        self.count = count
+        self.get_row = get_row
+        self.offset = 0
+        self.selected = None
+        self.refresh()
+
+
+    def visible_rows(self) -> int:
+        return max(1, self.listbox.winfo_height() // self.row_height)
+
+
+    def refresh(self):
+        visible = self.visible_rows()
+        end = min(self.count, self.offset + visible)
+
+        self.listbox.delete(0, tk.END)
+        for idx in range(self.offset, end):
+            self.listbox.insert(tk.END, self.get_row(idx))
+
+        if self.selected is not None and self.offset <= self.selected < end:
+            self.listbox.selection_set(self.selected - self.offset)
+
+        if self.count == 0:
+            self.scrollbar.set(0, 1)
+        else:
+            self.scrollbar.set(self.offset / self.count, end / self.count)
+
+        # return "break" so that tk does not scroll the listbox itself
+        return "break"
+
+
+    def scroll_to(self, offset: int):
+        max_offset = max(0, self.count - self.visible_rows())
+        self.offset = min(max(0, offset), max_offset)
+        return self.refresh()
+
+
+    def on_scroll(self, *args):
+        match args:
+            case ("moveto", fraction):
+                self.scroll_to(int(float(fraction) * self.count))
+            case ("scroll", n, "units"):
+                self.scroll_to(self.offset + int(n))
+            case ("scroll", n, "pages"):
+                self.scroll_to(self.offset + int(n) * self.visible_rows())
+
+
+    def on_mousewheel(self, evt):
+        return self.scroll_to(self.offset - evt.delta // 120 * 3)
+
+
+    def select(self, idx: int):
+        if self.count == 0:
+            return "break"
+
+        idx = min(max(0, idx), self.count - 1)
+        self.selected = idx
+
+        visible = self.visible_rows()
+        if idx < self.offset:
+            self.offset = idx
+        elif idx >= self.offset + visible:
+            self.offset = idx - visible + 1
+
+        self.refresh()
+
+        if self.on_select is not None:
+            self.on_select(idx)
+
+        return "break"
+
+
+    def on_listbox_select(self, evt):
+        selection = self.listbox.curselection()
+
+        if len(selection) == 0:
+            return
+
+        self.select(self.offset + selection[0])
 
 
 
@@ -79,13 +292,17 @@ class GameFrame(tk.Frame):
 class ScrabbleApp(tk.Frame):
 
 
-    def __init__(self, master):
+    def __init__(self, master, loader: Thread|None = None):
         super().__init__(master)
 
+        # the lexicon build started by preload_trie, the session waits for it
+        self.loader = loader
+        self.session: GameSession|None = None
 
         self.results = []
+        self.selected = None
 
-        self.game_frame = GameFrame(self)
+        self.game_frame = GameFrame(self, self.on_commit, self.on_edit)
         self.controls_frame = tk.Frame(self)
 
         self.game_frame.pack(side=tk.LEFT)#  fill=tk.BOTH, expand=True)
@@ -105,25 +322,82 @@ class ScrabbleApp(tk.Frame):
         self.find_button.pack(fill=tk.X, padx=5, pady=5,)
 
 
-        self.results_listbox = tk.Listbox(self, font=font_size(16))
+        self.results_listbox = VirtualListbox(self, font=font_size(16), on_select=self.on_result_selected)
         self.results_listbox.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
 
-
-        self.results_listbox.bind("<<ListboxSelect>>", self.on_listbox_clicked)
-
         self.clear_button = tk.Button(self, text="Clear edit", font=font_size(20))
         self.clear_button.config(command=self.on_clear_click)
         self.clear_button.pack(fill=tk.X, padx=5, pady=5,)
 
+        self.undo_button = tk.Button(self, text="Undo", font=font_size(20))
+        self.undo_button.config(command=self.on_undo_click)
+        self.undo_button.pack(fill=tk.X, padx=5, pady=5,)
+
+        self.heat_var = tk.BooleanVar(value=False)
+        self.heat_check = tk.Checkbutton(self, text="Heat map", font=font_size(16), variable=self.heat_var)
+        self.heat_check.config(command=self.refresh_heat)
+        self.heat_check.pack(fill=tk.X, padx=5, pady=5,)
+
         self.initialize()
 
 
     def initialize(self):
         self.results = []
-        self.results_listbox.delete(0, tk.END)
+        self.selected = None
+        self.results_listbox.set_items(0, lambda idx: "")
 
-        self.game_board = create_empty_board()
-        self.game_frame.set_board(self.game_board)
+        # the engine needs the lexicon, keep the window responsive until it is built
+        if self.loader is not None and self.loader.is_alive():
+            self.set_loading(True)
+            self.after(LOADING_POLL_MS, self.initialize)
+            return
+
+        self.set_loading(False)
+
+        # racks are typed in, so the session does not track tiles
+        self.session = GameSession(track_tiles=False)
+        self.game_frame.set_board(self.session.board)
+        self.refresh_heat()
+
+
+    def set_loading(self, loading: bool):
+        state = tk.DISABLED if loading else tk.NORMAL
+        for widget in (self.reset_button, self.find_button, self.clear_button, self.undo_button, self.heat_check):
+            widget.config(state=state)
+
+        self.find_button.config(text="Loading lexicon..." if loading else "Find")
+        self.game_frame.set_enabled(not loading)
+
+
+    def refresh_heat(self):
+        # the whole map moves with every change of the board
+        heat = compute_heatmap(self.session.engine) if self.session is not None and self.heat_var.get() else None
+        self.game_frame.show_heat(heat)
+
+
+    def on_edit(self, x: int, y: int, letter: str, wildcard: str = ""):
+        # a one-cell diff: take off the tile there, put the new one down
+        removed = [(x, y)] if self.session.board[y][x].letter != " " else []
+        placed = [PositionedLetter(PlayLetter(letter=letter, wildcard_letter=wildcard), (x, y))] if letter != " " else []
+
+        if len(removed) > 0 or len(placed) > 0:
+            self.session.set_tiles(placed, removed)
+            self.refresh_heat()
+
+
+    def on_commit(self, letters: list[PositionedLetter]):
+        try:
+            self.session.apply_move(self.results[self.selected][0])
+        except ValueError:
+            # the board changed under the result, place the tiles as they are
+            try:
+                self.session.set_tiles(letters)
+            except ValueError:
+                pass
+
+        self.selected = None
+        self.game_frame.refresh_cells([pl.pos for pl in letters])
+        self.refresh_heat()
 
 
 
@@ -136,43 +410,58 @@ class ScrabbleApp(tk.Frame):
 
 
     def on_clear_click(self):
-        self.game_frame.set_board(self.game_board)
+        self.game_frame.set_board(self.session.board)
+
+
+    def on_undo_click(self):
+        self.game_frame.clear_preview()
+        turn = self.session.undo()
+        if turn is None:
+            return
+
+        self.results = []
+        self.selected = None
+        self.results_listbox.set_items(0, lambda idx: "")
+        self.game_frame.refresh_cells([pl.pos for pl in turn.letters + turn.removed])
+        self.refresh_heat()
 
 
     def on_find_clicked(self):
-        self.game_board = self.game_frame.game_board
-        letters = self.rack_entry.get().upper()
+        # a previewed move becomes part of the board we search on
+        self.game_frame.commit_preview()
 
-        self.results_listbox.delete(0, tk.END)
-        self.results = get_words_sorted(self.game_board, letters)
+        letters = self.rack_entry.get().upper()
 
-        for result in self.results:
-            self.results_listbox.insert(tk.END, result[-1])
+        # (move, score), rows are formatted as the list shows them
+        self.results = self.session.best_moves(letters)
+        self.selected = None
+        self.results_listbox.set_items(len(self.results), lambda idx: describe_result(idx + 1, *self.results[idx]))
 
-    def on_listbox_clicked(self, evt):
-        selection = self.results_listbox.curselection()[0]
 
+    def on_result_selected(self, idx):
         if len(self.results) == 0:
             return
 
-        temp_board = copy.deepcopy(self.game_board)
-        positioned_word = self.results[selection][0]
-
-        points = play_positioned_word(self.game_board, positioned_word, nxt=temp_board)
+        self.selected = idx
+        positioned_word = self.results[idx][0]
+        letters = self.session.engine.move_letters(positioned_word)
 
-        self.game_frame.set_board(temp_board)
+        self.game_frame.show_preview(letters)
 
 
 
 
 
 if __name__ == "__main__":
+    # build the lexicon while the window comes up
+    loader = preload_trie()
+
     app = tk.Tk()
     app.geometry("1200x600")
     app.title("ScrabbleApp")
 
 
-    scrabble = ScrabbleApp(app)
+    scrabble = ScrabbleApp(app, loader)
     scrabble.pack(fill=tk.BOTH, expand=True)
 
 